@@ -1,88 +1,526 @@
-from flask import Flask, request, jsonify
-from vmc_driver import VMCDriver
+from flask import Flask, Response, request, jsonify, g, url_for
+from flask.json.provider import DefaultJSONProvider
+from vmc_pool import UnknownMachine, build_pool, parse_machines
+from vmc_schema import SchemaError, encode_command, encode_menu, to_jsonable
+from vmc_service import LocalMachines
+from vmc_client import DaemonClient
+from vmc_ipc import DaemonUnavailable
+from vmc_jobs import JOB_TIMEOUT
+from vmc_vend import VendInProgress, VEND_TIMEOUT
+from vmc_admission import Gate, Overloaded, GATE_LIMITS
+from vmc_scheduler import PRIORITY_VEND, PRIORITY_CONTROL, PRIORITY_STATUS
+from vmc_driver import DEFAULT_TIMEOUT
+from vmc_poll_tuner import FAST_INTERVAL, SLOW_INTERVAL
+from vmc_telemetry import SAMPLE_INTERVAL
+from vmc_sales import SalesNotConfigured, SALES_INTERVAL
 from vmc_codes import CMD_SEND, MENU_SUB_COMMANDS
-import time
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+class VMCJSONProvider(DefaultJSONProvider):
+    """Driver results carry lazy schema records and raw bytes"""
+    default = staticmethod(to_jsonable)
 
 app = Flask(__name__)
+app.json = VMCJSONProvider(app)
 
 # CONFIGURATION
 # Update this to match your actual serial port (e.g., 'COM3' on Windows, '/dev/ttyUSB0' on Linux)
-SERIAL_PORT = '/dev/ttyS1' 
-vmc = VMCDriver(port=SERIAL_PORT)
+# or set VMC_SERIAL_PORT (e.g. to a vmc_simulator.py pty)
+SERIAL_PORT = os.environ.get('VMC_SERIAL_PORT', '/dev/ttyS1') 
+# Several machines on one host: VMC_MACHINES="lobby=/dev/ttyUSB0,floor2=/dev/ttyUSB1"
+# (otherwise a single machine "default" on SERIAL_PORT)
+MACHINES = parse_machines(os.environ.get('VMC_MACHINES')) or {'default': SERIAL_PORT}
+# Set VMC_CAPTURE to a file path to record all serial traffic (replay with vmc_replay.py)
+CAPTURE_PATH = os.environ.get('VMC_CAPTURE')
+# Set VMC_SNAPSHOT to a file path to warm-start the selection catalog after a restart
+SNAPSHOT_PATH = os.environ.get('VMC_SNAPSHOT')
+# POLL interval limits (seconds) the driver switches between (see vmc_poll_tuner.py)
+POLL_FAST = float(os.environ.get('VMC_POLL_FAST', FAST_INTERVAL))
+POLL_SLOW = float(os.environ.get('VMC_POLL_SLOW', SLOW_INTERVAL))
+# Command spans and driver events (see vmc_trace.py). VMC_TRACE appends them to a file (JSON lines);
+# VMC_TRACE_LEVEL (debug/info/warn/error) sets what is kept, VMC_TRACE_SAMPLE=N keeps 1 in N spans,
+# VMC_TRACE_ECHO what is printed. Dump the in-memory ring with GET /admin/trace.
+TRACE_PATH = os.environ.get('VMC_TRACE')
+TRACE_OPTIONS = {
+    'level': os.environ.get('VMC_TRACE_LEVEL', 'debug'),
+    'sample': int(os.environ.get('VMC_TRACE_SAMPLE', 1)),
+    'echo': os.environ.get('VMC_TRACE_ECHO', 'info'),
+}
+# Seconds between background full-status (0x51) samples served on /telemetry; 0 turns the sampler off
+TELEMETRY_INTERVAL = float(os.environ.get('VMC_TELEMETRY_INTERVAL', SAMPLE_INTERVAL))
+# Set VMC_SALES_DB to a SQLite file to ingest sales reports in idle time and serve /sales from it
+SALES_DB = os.environ.get('VMC_SALES_DB')
+SALES_REFRESH = float(os.environ.get('VMC_SALES_INTERVAL', SALES_INTERVAL))
+
+# Set VMC_DAEMON to the socket of a running vmc_daemon.py to leave the serial
+# ports to it; then the app can run under any number of worker processes
+DAEMON_SOCKET = os.environ.get('VMC_DAEMON')
+
+if DAEMON_SOCKET:
+    pool = vmc = None
+    machines = DaemonClient(DAEMON_SOCKET)
+else:
+    # All ports are served by one selector thread (see vmc_pool.py)
+    pool = build_pool(MACHINES, CAPTURE_PATH, SNAPSHOT_PATH, POLL_FAST, POLL_SLOW, TRACE_PATH, TRACE_OPTIONS,
+                      TELEMETRY_INTERVAL, SALES_DB, SALES_REFRESH)
+    machines = LocalMachines(pool)
+    vmc = pool[next(iter(MACHINES))]
+
+MAX_EVENT_WAIT = 30.0 # Longest /events long-poll (seconds)
+SSE_KEEPALIVE = 15.0  # Comment line sent on idle /events/stream connections
+MAX_JOB_WAIT = 30.0   # Longest /jobs/<id> and /vends/<id> long-poll (seconds)
+
+# Endpoints that queue serial commands -> priority class (see vmc_admission.py):
+# vends win over writes, writes over status and menu / diagnostic traffic
+ENDPOINT_PRIORITY = {
+    'dispense': PRIORITY_VEND,
+    'run_vend': PRIORITY_VEND,
+    'set_price': PRIORITY_CONTROL,
+    'set_selections': PRIORITY_CONTROL,
+    'apply_machine_profile': PRIORITY_CONTROL,
+    'apply_fleet_profile': PRIORITY_CONTROL,
+    'sync_selections': PRIORITY_CONTROL,
+    'get_status': PRIORITY_STATUS,
+    'get_status_full': PRIORITY_STATUS,
+    'menu_command': PRIORITY_STATUS,
+}
+# Per-endpoint concurrency limit + bounded wait queue, sized by class
+gates = {endpoint: Gate(*GATE_LIMITS[priority]) for endpoint, priority in ENDPOINT_PRIORITY.items()}
+
+# --- ERRORS ---
+
+@app.errorhandler(SchemaError)
+def bad_payload(e):
+    """Request values that do not fit the command's payload layout"""
+    return jsonify({"error": "INVALID_PAYLOAD", "detail": str(e)}), 400
+
+@app.errorhandler(VendInProgress)
+def vend_in_progress(e):
+    """Only one vend per selection at a time"""
+    return jsonify({"error": "VEND_IN_PROGRESS", "selection": e.args[0]}), 409
+
+@app.errorhandler(UnknownMachine)
+def unknown_machine(e):
+    """/machines/<machine_id>/... for an ID that is not configured"""
+    return jsonify({"error": "Unknown Machine", "machine": e.args[0]}), 404
+
+@app.errorhandler(SalesNotConfigured)
+def sales_not_configured(e):
+    """/sales without VMC_SALES_DB"""
+    return jsonify({"error": "SALES_NOT_CONFIGURED", "machine": e.args[0]}), 404
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Admission control: too many requests on this endpoint, or more serial backlog than can drain in time"""
+    reason, retry_after = e.args
+    return jsonify({"error": reason, "retry_after": retry_after}), 503, {'Retry-After': str(retry_after)}
+
+@app.errorhandler(DaemonUnavailable)
+def daemon_unavailable(e):
+    """VMC_DAEMON set, but the daemon is not answering"""
+    return jsonify({"error": "DAEMON_UNAVAILABLE", "detail": str(e)}), 503
 
-# --- GENERIC HELPERS ---
-def int_to_bytes(value, length):
-    """Helper to convert int to big-endian bytes"""
-    return value.to_bytes(length, byteorder='big')
+# --- MACHINE ROUTING ---
+
+def machine_route(rule, **options):
+    """Registers the endpoint as `rule` (default machine) and `/machines/<machine_id>rule`"""
+    def decorator(view_func):
+        app.add_url_rule(rule, view_func=view_func, **options)
+        app.add_url_rule('/machines/<machine_id>' + rule, view_func=view_func, **options)
+        return view_func
+    return decorator
+
+@app.url_value_preprocessor
+def select_machine(endpoint, values):
+    """Puts the addressed machine (vmc_service.MachineService, or its daemon client) on g.vmc"""
+    g.machine_id = (values or {}).pop('machine_id', None) or machines.default
+    g.vmc = machines.machine(g.machine_id)
+
+@app.before_request
+def admit():
+    """Takes a slot on the endpoint's gate (raises Overloaded when it is full)"""
+    g.priority = ENDPOINT_PRIORITY.get(request.endpoint, PRIORITY_CONTROL)
+    gate = gates.get(request.endpoint)
+    if gate is not None:
+        gate.enter()
+        g.gate = gate
+
+@app.teardown_request
+def release_gate(exc):
+    gate = g.pop('gate', None)
+    if gate is not None:
+        gate.leave()
 
 # --- ENDPOINTS ---
 
-@app.route('/status', methods=['GET'])
+@app.route('/machines', methods=['GET'])
+def list_machines():
+    """Every configured machine and its link state"""
+    return jsonify(machines.describe())
+
+def cached_status(cmd_byte):
+    """
+    Serves 0x53 / 0x51 through the driver's status cache.
+    Optional query args: max_age (seconds), stale (seconds a stale reply may be served while refreshing)
+    """
+    result, age = g.vmc.status(
+        cmd_byte,
+        max_age=request.args.get('max_age', type=float),
+        stale_window=request.args.get('stale', type=float),
+    )
+    headers = {'Age': str(int(age))} if age else {}
+    return jsonify(result), 200, headers
+
+def wants_async():
+    """?async=1 or {"async": true}: answer 202 with a job instead of waiting"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get('async') is True
+
+def wants_stream():
+    """?stream=1 or {"stream": true}: answer with one JSON line per reply frame as it arrives"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get('stream') is True
+
+def run_command(cmd_byte, payload):
+    """
+    Blocking call, a 202 + job (see /jobs/<id>) when the client asked for async,
+    or chunked JSON lines ({"frame": ...}... {"end": ...}) when it asked for a stream
+    """
+    if wants_stream():
+        lines = g.vmc.stream_command(cmd_byte, payload, priority=g.priority)
+        response = Response((json.dumps(line, default=to_jsonable) + '\n' for line in lines),
+                            mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
+        # The stream outlives the request: hold the endpoint's gate until the body is done
+        gate = g.pop('gate', None)
+        if gate is not None:
+            response.call_on_close(gate.leave)
+        return response
+    if not wants_async():
+        return jsonify(g.vmc.command(cmd_byte, payload, priority=g.priority))
+
+    job = g.vmc.submit_job(cmd_byte, payload, JOB_TIMEOUT, priority=g.priority)
+    url = url_for('get_job', machine_id=g.machine_id, job_id=job['id'])
+    return jsonify(dict(job, url=url)), 202, {'Location': url}
+
+def vend_accepted(vend):
+    """202 + the vend (see /vends/<id>)"""
+    url = url_for('get_vend', machine_id=g.machine_id, vend_id=vend['id'])
+    return jsonify(dict(vend, url=url)), 202, {'Location': url}
+
+@machine_route('/status', methods=['GET'])
 def get_status():
     """Checks machine status (0x53)"""
-    # 0x53 has no payload
-    result = vmc.send_command_blocking(CMD_SEND["REQUEST_STATUS_SIMPLE"], [])
-    return jsonify(result)
+    return cached_status(CMD_SEND["REQUEST_STATUS_SIMPLE"])
+
+@machine_route('/status/full', methods=['GET'])
+def get_status_full():
+    """Full machine status: temperature, humidity, peripherals (0x51)"""
+    return cached_status(CMD_SEND["REQUEST_STATUS_FULL"])
 
-@app.route('/dispense', methods=['POST'])
+@machine_route('/dispense', methods=['POST'])
 def dispense():
-    """Dispense Item (0x03)"""
+    """
+    Dispense Item (0x03). Waits for the final 0x04 (success, jam, motor error...),
+    not just "Dispensing...". ?async=1 returns a vend right away.
+    """
     slot_id = request.json.get('slot_id') # e.g., 10
     
-    # Payload: 2 bytes for Selection Number
-    payload = int_to_bytes(slot_id, 2)
-    
-    result = vmc.send_command_blocking(CMD_SEND["DISPENSE_ITEM"], payload)
+    if wants_async():
+        return vend_accepted(g.vmc.start_vend(slot_id, timeout=DEFAULT_TIMEOUT))
     
-    # Parse specific logic here if needed, or return raw
-    return jsonify(result)
+    vend = g.vmc.start_vend(slot_id, timeout=DEFAULT_TIMEOUT, wait=DEFAULT_TIMEOUT + VEND_TIMEOUT)
+    return jsonify({"error": vend['error']} if vend['error'] else vend['result'])
 
-@app.route('/price', methods=['POST'])
+@machine_route('/vend', methods=['POST'])
+def run_vend():
+    """
+    Whole vend in one call: cashless payment (0x27), selection check (0x01), dispense (0x03),
+    sent on consecutive POLLs and followed until the final 0x04.
+    Usage: {"slot_id": 10, "amount": 150, "check": true}   (amount: optional, integer cents)
+    ?async=1 returns the vend right away; poll /vends/<id>.
+    """
+    body = request.json
+    timeout = body.get('timeout', DEFAULT_TIMEOUT)
+    vend = g.vmc.start_vend(
+        body.get('slot_id'),
+        amount=body.get('amount'),
+        check=body.get('check', True),
+        timeout=timeout,
+        wait=None if wants_async() else timeout + VEND_TIMEOUT,
+    )
+    if wants_async():
+        return vend_accepted(vend)
+    return jsonify(vend)
+
+@machine_route('/vends/<vend_id>', methods=['GET'])
+def get_vend(vend_id):
+    """
+    Progress of a vend: current step, every dispense status so far, final outcome.
+    wait=<seconds> long-polls until it is done or failed.
+    """
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    vend = g.vmc.get_vend(vend_id, wait=wait)
+    if vend is None:
+        return jsonify({"error": "Unknown Vend"}), 404
+    return jsonify(vend)
+
+@machine_route('/price', methods=['POST'])
 def set_price():
     """Set Price (0x12) - Example of sending Command -> ACK only"""
     slot_id = request.json.get('slot_id')
     price = request.json.get('price') # Integer cents
     
     # Payload: Slot(2) + Price(4)
-    payload = int_to_bytes(slot_id, 2) + int_to_bytes(price, 4)
+    payload = encode_command(CMD_SEND["SET_PRICE"], selection=slot_id, price=price)
     
-    result = vmc.send_command_blocking(CMD_SEND["SET_PRICE"], payload)
+    result = g.vmc.command(CMD_SEND["SET_PRICE"], payload)
     return jsonify(result)
 
-@app.route('/menu', methods=['POST'])
+@machine_route('/menu', methods=['POST'])
 def menu_command():
     """
     Generic endpoint for all 0x70 Menu settings.
     Usage: {"sub_cmd": "TEMP_CONTROLLER_SETTING", "params": [1, 2, 3]}
+       or: {"sub_cmd": "TEMP_CONTROLLER_SETTING", "params": {"mode": 1, "target": 4}}
+    Slow ones (e.g. SELECTION_TEST) can run as a job: ?async=1
     """
     sub_cmd_name = request.json.get('sub_cmd')
-    params = request.json.get('params', []) # List of ints
+    params = request.json.get('params', []) # List of ints, or named fields (vmc_schema.MENU_SCHEMAS)
     
     if sub_cmd_name not in MENU_SUB_COMMANDS:
         return jsonify({"error": "Unknown Sub Command"}), 400
-        
-    sub_cmd_byte = MENU_SUB_COMMANDS[sub_cmd_name]
     
     # Payload for 0x70 is: [SubCmdByte] + [Params...]
-    payload = [sub_cmd_byte] + params
+    payload = encode_menu(sub_cmd_name, params)
     
-    result = vmc.send_command_blocking(CMD_SEND["MENU_COMMAND_WRAPPER"], payload)
-    return jsonify(result)
+    return run_command(CMD_SEND["MENU_COMMAND_WRAPPER"], payload)
+
+@machine_route('/sync', methods=['POST'])
+def sync_selections():
+    """
+    Re-read every selection from the VMC (0x31): one 0x11 per selection, answered
+    {"status": "STREAM_END", "frames": n}. ?async=1 returns a job right away,
+    ?stream=1 streams the 0x11s as they arrive.
+    """
+    return run_command(CMD_SEND["REQUEST_INFO_SYNC"], b'')
+
+@machine_route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    State of an async command: queued, sent, acked, done or failed.
+    wait=<seconds> long-polls until the job is done or failed.
+    """
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    job = g.vmc.get_job(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Unknown Job"}), 404
+    return jsonify(job)
 
-@app.route('/events', methods=['GET'])
+def event_query():
+    """Common /events args: since=<seq>, cmd=0x21,0x23 (filter), limit=N"""
+    since = request.args.get('since', 0, type=int)
+    codes = {int(code, 0) for code in request.args.get('cmd', '').split(',') if code} or None
+    limit = request.args.get('limit', type=int)
+    return since, codes, limit
+
+@machine_route('/events', methods=['GET'])
 def get_async_events():
-    """Fetch unsolicited events (money inserted, etc)"""
-    events = []
-    while not vmc.async_events.empty():
-        events.append(vmc.async_events.get())
-    return jsonify(events)
+    """
+    Unsolicited events (money inserted, etc) after cursor `since`. Non-destructive.
+    wait=<seconds> long-polls until a matching event arrives.
+    Pass the returned `next` as `since` on the following call.
+    """
+    since, codes, limit = event_query()
+    wait = min(request.args.get('wait', 0, type=float), MAX_EVENT_WAIT)
+    events, missed, cursor = g.vmc.events(since, codes, limit=limit, wait=wait)
+    return jsonify({"events": events, "missed": missed, "next": cursor})
+
+@machine_route('/events/stream', methods=['GET'])
+def stream_async_events():
+    """Server-Sent Events: pushes each new event as it arrives (resumes from Last-Event-ID)"""
+    since, codes, _ = event_query()
+    since = request.headers.get('Last-Event-ID', since, type=int)
+    machine = g.vmc # The generator outlives the request context
+
+    def generate(cursor):
+        while True:
+            events, missed, cursor = machine.events(cursor, codes, wait=SSE_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+            for event in events:
+                yield f"id: {event['seq']}\nevent: {event['name']}\ndata: {json.dumps(event, default=to_jsonable)}\n\n"
+
+    return Response(generate(since), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@machine_route('/credit', methods=['GET'])
+def get_credit():
+    """
+    Current credit, totals and recent payment transactions, from memory.
+    since=<version> returns only later transactions; with wait=<seconds>
+    it long-polls until the version moves past it. Pass the returned
+    `version` as `since` on the following call.
+    """
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), MAX_EVENT_WAIT)
+    return jsonify(g.vmc.credit(since, wait=wait))
+
+@machine_route('/selections', methods=['GET'])
+def get_selections():
+    """Price / inventory / capacity / product ID per slot, served from memory"""
+    return jsonify(g.vmc.selections())
+
+@machine_route('/selections', methods=['POST'])
+def set_selections():
+    """
+    Bulk price / inventory / capacity / product ID (0x12-0x15). Unchanged values are skipped.
+    Usage: {"selections": [{"slot_id": 10, "price": 150, "inventory": 8}, ...], "timeout": 60}
+    """
+    planogram = request.json.get('selections', [])
+    result = g.vmc.apply_planogram(planogram, timeout=request.json.get('timeout'))
+    return jsonify(result)
+
+@machine_route('/profile', methods=['GET'])
+def get_profile():
+    """Last reported value of each menu setting (0x71), served from memory"""
+    return jsonify(g.vmc.settings())
+
+@machine_route('/profile', methods=['POST'])
+def apply_machine_profile():
+    """
+    Configuration profile over 0x70: settings the VMC has not reported yet are
+    read once, then only the ones that differ are written, back to back.
+    Usage: {"settings": {"LIGHT_CONTROL": {"mode": 1}, "AUTO_CHANGE_TIME": [30]}, "refresh": false, "timeout": 60}
+    """
+    body = request.json
+    return jsonify(g.vmc.apply_profile(body.get('settings', {}), refresh=bool(body.get('refresh')),
+                                       timeout=body.get('timeout')))
+
+@app.route('/machines/profile', methods=['POST'])
+def apply_fleet_profile():
+    """
+    One profile on several machines (default: all), each on its own link at the same time.
+    Usage: like /profile, plus "machines": ["lobby", "floor2"]
+    """
+    body = request.json
+    machine_ids = body.get('machines') or [machine['id'] for machine in machines.describe()['machines']]
+    services = {machine_id: machines.machine(machine_id) for machine_id in machine_ids} # Unknown IDs: 404 up front
+
+    def apply(service):
+        try:
+            return service.apply_profile(body.get('settings', {}), refresh=bool(body.get('refresh')),
+                                         timeout=body.get('timeout'))
+        except Overloaded as e:
+            return {"error": e.args[0], "retry_after": e.args[1]}
+        except DaemonUnavailable as e:
+            return {"error": "DAEMON_UNAVAILABLE", "detail": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(services))) as executor:
+        reports = dict(zip(services, executor.map(apply, services.values())))
+    return jsonify({"machines": reports})
+
+@machine_route('/selections/<int:slot_id>', methods=['GET'])
+def get_selection(slot_id):
+    """One slot from the catalog"""
+    selection = g.vmc.selection(slot_id)
+    if selection is None:
+        return jsonify({"error": "Unknown Selection"}), 404
+    return jsonify(selection)
+
+@machine_route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of driver latency histograms and counters"""
+    return Response(g.vmc.metrics(), mimetype='text/plain; version=0.0.4')
+
+@machine_route('/telemetry', methods=['GET'])
+def get_telemetry():
+    """
+    Temperature, humidity and peripheral states sampled in the background, from memory.
+    Optional query args: resolution=raw|1m|1h, since=<epoch>, until=<epoch>,
+    fields=temperature,door, limit=N (newest N points)
+    """
+    fields = request.args.get('fields')
+    try:
+        return jsonify(g.vmc.telemetry(
+            resolution=request.args.get('resolution', 'raw'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float),
+            fields=fields.split(',') if fields else None,
+            limit=request.args.get('limit', type=int),
+        ))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_QUERY", "detail": str(e)}), 400
+
+@machine_route('/sales/<kind>', methods=['GET'])
+def get_sales(kind):
+    """
+    Sales report from the local database: daily, monthly, yearly, total, selection or coins.
+    Optional query args (period reports): since=2026-10-01, until=2026-10-31
+    """
+    try:
+        return jsonify(g.vmc.sales_report(kind, request.args.get('since'), request.args.get('until')))
+    except ValueError as e:
+        return jsonify({"error": "UNKNOWN_REPORT", "detail": str(e)}), 404
+
+@machine_route('/sales/vends', methods=['GET'])
+def get_vend_log():
+    """
+    Every vend result (0x04) seen on the link.
+    Optional query args: since=<epoch>, until=<epoch>, selection=N, limit=N (newest N)
+    """
+    return jsonify({"vends": g.vmc.vend_log(
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        selection=request.args.get('selection', type=int),
+        limit=request.args.get('limit', type=int),
+    )})
+
+@machine_route('/sales/refresh', methods=['POST'])
+def refresh_sales():
+    """Pull the reports now (still only while the link is idle) instead of at the next interval"""
+    return jsonify(g.vmc.refresh_sales()), 202
+
+@machine_route('/admin/trace', methods=['GET'])
+def get_trace():
+    """
+    Dumps the driver's trace ring: command spans (cmd.queued ... cmd.completed) and driver events.
+    Optional query args: since=<seq> (pass the returned `next`), level=info, span=<id>, limit=N
+    """
+    try:
+        return jsonify(g.vmc.trace(
+            since=request.args.get('since', 0, type=int),
+            level=request.args.get('level'),
+            span=request.args.get('span', type=int),
+            limit=request.args.get('limit', type=int),
+        ))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_LEVEL", "detail": str(e)}), 400
+
+@machine_route('/admin/trace', methods=['POST'])
+def set_trace():
+    """
+    Changes what is recorded, at runtime.
+    Usage: {"level": "info", "sample": 10}   (sample: keep 1 in N spans below WARN)
+    """
+    try:
+        return jsonify(g.vmc.configure_trace(request.json.get('level'), request.json.get('sample')))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_LEVEL", "detail": str(e)}), 400
 
 # --- STARTUP LOGIC ---
 if __name__ == '__main__':
-    # Start the Serial Driver before the web server
+    # Start the Serial Driver before the web server (unless a daemon owns the ports)
     try:
-        print(f"[App] Starting VMC Driver on {SERIAL_PORT}...")
-        vmc.start()
+        if pool is not None:
+            print(f"[App] Starting VMC Drivers: {MACHINES}...")
+            pool.start()
+        else:
+            print(f"[App] Using VMC daemon at {DAEMON_SOCKET}")
     except Exception as e:
         print(f"[App] Failed to start VMC Driver: {e}")
 
@@ -0,0 +1,499 @@
+import os
+import json
+import asyncio
+from quart import Quart, request, jsonify, make_response, g, url_for
+from quart.json.provider import DefaultJSONProvider
+from vmc_async import AsyncVMCDriver
+from vmc_driver import DEFAULT_TIMEOUT
+from vmc_pool import UnknownMachine, parse_machines
+from vmc_jobs import JOB_TIMEOUT
+from vmc_vend import VendInProgress, VEND_TIMEOUT
+from vmc_schema import SchemaError, encode_command, encode_menu, to_jsonable
+from vmc_poll_tuner import PollTuner, FAST_INTERVAL, SLOW_INTERVAL
+from vmc_trace import Tracer
+from vmc_telemetry import TelemetrySampler, SAMPLE_INTERVAL
+from vmc_sales import SalesStore, SalesIngestor, SalesNotConfigured, SALES_INTERVAL
+from vmc_admission import Overloaded
+from vmc_service import AsyncMachineService
+from vmc_scheduler import PRIORITY_VEND, PRIORITY_CONTROL, PRIORITY_STATUS
+from vmc_codes import CMD_SEND, MENU_SUB_COMMANDS
+
+# ASGI version of app.py: same endpoints over the same service layer
+# (vmc_service.AsyncMachineService), but every waiting request is a
+# coroutine awaiting the driver instead of a blocked thread. With several
+# machines, every port is watched by the server's own event loop (epoll),
+# so no DriverPool thread is needed here.
+# Run with e.g.: hypercorn asgi_app:app --bind 0.0.0.0:5000
+#            or: uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+class VMCJSONProvider(DefaultJSONProvider):
+    """Driver results carry lazy schema records and raw bytes"""
+    default = staticmethod(to_jsonable)
+
+app = Quart(__name__)
+app.json = VMCJSONProvider(app)
+
+# CONFIGURATION
+# Update this to match your actual serial port (e.g., 'COM3' on Windows, '/dev/ttyUSB0' on Linux)
+# or set VMC_SERIAL_PORT (e.g. to a vmc_simulator.py pty)
+SERIAL_PORT = os.environ.get('VMC_SERIAL_PORT', '/dev/ttyS1')
+# Several machines on one host: VMC_MACHINES="lobby=/dev/ttyUSB0,floor2=/dev/ttyUSB1"
+MACHINES = parse_machines(os.environ.get('VMC_MACHINES')) or {'default': SERIAL_PORT}
+# Set VMC_CAPTURE to a file path to record all serial traffic (replay with vmc_replay.py)
+CAPTURE_PATH = os.environ.get('VMC_CAPTURE')
+# Set VMC_SNAPSHOT to a file path to warm-start the selection catalog after a restart
+SNAPSHOT_PATH = os.environ.get('VMC_SNAPSHOT')
+# POLL interval limits (seconds) the driver switches between (see vmc_poll_tuner.py)
+POLL_FAST = float(os.environ.get('VMC_POLL_FAST', FAST_INTERVAL))
+POLL_SLOW = float(os.environ.get('VMC_POLL_SLOW', SLOW_INTERVAL))
+# Command spans and driver events (see vmc_trace.py). VMC_TRACE appends them to a file (JSON lines);
+# VMC_TRACE_LEVEL (debug/info/warn/error) sets what is kept, VMC_TRACE_SAMPLE=N keeps 1 in N spans,
+# VMC_TRACE_ECHO what is printed. Dump the in-memory ring with GET /admin/trace.
+TRACE_PATH = os.environ.get('VMC_TRACE')
+TRACE_OPTIONS = {
+    'level': os.environ.get('VMC_TRACE_LEVEL', 'debug'),
+    'sample': int(os.environ.get('VMC_TRACE_SAMPLE', 1)),
+    'echo': os.environ.get('VMC_TRACE_ECHO', 'info'),
+}
+# Seconds between background full-status (0x51) samples served on /telemetry; 0 turns the sampler off
+TELEMETRY_INTERVAL = float(os.environ.get('VMC_TELEMETRY_INTERVAL', SAMPLE_INTERVAL))
+# Set VMC_SALES_DB to a SQLite file to ingest sales reports in idle time and serve /sales from it
+SALES_DB = os.environ.get('VMC_SALES_DB')
+SALES_REFRESH = float(os.environ.get('VMC_SALES_INTERVAL', SALES_INTERVAL))
+sales_store = SalesStore(SALES_DB) if SALES_DB else None # One database for every machine
+
+machines = {}
+for machine_id, port in MACHINES.items():
+    capture_path, snapshot_path, trace_path = CAPTURE_PATH, SNAPSHOT_PATH, TRACE_PATH
+    if len(MACHINES) > 1:
+        # One capture / snapshot / trace per machine
+        capture_path = capture_path and f"{capture_path}.{machine_id}"
+        snapshot_path = snapshot_path and f"{snapshot_path}.{machine_id}"
+        trace_path = trace_path and f"{trace_path}.{machine_id}"
+    driver = AsyncVMCDriver(port=port, capture_path=capture_path, snapshot_path=snapshot_path,
+                            poll_tuner=PollTuner(POLL_FAST, POLL_SLOW),
+                            tracer=Tracer(**TRACE_OPTIONS), trace_path=trace_path,
+                            telemetry_sampler=TelemetrySampler(TELEMETRY_INTERVAL),
+                            sales=sales_store and SalesIngestor(sales_store, machine_id, SALES_REFRESH))
+    machines[machine_id] = AsyncMachineService(machine_id, driver)
+
+# Routes without a /machines/<machine_id> prefix address the first machine
+DEFAULT_MACHINE = next(iter(MACHINES))
+vmc = machines[DEFAULT_MACHINE]
+
+MAX_EVENT_WAIT = 30.0 # Longest /events long-poll (seconds)
+SSE_KEEPALIVE = 15.0  # Comment line sent on idle /events/stream connections
+MAX_JOB_WAIT = 30.0   # Longest /jobs/<id> and /vends/<id> long-poll (seconds)
+
+# Endpoints that queue serial commands -> priority class (see app.py / vmc_admission.py).
+# The service sheds commands on backlog as it queues them; waiting requests are
+# coroutines here, so there are no per-endpoint gates.
+ENDPOINT_PRIORITY = {
+    'dispense': PRIORITY_VEND,
+    'run_vend': PRIORITY_VEND,
+    'set_price': PRIORITY_CONTROL,
+    'set_selections': PRIORITY_CONTROL,
+    'sync_selections': PRIORITY_CONTROL,
+    'apply_machine_profile': PRIORITY_CONTROL,
+    'menu_command': PRIORITY_STATUS,
+}
+
+# --- LIFECYCLE ---
+
+@app.before_serving
+async def start_driver():
+    # The drivers must live on the server's event loop
+    for machine_id, service in machines.items():
+        driver = service.driver
+        try:
+            print(f"[App] Starting VMC Driver {machine_id} on {driver.port}...")
+            await driver.start()
+        except Exception as e:
+            print(f"[App] Failed to start VMC Driver {machine_id}: {e}")
+
+@app.after_serving
+async def stop_driver():
+    for service in machines.values():
+        if service.driver.running:
+            await service.driver.stop()
+
+# --- ERRORS ---
+
+@app.errorhandler(Overloaded)
+async def overloaded(e):
+    """More serial backlog ahead of this request's class than can drain in time"""
+    reason, retry_after = e.args
+    return jsonify({"error": reason, "retry_after": retry_after}), 503, {'Retry-After': str(retry_after)}
+
+@app.errorhandler(SchemaError)
+async def bad_payload(e):
+    """Request values that do not fit the command's payload layout"""
+    return jsonify({"error": "INVALID_PAYLOAD", "detail": str(e)}), 400
+
+@app.errorhandler(VendInProgress)
+async def vend_in_progress(e):
+    """Only one vend per selection at a time"""
+    return jsonify({"error": "VEND_IN_PROGRESS", "selection": e.args[0]}), 409
+
+@app.errorhandler(SalesNotConfigured)
+async def sales_not_configured(e):
+    """/sales without VMC_SALES_DB"""
+    return jsonify({"error": "SALES_NOT_CONFIGURED", "machine": e.args[0]}), 404
+
+@app.errorhandler(UnknownMachine)
+async def unknown_machine(e):
+    """/machines/<machine_id>/... for an ID that is not configured"""
+    return jsonify({"error": "Unknown Machine", "machine": e.args[0]}), 404
+
+# --- MACHINE ROUTING ---
+
+def machine_route(rule, **options):
+    """Registers the endpoint as `rule` (default machine) and `/machines/<machine_id>rule`"""
+    def decorator(view_func):
+        app.add_url_rule(rule, view_func=view_func, **options)
+        app.add_url_rule('/machines/<machine_id>' + rule, view_func=view_func, **options)
+        return view_func
+    return decorator
+
+@app.url_value_preprocessor
+def select_machine(endpoint, values):
+    """Puts the addressed machine (vmc_service.AsyncMachineService) on g.vmc"""
+    g.machine_id = (values or {}).pop('machine_id', DEFAULT_MACHINE)
+    g.vmc = machines.get(g.machine_id)
+    if g.vmc is None:
+        raise UnknownMachine(g.machine_id)
+
+@app.before_request
+async def set_priority():
+    """Priority class of the commands this request queues"""
+    g.priority = ENDPOINT_PRIORITY.get(request.endpoint, PRIORITY_CONTROL)
+
+# --- ENDPOINTS ---
+
+@app.route('/machines', methods=['GET'])
+async def list_machines():
+    """Every configured machine and its link state"""
+    return jsonify({"machines": [service.info() for service in machines.values()], "default": DEFAULT_MACHINE})
+
+async def cached_status(cmd_byte):
+    """Serves 0x53 / 0x51 through the driver's status cache (see app.py)"""
+    result, age = await g.vmc.status(
+        cmd_byte,
+        max_age=request.args.get('max_age', type=float),
+        stale_window=request.args.get('stale', type=float),
+    )
+    headers = {'Age': str(int(age))} if age else {}
+    return jsonify(result), 200, headers
+
+def wants_async(body):
+    """?async=1 or {"async": true}: answer 202 with a job instead of waiting"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(body, dict) and body.get('async') is True
+
+def wants_stream(body):
+    """?stream=1 or {"stream": true}: answer with one JSON line per reply frame as it arrives"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(body, dict) and body.get('stream') is True
+
+async def run_command(cmd_byte, payload, body):
+    """
+    Awaited call, a 202 + job (see /jobs/<id>) when the client asked for async,
+    or chunked JSON lines ({"frame": ...}... {"end": ...}) when it asked for a stream
+    """
+    if wants_stream(body):
+        return await stream_response(g.vmc.stream_command(cmd_byte, payload, priority=g.priority))
+    if not wants_async(body):
+        return jsonify(await g.vmc.command(cmd_byte, payload, priority=g.priority))
+
+    job = g.vmc.submit_job(cmd_byte, payload, JOB_TIMEOUT, priority=g.priority)
+    url = url_for('get_job', machine_id=g.machine_id, job_id=job['id'])
+    return jsonify(dict(job, url=url)), 202, {'Location': url}
+
+async def stream_response(lines):
+    async def generate():
+        async for line in lines:
+            yield (json.dumps(line, default=to_jsonable) + '\n').encode()
+
+    response = await make_response(generate(), {'Content-Type': 'application/x-ndjson', 'Cache-Control': 'no-cache'})
+    response.timeout = None # Bounded by the stream's own timeouts
+    return response
+
+def vend_accepted(vend):
+    """202 + the vend (see /vends/<id>)"""
+    url = url_for('get_vend', machine_id=g.machine_id, vend_id=vend['id'])
+    return jsonify(dict(vend, url=url)), 202, {'Location': url}
+
+@machine_route('/status', methods=['GET'])
+async def get_status():
+    """Checks machine status (0x53)"""
+    return await cached_status(CMD_SEND["REQUEST_STATUS_SIMPLE"])
+
+@machine_route('/status/full', methods=['GET'])
+async def get_status_full():
+    """Full machine status: temperature, humidity, peripherals (0x51)"""
+    return await cached_status(CMD_SEND["REQUEST_STATUS_FULL"])
+
+@machine_route('/dispense', methods=['POST'])
+async def dispense():
+    """Dispense Item (0x03), awaited until the final 0x04. ?async=1 returns a vend right away."""
+    body = await request.get_json()
+    slot_id = body.get('slot_id')
+
+    if wants_async(body):
+        return vend_accepted(await g.vmc.start_vend(slot_id, timeout=DEFAULT_TIMEOUT))
+
+    vend = await g.vmc.start_vend(slot_id, timeout=DEFAULT_TIMEOUT, wait=DEFAULT_TIMEOUT + VEND_TIMEOUT)
+    return jsonify({"error": vend['error']} if vend['error'] else vend['result'])
+
+@machine_route('/vend', methods=['POST'])
+async def run_vend():
+    """Payment (0x27) + check (0x01) + dispense (0x03) as one transaction (see app.py)"""
+    body = await request.get_json()
+    timeout = body.get('timeout', DEFAULT_TIMEOUT)
+    vend = await g.vmc.start_vend(
+        body.get('slot_id'),
+        amount=body.get('amount'),
+        check=body.get('check', True),
+        timeout=timeout,
+        wait=None if wants_async(body) else timeout + VEND_TIMEOUT,
+    )
+    if wants_async(body):
+        return vend_accepted(vend)
+    return jsonify(vend)
+
+@machine_route('/vends/<vend_id>', methods=['GET'])
+async def get_vend(vend_id):
+    """Vend progress and outcome; wait=<seconds> long-polls until done or failed"""
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    vend = await g.vmc.get_vend(vend_id, wait=wait)
+    if vend is None:
+        return jsonify({"error": "Unknown Vend"}), 404
+    return jsonify(vend)
+
+@machine_route('/price', methods=['POST'])
+async def set_price():
+    """Set Price (0x12)"""
+    body = await request.get_json()
+    slot_id = body.get('slot_id')
+    price = body.get('price') # Integer cents
+
+    # Payload: Slot(2) + Price(4)
+    payload = encode_command(CMD_SEND["SET_PRICE"], selection=slot_id, price=price)
+
+    result = await g.vmc.command(CMD_SEND["SET_PRICE"], payload)
+    return jsonify(result)
+
+@machine_route('/menu', methods=['POST'])
+async def menu_command():
+    """
+    Generic endpoint for all 0x70 Menu settings.
+    Usage: {"sub_cmd": "TEMP_CONTROLLER_SETTING", "params": [1, 2, 3]}
+       or: {"sub_cmd": "TEMP_CONTROLLER_SETTING", "params": {"mode": 1, "target": 4}}
+    """
+    body = await request.get_json()
+    sub_cmd_name = body.get('sub_cmd')
+    params = body.get('params', [])
+
+    if sub_cmd_name not in MENU_SUB_COMMANDS:
+        return jsonify({"error": "Unknown Sub Command"}), 400
+
+    # Payload for 0x70 is: [SubCmdByte] + [Params...]
+    payload = encode_menu(sub_cmd_name, params)
+
+    return await run_command(CMD_SEND["MENU_COMMAND_WRAPPER"], payload, body)
+
+@machine_route('/sync', methods=['POST'])
+async def sync_selections():
+    """
+    Re-read every selection from the VMC (0x31): one 0x11 per selection, answered
+    {"status": "STREAM_END", "frames": n}. ?async=1 returns a job right away,
+    ?stream=1 streams the 0x11s as they arrive.
+    """
+    body = await request.get_json(silent=True)
+    return await run_command(CMD_SEND["REQUEST_INFO_SYNC"], b'', body)
+
+@machine_route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Async command state; wait=<seconds> long-polls until done or failed (see app.py)"""
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    job = await g.vmc.get_job(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Unknown Job"}), 404
+    return jsonify(job)
+
+def event_query():
+    """Common /events args: since=<seq>, cmd=0x21,0x23 (filter), limit=N"""
+    since = request.args.get('since', 0, type=int)
+    codes = {int(code, 0) for code in request.args.get('cmd', '').split(',') if code} or None
+    limit = request.args.get('limit', type=int)
+    return since, codes, limit
+
+@machine_route('/events', methods=['GET'])
+async def get_async_events():
+    """Unsolicited events after cursor `since`, non-destructive (see app.py)"""
+    since, codes, limit = event_query()
+    wait = min(request.args.get('wait', 0, type=float), MAX_EVENT_WAIT)
+    events, missed, cursor = await g.vmc.events(since, codes, limit=limit, wait=wait)
+    return jsonify({"events": events, "missed": missed, "next": cursor})
+
+@machine_route('/events/stream', methods=['GET'])
+async def stream_async_events():
+    """Server-Sent Events: pushes each new event as it arrives (resumes from Last-Event-ID)"""
+    since, codes, _ = event_query()
+    since = request.headers.get('Last-Event-ID', since, type=int)
+    machine = g.vmc # The generator outlives the request context
+
+    async def generate(cursor):
+        while True:
+            events, missed, cursor = await machine.events(cursor, codes, wait=SSE_KEEPALIVE)
+            if not events:
+                yield b": keepalive\n\n"
+            for event in events:
+                yield f"id: {event['seq']}\nevent: {event['name']}\ndata: {json.dumps(event, default=to_jsonable)}\n\n".encode()
+
+    response = await make_response(generate(since), {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    response.timeout = None # Streams stay open
+    return response
+
+@machine_route('/credit', methods=['GET'])
+async def get_credit():
+    """Current credit, totals and recent payment transactions, from memory (see app.py)"""
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), MAX_EVENT_WAIT)
+    return jsonify(await g.vmc.credit(since, wait=wait))
+
+@machine_route('/telemetry', methods=['GET'])
+async def get_telemetry():
+    """
+    Temperature, humidity and peripheral states sampled in the background, from memory.
+    Optional query args: resolution=raw|1m|1h, since=<epoch>, until=<epoch>,
+    fields=temperature,door, limit=N (newest N points)
+    """
+    fields = request.args.get('fields')
+    try:
+        return jsonify(g.vmc.telemetry(
+            resolution=request.args.get('resolution', 'raw'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float),
+            fields=fields.split(',') if fields else None,
+            limit=request.args.get('limit', type=int),
+        ))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_QUERY", "detail": str(e)}), 400
+
+@machine_route('/selections', methods=['GET'])
+async def get_selections():
+    """Price / inventory / capacity / product ID per slot, served from memory"""
+    return jsonify(g.vmc.selections())
+
+@machine_route('/selections', methods=['POST'])
+async def set_selections():
+    """Bulk price / inventory / capacity / product ID (0x12-0x15). Unchanged values are skipped (see app.py)."""
+    body = await request.get_json()
+    return jsonify(await g.vmc.apply_planogram(body.get('selections', []), timeout=body.get('timeout')))
+
+@machine_route('/selections/<int:slot_id>', methods=['GET'])
+async def get_selection(slot_id):
+    """One slot from the catalog"""
+    selection = g.vmc.selection(slot_id)
+    if selection is None:
+        return jsonify({"error": "Unknown Selection"}), 404
+    return jsonify(selection)
+
+@machine_route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Prometheus text exposition of driver latency histograms and counters"""
+    return g.vmc.metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@machine_route('/profile', methods=['GET'])
+async def get_profile():
+    """Last reported value of each menu setting (0x71), served from memory"""
+    return jsonify(g.vmc.settings())
+
+@machine_route('/profile', methods=['POST'])
+async def apply_machine_profile():
+    """Configuration profile over 0x70: only changed settings are written (see app.py)"""
+    body = await request.get_json()
+    return jsonify(await g.vmc.apply_profile(body.get('settings', {}), refresh=bool(body.get('refresh')),
+                                             timeout=body.get('timeout')))
+
+@app.route('/machines/profile', methods=['POST'])
+async def apply_fleet_profile():
+    """One profile on several machines (default: all), each on its own link at the same time"""
+    body = await request.get_json()
+    machine_ids = body.get('machines') or list(machines)
+    unknown = [machine_id for machine_id in machine_ids if machine_id not in machines]
+    if unknown:
+        raise UnknownMachine(unknown[0])
+
+    async def apply(service):
+        try:
+            return await service.apply_profile(body.get('settings', {}), refresh=bool(body.get('refresh')),
+                                               timeout=body.get('timeout'))
+        except Overloaded as e:
+            return {"error": e.args[0], "retry_after": e.args[1]}
+
+    reports = await asyncio.gather(*(apply(machines[machine_id]) for machine_id in machine_ids))
+    return jsonify({"machines": dict(zip(machine_ids, reports))})
+
+@machine_route('/sales/<kind>', methods=['GET'])
+async def get_sales(kind):
+    """
+    Sales report from the local database: daily, monthly, yearly, total, selection or coins.
+    Optional query args (period reports): since=2026-10-01, until=2026-10-31
+    """
+    try:
+        return jsonify(await g.vmc.sales_report(kind, request.args.get('since'), request.args.get('until')))
+    except ValueError as e:
+        return jsonify({"error": "UNKNOWN_REPORT", "detail": str(e)}), 404
+
+@machine_route('/sales/vends', methods=['GET'])
+async def get_vend_log():
+    """
+    Every vend result (0x04) seen on the link.
+    Optional query args: since=<epoch>, until=<epoch>, selection=N, limit=N (newest N)
+    """
+    return jsonify({"vends": await g.vmc.vend_log(
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        selection=request.args.get('selection', type=int),
+        limit=request.args.get('limit', type=int),
+    )})
+
+@machine_route('/sales/refresh', methods=['POST'])
+async def refresh_sales():
+    """Pull the reports now (still only while the link is idle) instead of at the next interval"""
+    return jsonify(g.vmc.refresh_sales()), 202
+
+@machine_route('/admin/trace', methods=['GET'])
+async def get_trace():
+    """
+    Dumps the driver's trace ring: command spans (cmd.queued ... cmd.completed) and driver events.
+    Optional query args: since=<seq> (pass the returned `next`), level=info, span=<id>, limit=N
+    """
+    try:
+        return jsonify(g.vmc.trace(
+            since=request.args.get('since', 0, type=int),
+            level=request.args.get('level'),
+            span=request.args.get('span', type=int),
+            limit=request.args.get('limit', type=int),
+        ))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_LEVEL", "detail": str(e)}), 400
+
+@machine_route('/admin/trace', methods=['POST'])
+async def set_trace():
+    """
+    Changes what is recorded, at runtime.
+    Usage: {"level": "info", "sample": 10}   (sample: keep 1 in N spans below WARN)
+    """
+    body = await request.get_json()
+    try:
+        return jsonify(g.vmc.configure_trace(body.get('level'), body.get('sample')))
+    except ValueError as e:
+        return jsonify({"error": "INVALID_LEVEL", "detail": str(e)}), 400
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,239 @@
+# bench_codec.py
+# Microbenchmarks for the protocol hot paths (no serial port needed):
+# build_packet, calculate_xor, frame decoding + dispatch, the per-POLL path
+# and the response dict built in _handle_data_packet.
+#
+#   python bench_codec.py                     # run and compare to bench_baseline.json
+#   python bench_codec.py --save-baseline     # record a new baseline
+#   python bench_codec.py --stream dump.bin   # also decode a recorded raw byte stream
+
+import io
+import sys
+import json
+import timeit
+import platform
+import argparse
+import contextlib
+from vmc_codes import *
+from vmc_driver import VMCDriver
+from vmc_simulator import build_frame
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+REGRESSION_THRESHOLD = 0.20 # Flag anything >20% slower than baseline
+POLL_BUDGET_US = 1000.0     # The POLL reply must leave well inside the VMC poll window
+
+
+class NullSerial:
+    """Swallows driver writes"""
+    in_waiting = 0
+
+    def write(self, data):
+        return len(data)
+
+
+def make_driver():
+    driver = VMCDriver('bench')
+    driver.serial = NullSerial()
+    return driver
+
+
+# --- SYNTHETIC STREAMS ---
+
+def stream_idle(polls):
+    """VMC idle: nothing but POLLs"""
+    return build_frame(CMD_POLL, [], 0) * polls
+
+
+def stream_sync(slots):
+    """Startup sync burst: one 0x11 per selection"""
+    out = bytearray()
+    for slot in range(1, slots + 1):
+        payload = slot.to_bytes(2, 'big') + (100 + slot).to_bytes(4, 'big') + bytes([5, 10]) + slot.to_bytes(2, 'big')
+        out += build_frame(0x11, payload, slot % 255 + 1)
+        out += build_frame(CMD_POLL, [], 0)
+    return bytes(out)
+
+
+def stream_mixed(rounds):
+    """Typical traffic: POLLs, ACKs, status and dispense replies, money events"""
+    unit = (build_frame(CMD_POLL, [], 0) + build_frame(CMD_ACK, [], 0)
+            + build_frame(0x54, [0, 0, 0, 0], 1) + build_frame(CMD_POLL, [], 0)
+            + build_frame(0x04, [0x02, 0x00, 0x0A], 2) + build_frame(0x21, [1, 0, 0, 1, 0xF4], 3))
+    return unit * rounds
+
+
+def stream_large(frames):
+    """Max-length payloads, including FA FB pairs inside the data"""
+    payload = bytes([0xFA, 0xFB] * 127)
+    return build_frame(0x71, payload, 1) * frames
+
+
+# --- BENCHMARKS ---
+# Each returns (callable, ops_per_call)
+
+def bench_build_packet_ack():
+    driver = make_driver()
+    return (lambda: driver.build_packet(CMD_ACK, [], 0)), 1
+
+
+def bench_build_packet_price():
+    driver = make_driver()
+    data = (10).to_bytes(2, 'big') + (150).to_bytes(4, 'big')
+    return (lambda: driver.build_packet(CMD_SEND["SET_PRICE"], data, 7)), 1
+
+
+def bench_calculate_xor_small():
+    driver = make_driver()
+    packet = list(build_frame(0x04, [0x02, 0x00, 0x0A], 1)[:-1])
+    return (lambda: driver.calculate_xor(packet)), 1
+
+
+def bench_calculate_xor_large():
+    driver = make_driver()
+    packet = build_frame(0x71, bytes(254), 1)[:-1]
+    return (lambda: driver.calculate_xor(packet)), 1
+
+
+def bench_poll_idle():
+    driver = make_driver()
+    return driver._handle_poll, 1
+
+
+def bench_poll_send():
+    """POLL with a queued command: pop, build, write"""
+    driver = make_driver()
+    data = (10).to_bytes(2, 'big')
+
+    def run():
+        driver.send_command_nowait(CMD_SEND["DISPENSE_ITEM"], data, timeout=None)
+        driver._handle_poll()
+        driver.active_command = None
+    return run, 1
+
+
+def bench_data_packet_response():
+    """_handle_data_packet completing a waiting command (builds the response dict)"""
+    driver = make_driver()
+    frame = build_frame(0x71, bytes(range(40)), 1)
+    entry = {'cmd': CMD_SEND["MENU_COMMAND_WRAPPER"], 'expect_code': 0x71, 'future': None, 'stream': None, 'frames': 0}
+
+    class Done:
+        def done(self):
+            return True
+
+    entry['future'] = Done()
+
+    def run():
+        driver.active_command = entry
+        driver._handle_data_packet(frame)
+    return run, 1
+
+
+def make_decode_bench(stream, chunk_size):
+    def factory():
+        driver = make_driver()
+        frames = driver.decoder.feed(stream)
+        count = len(frames)
+        chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+        def run():
+            driver.active_command = None
+            for chunk in chunks:
+                driver._feed(chunk)
+        return run, count
+    return factory
+
+
+BENCHMARKS = {
+    'build_packet.ack': bench_build_packet_ack,
+    'build_packet.set_price': bench_build_packet_price,
+    'calculate_xor.8B': bench_calculate_xor_small,
+    'calculate_xor.258B': bench_calculate_xor_large,
+    'handle_poll.idle': bench_poll_idle,
+    'handle_poll.send': bench_poll_send,
+    'handle_data_packet.response': bench_data_packet_response,
+    'decode.idle_polls.1x64B': make_decode_bench(stream_idle(200), 64),
+    'decode.mixed.whole': make_decode_bench(stream_mixed(50), 1 << 16),
+    'decode.mixed.1B': make_decode_bench(stream_mixed(50), 1),
+    'decode.sync_60.256B': make_decode_bench(stream_sync(60), 256),
+    'decode.large.whole': make_decode_bench(stream_large(20), 1 << 16),
+}
+
+
+def measure(factory, repeat=5):
+    """Best-of-repeat time per operation, in microseconds"""
+    func, ops = factory()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / (number * ops) * 1e6
+
+
+def run_suite(names, repeat, extra=None):
+    results = {}
+    benches = dict(BENCHMARKS, **(extra or {}))
+    # Keep any stray driver output out of the numbers' noise
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in names or benches:
+            results[name] = measure(benches[name], repeat)
+    return results
+
+
+def compare(results, baseline):
+    regressions = []
+    print(f"{'benchmark':<32}{'us/op':>12}{'baseline':>12}{'change':>10}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base:
+            change = (value - base) / base
+            flag = '  REGRESSION' if change > REGRESSION_THRESHOLD else ''
+            print(f"{name:<32}{value:>12.3f}{base:>12.3f}{change:>+10.1%}{flag}")
+            if flag:
+                regressions.append(name)
+        else:
+            print(f"{name:<32}{value:>12.3f}{'-':>12}{'-':>10}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="VMC codec microbenchmarks")
+    parser.add_argument('names', nargs='*', help="Subset of benchmarks to run")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stream', default=None, help="Raw byte dump of recorded serial traffic to decode")
+    args = parser.parse_args()
+
+    extra = {}
+    if args.stream:
+        with open(args.stream, 'rb') as f:
+            recorded = f.read()
+        extra['decode.recorded.256B'] = make_decode_bench(recorded, 256)
+        if args.names:
+            args.names.append('decode.recorded.256B')
+
+    results = run_suite(args.names, args.repeat, extra)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    except FileNotFoundError:
+        baseline = {}
+
+    regressions = compare(results, baseline)
+
+    poll_us = max(results.get('handle_poll.idle', 0.0), results.get('handle_poll.send', 0.0))
+    if poll_us:
+        verdict = 'OK' if poll_us < POLL_BUDGET_US else 'OVER BUDGET'
+        print(f"\nPer-POLL path: {poll_us:.1f} us (budget {POLL_BUDGET_US:.0f} us) {verdict}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,191 @@
+# bench_load.py
+# End-to-end load test: VMCSimulator on a pty <- VMCDriver <- Flask endpoints,
+# hammered by concurrent clients. Reports throughput and p50/p99 latency.
+#
+#   python bench_load.py --clients 16 --requests 400 --poll-interval 0.02
+#   python bench_load.py --url http://127.0.0.1:5000   (against a running server)
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# (method, path, body) and relative weight
+REQUEST_MIX = [
+    (('GET', '/status', None), 5),
+    (('POST', '/dispense', {'slot_id': 1}), 2),
+    (('POST', '/price', {'slot_id': 1, 'price': 150}), 2),
+    (('POST', '/menu', {'sub_cmd': 'QUERY_TEMP_CONTROLLER', 'params': []}), 1),
+    (('GET', '/events', None), 1),
+]
+
+# Only one vend per slot may run at a time (409 otherwise): spread dispenses over this many slots
+DISPENSE_SLOTS = 60
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LocalClient:
+    """Calls the Flask app in-process through its test client"""
+
+    def __init__(self, flask_app):
+        self.local = threading.local()
+        self.flask_app = flask_app
+
+    def request(self, method, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.flask_app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    """Calls a running server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e: # 4xx / 5xx still carry a JSON body
+            return e.code, json.loads(e.read() or b'null')
+
+
+def run_load(client, clients, total_requests, seed=None):
+    rng = random.Random(seed)
+    calls = [item for item, weight in REQUEST_MIX for _ in range(weight)]
+    plan = []
+    for _ in range(total_requests):
+        method, path, body = rng.choice(calls)
+        if path == '/dispense':
+            body = dict(body, slot_id=rng.randint(1, DISPENSE_SLOTS))
+        plan.append((method, path, body))
+
+    results = [] # (path, latency, outcome): 'ok', 'shed' (503 from admission control) or 'error'
+    results_lock = threading.Lock()
+
+    def one(call):
+        method, path, body = call
+        t0 = time.perf_counter()
+        try:
+            status, payload = client.request(method, path, body)
+            if status == 503:
+                outcome = 'shed'
+            elif status == 200 and not (isinstance(payload, dict) and 'error' in payload):
+                outcome = 'ok'
+            else:
+                outcome = 'error'
+        except Exception:
+            outcome = 'error'
+        latency = time.perf_counter() - t0
+        with results_lock:
+            results.append((path, latency, outcome))
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, plan))
+    elapsed = time.perf_counter() - t_start
+
+    return summarize(results, elapsed)
+
+
+def summarize(results, elapsed):
+    report = {
+        'requests': len(results),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        'endpoints': {},
+    }
+    groups = {'ALL': results}
+    for row in results:
+        groups.setdefault(row[0], []).append(row)
+
+    for name, rows in groups.items():
+        latencies = sorted(latency for _, latency, _ in rows)
+        stats = {
+            'count': len(rows),
+            'errors': sum(1 for _, _, outcome in rows if outcome == 'error'),
+            'shed': sum(1 for _, _, outcome in rows if outcome == 'shed'),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+        if name == 'ALL':
+            report.update(stats)
+        else:
+            report['endpoints'][name] = stats
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']}s "
+          f"-> {report['throughput_rps']} req/s, errors={report['errors']}, shed={report['shed']}")
+    print(f"{'endpoint':<12}{'count':>8}{'errors':>8}{'shed':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = dict(report['endpoints'], ALL=report)
+    for name, stats in rows.items():
+        print(f"{name:<12}{stats['count']:>8}{stats['errors']:>8}{stats['shed']:>8}"
+              f"{stats['p50_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent load test for the VMC HTTP API")
+    parser.add_argument('--url', default=None, help="Test a running server instead of an in-process simulator")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--drop-ack', type=float, default=0.0)
+    parser.add_argument('--corrupt-xor', type=float, default=0.0)
+    parser.add_argument('--split-frames', type=float, default=0.0)
+    parser.add_argument('--event-interval', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    sim = None
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        from vmc_simulator import VMCSimulator
+        sim = VMCSimulator(
+            poll_interval=args.poll_interval, event_interval=args.event_interval,
+            drop_ack=args.drop_ack, corrupt_xor=args.corrupt_xor,
+            split_frames=args.split_frames, seed=args.seed,
+        )
+        os.environ['VMC_SERIAL_PORT'] = sim.start()
+
+        import app as vmc_app
+        vmc_app.pool.start()
+        client = LocalClient(vmc_app.app)
+
+    report = run_load(client, args.clients, args.requests, seed=args.seed)
+    if sim:
+        report['simulator'] = dict(sim.stats)
+        report['decoder'] = {
+            'frames_ok': vmc_app.vmc.decoder.frames_ok,
+            'checksum_errors': vmc_app.vmc.decoder.checksum_errors,
+        }
+        vmc_app.pool.stop()
+        sim.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report['errors'] else 0)
@@ -0,0 +1,139 @@
+# vmc_admission.py
+# Admission control: refuse work the serial link cannot finish in time,
+# quickly, instead of letting it pile up until the 5 s TIMEOUT.
+#
+# Two layers:
+# - Gate (HTTP layer): per-endpoint limit on concurrent requests plus a
+#   bounded wait queue. Beyond that: Overloaded -> 503 + Retry-After.
+# - AdmissionController (owner of the driver): estimates how long the
+#   serial backlog ahead of a new command will take to drain (commands
+#   ahead of it x measured seconds per command) and refuses the command if
+#   that exceeds its class budget.
+#
+# Classes are the scheduler's priorities. Vends are queued ahead of
+# everything and never shed on backlog; status and menu/diagnostic traffic
+# are shed first, so under load customers get their items and dashboards
+# back off.
+
+import math
+import threading
+from vmc_scheduler import PRIORITY_VEND, PRIORITY_CONTROL, PRIORITY_STATUS
+
+PRIORITY_NAMES = {PRIORITY_VEND: 'vend', PRIORITY_CONTROL: 'control', PRIORITY_STATUS: 'status'}
+
+# Seconds of serial backlog (ahead of the new command) beyond which a class is refused
+SHED_AFTER = {
+    PRIORITY_VEND: None,   # Never: vends jump the queue anyway
+    PRIORITY_CONTROL: 2.5, # Half the default 5 s timeout: vends may still jump ahead
+    PRIORITY_STATUS: 1.5,
+}
+
+# Per endpoint: (concurrent requests, requests waiting beyond that, longest wait in seconds)
+GATE_LIMITS = {
+    PRIORITY_VEND: (64, 64, 5.0),
+    PRIORITY_CONTROL: (16, 16, 1.0),
+    PRIORITY_STATUS: (8, 8, 0.25),
+}
+
+COMMAND_SECONDS = 0.25 # Initial guess at line time per command (about one slow POLL)
+SMOOTHING = 0.2        # EWMA weight of each new measurement
+MIN_RETRY_AFTER = 1    # Seconds
+
+
+class Overloaded(RuntimeError):
+    """args: (reason, retry_after seconds)"""
+
+
+def retry_after(seconds):
+    return max(MIN_RETRY_AFTER, math.ceil(seconds))
+
+
+class AdmissionController:
+    """
+    One per driver. The serial thread reports every command it takes off
+    the queue (on_pop); API threads ask check() before queueing.
+    """
+
+    def __init__(self, driver, shed_after=None):
+        self.driver = driver
+        self.shed_after = dict(SHED_AFTER, **(shed_after or {}))
+        self.command_seconds = COMMAND_SECONDS
+        self.last_pop = None # Set while more commands were waiting at the last pop
+        self.shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def on_pop(self, now, waiting):
+        """
+        Serial thread: a command just took the line, `waiting` still queued.
+        The gap between two pops while commands were waiting is the time
+        the link needs per command.
+        """
+        if self.last_pop is not None:
+            self.command_seconds += SMOOTHING * (now - self.last_pop - self.command_seconds)
+        self.last_pop = now if waiting else None
+
+    def drain_time(self, priority):
+        """Estimated seconds until a new command of this class would be sent"""
+        driver = self.driver
+        ahead = driver.scheduler.depth(priority) + (driver.active_command is not None)
+        return ahead * self.command_seconds
+
+    def check(self, priority):
+        """Raises Overloaded when the backlog ahead of this class is too long"""
+        budget = self.shed_after.get(priority)
+        if budget is None:
+            return
+        drain = self.drain_time(priority)
+        if drain > budget:
+            self.shed[priority] += 1
+            raise Overloaded("SERIAL_BACKLOG", retry_after(drain))
+
+    def state(self):
+        return {
+            "command_seconds": round(self.command_seconds, 4),
+            "backlog_seconds": {name: round(self.drain_time(priority), 3) for priority, name in PRIORITY_NAMES.items()},
+            "shed": {PRIORITY_NAMES[priority]: count for priority, count in self.shed.items()},
+        }
+
+
+class Gate:
+    """Concurrency limit with a bounded, time-limited wait queue (threads)"""
+
+    def __init__(self, limit, queue, max_wait):
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def enter(self):
+        with self.cond:
+            if self.active < self.limit:
+                self.active += 1
+                return
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                raise Overloaded("TOO_MANY_REQUESTS", retry_after(self.max_wait))
+
+            self.waiting += 1
+            try:
+                admitted = self.cond.wait_for(lambda: self.active < self.limit, self.max_wait)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                raise Overloaded("TOO_MANY_REQUESTS", retry_after(self.max_wait))
+            self.active += 1
+
+    def leave(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def __enter__(self):
+        self.enter()
+        return self
+
+    def __exit__(self, *exc):
+        self.leave()
@@ -0,0 +1,78 @@
+import asyncio
+import serial
+from vmc_driver import VMCDriver, DEFAULT_TIMEOUT
+from vmc_scheduler import PRIORITY_CONTROL
+
+
+class AsyncVMCDriver(VMCDriver):
+    """
+    asyncio flavour of VMCDriver.
+
+    The protocol state machine (POLL / ACK / data handling, command queue)
+    is inherited unchanged; only the I/O differs. The port is opened
+    non-blocking and watched with loop.add_reader(), so POLLs are answered
+    on the event loop and a waiting command costs a coroutine, not a thread.
+    Where the loop cannot watch the port's fd (e.g. Windows proactor), a
+    blocking reader runs in the default executor and hands chunks back to
+    the loop.
+    """
+
+    def __init__(self, port, baudrate=57600, capture_path=None, poll_tuner=None, snapshot_path=None,
+                 tracer=None, trace_path=None, telemetry_sampler=None, sales=None):
+        super().__init__(port, baudrate, capture_path, poll_tuner, snapshot_path, tracer, trace_path, telemetry_sampler,
+                         sales)
+        self.loop = None
+        self.reader_task = None
+
+    async def start(self):
+        """Opens the port and starts reading on the running event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.open(timeout=0) # Non-blocking: only read what is already there
+
+        try:
+            self.loop.add_reader(self.serial.fileno(), self._on_readable)
+        except (NotImplementedError, AttributeError, ValueError):
+            # No fd watching on this platform: bridge a blocking reader
+            self.serial.timeout = None
+            self.reader_task = self.loop.run_in_executor(None, self._executor_reader)
+        print(f"[VMC] Async driver started on {self.port}")
+
+    async def stop(self):
+        """Stops reading and closes the port"""
+        self.running = False
+        if self.reader_task is None:
+            self.loop.remove_reader(self.serial.fileno())
+        self.serial.close()
+        if self.reader_task is not None:
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+        self._close_capture()
+        self._close_snapshot()
+        # Joins the ingestor thread, which may be waiting on a command the loop resolves
+        await asyncio.to_thread(self._close_sales)
+        self._close_trace()
+
+    async def send_command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, priority=PRIORITY_CONTROL):
+        """
+        API CALL: Queues a command and awaits the response or timeout.
+        Same result dicts as send_command_blocking().
+        """
+        entry = self.scheduler.submit(cmd_byte, data_bytes, timeout, priority=priority)
+        # shield(): a timed-out waiter must not cancel a future other
+        # (coalesced) callers may still be waiting on
+        waiter = asyncio.shield(asyncio.wrap_future(entry['future']))
+
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.scheduler.cancel(entry)
+            return {"error": "TIMEOUT"}
+
+    def _executor_reader(self):
+        """Fallback reader thread: blocking reads, dispatch on the loop"""
+        while self.running:
+            try:
+                chunk = self.serial.read(self.serial.in_waiting or 1)
+            except serial.SerialException:
+                break
+            if chunk:
+                self.loop.call_soon_threadsafe(self._feed, chunk)
@@ -0,0 +1,101 @@
+# vmc_capture.py
+# Append-only binary capture of serial traffic, written through mmap so the
+# serial thread only does a struct.pack_into and a slice copy per frame.
+#
+# File layout:
+#   MAGIC(8) + wall_clock(8, double) + monotonic(8, double)   <- when the capture started
+#   then records: monotonic(8, double) + direction(1) + length(2) + bytes(length)
+# Unused space at the end is zero-filled; a zero-length record ends the log.
+
+import os
+import mmap
+import time
+import struct
+
+MAGIC = b'VMCCAP01'
+HEADER = struct.Struct('<8sdd')
+RECORD = struct.Struct('<dBH')
+
+RX = 0 # VMC -> us (raw bytes as read from the port)
+TX = 1 # us -> VMC (one frame per write)
+
+GROW_BYTES = 1 << 20 # File grows (and is remapped) in 1 MiB steps
+
+
+class CaptureWriter:
+    """Single-writer: call write() only from the thread that owns the port"""
+
+    def __init__(self, path, grow_bytes=GROW_BYTES):
+        self.path = path
+        self.grow_bytes = grow_bytes
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            # Append after the last complete record
+            self.pos = scan_end(path)
+        else:
+            self.file.write(HEADER.pack(MAGIC, time.time(), time.monotonic()))
+            self.pos = HEADER.size
+
+        self.size = max(os.path.getsize(path), self.pos + grow_bytes)
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    def write(self, direction, data):
+        length = len(data)
+        end = self.pos + RECORD.size + length
+        if end > self.size:
+            self._grow(end)
+        RECORD.pack_into(self.map, self.pos, time.monotonic(), direction, length)
+        self.map[self.pos + RECORD.size:end] = data
+        self.pos = end
+
+    def _grow(self, needed):
+        self.map.close()
+        self.size = needed + self.grow_bytes
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    def close(self):
+        """Flushes and trims the zero padding"""
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.pos)
+        self.file.close()
+
+
+def read_capture(path):
+    """
+    Returns (header, records): header is {'wall_clock', 'monotonic'},
+    records yields (monotonic, direction, bytes).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, wall_clock, mono = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a VMC capture")
+
+    def records():
+        pos = HEADER.size
+        while pos + RECORD.size <= len(data):
+            ts, direction, length = RECORD.unpack_from(data, pos)
+            if length == 0 and ts == 0.0:
+                return # Zero padding: end of log
+            start = pos + RECORD.size
+            if start + length > len(data):
+                return # Truncated last record
+            yield ts, direction, data[start:start + length]
+            pos = start + length
+
+    return {'wall_clock': wall_clock, 'monotonic': mono}, records()
+
+
+def scan_end(path):
+    """Offset just past the last complete record"""
+    _, records = read_capture(path)
+    pos = HEADER.size
+    for _, _, payload in records:
+        pos += RECORD.size + len(payload)
+    return pos
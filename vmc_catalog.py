@@ -0,0 +1,170 @@
+# vmc_catalog.py
+# In-memory view of every selection (slot) on the machine, kept up to date
+# from what crosses the serial link so reads never need a VMC round trip.
+
+import time
+import threading
+from vmc_codes import CMD_SEND
+from vmc_schema import COMMAND_SCHEMAS
+
+DISPENSE_SUCCESS = 0x02 # DISPENSE_STATUS_CODES
+
+# SET_* commands (acked, no data reply) -> the field they change
+SET_COMMAND_FIELDS = {
+    CMD_SEND["SET_PRICE"]: 'price',
+    CMD_SEND["SET_INVENTORY"]: 'inventory',
+    CMD_SEND["SET_CAPACITY"]: 'capacity',
+    CMD_SEND["SET_PRODUCT_ID"]: 'product_id',
+}
+
+FIELDS = ('price', 'inventory', 'capacity', 'product_id')
+
+
+class SelectionCatalog:
+    """
+    slot -> [price, inventory, capacity, product_id]
+
+    Written by the serial thread, read by API threads. Every change bumps
+    `version` so readers can tell whether anything moved.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.version = 0
+        self.updated_at = None
+        
+        # Warm start (vmc_snapshot.py): slots loaded from disk, then checked
+        # against the VMC's own 0x11 reports
+        self.loaded_at = None  # When the loaded snapshot was taken
+        self.reconcile = None  # {'state', 'started', 'finished', 'reports', 'changed', 'added', 'removed'}
+        self.seen = set()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    # --- WRITERS (serial thread) ---
+
+    def apply_report(self, report):
+        """0x11 SELECTION_INFO_REPORT record (vmc_schema)"""
+        entry = [report.price, report.inventory, report.capacity, report.product_id]
+        if entry[-1] is None:
+            return False # Short frame
+        slot = report.selection
+        with self.lock:
+            previous = self.slots.get(slot)
+            self.slots[slot] = entry
+            self._touch()
+            if self.reconcile and self.reconcile['state'] == 'running':
+                self.reconcile['reports'] += 1
+                self.seen.add(slot)
+                if previous is None:
+                    self.reconcile['added'].append(slot)
+                elif previous != entry:
+                    self.reconcile['changed'].append(slot)
+        return True
+
+    def apply_set(self, cmd_byte, data):
+        """A SET_PRICE / SET_INVENTORY / SET_CAPACITY / SET_PRODUCT_ID was ACKed"""
+        field = SET_COMMAND_FIELDS.get(cmd_byte)
+        if field is None:
+            return False
+        command = COMMAND_SCHEMAS[cmd_byte].decode(data)
+        value = getattr(command, field)
+        if value is None:
+            return False
+        with self.lock:
+            record = self.slots.setdefault(command.selection, [None, None, None, None])
+            record[FIELDS.index(field)] = value
+            self._touch()
+        return True
+
+    def apply_dispense(self, status):
+        """0x04 DISPENSING_STATUS record: one item left the slot on success"""
+        if status.status != DISPENSE_SUCCESS or status.selection is None:
+            return False
+        slot = status.selection
+        with self.lock:
+            record = self.slots.get(slot)
+            if record is None or not record[1]:
+                return False
+            record[1] -= 1
+            self._touch()
+        return True
+
+    # --- WARM START ---
+
+    def load(self, slots, saved_at):
+        """Seed from a snapshot: {slot: [price, inventory, capacity, product_id]}"""
+        with self.lock:
+            self.slots = {slot: list(record) for slot, record in slots.items()}
+            self.loaded_at = saved_at
+            self.version += 1
+            self.updated_at = saved_at
+
+    def begin_reconcile(self):
+        """A full sync (0x31) is on its way: track what its reports change"""
+        with self.lock:
+            self.seen = set()
+            self.reconcile = {
+                'state': 'running', 'started': time.time(), 'finished': None,
+                'reports': 0, 'changed': [], 'added': [], 'removed': [],
+            }
+
+    def end_reconcile(self, failed=False):
+        """
+        The sync's reports are over. Slots the VMC no longer reports are dropped
+        (unless the sync failed). Returns the reconcile summary.
+        """
+        with self.lock:
+            reconcile = self.reconcile
+            if reconcile is None or reconcile['state'] != 'running':
+                return reconcile
+            if failed:
+                reconcile['state'] = 'failed'
+            else:
+                reconcile['state'] = 'done'
+                reconcile['removed'] = sorted(set(self.slots) - self.seen)
+                for slot in reconcile['removed']:
+                    del self.slots[slot]
+                if reconcile['removed']:
+                    self._touch()
+            reconcile['finished'] = time.time()
+            return reconcile
+
+    def export(self):
+        """(version, {slot: record}) copy, for the snapshot writer"""
+        with self.lock:
+            return self.version, {slot: list(record) for slot, record in self.slots.items()}
+
+    def _reconcile_copy(self):
+        if self.reconcile is None:
+            return None
+        return {key: list(value) if isinstance(value, list) else value
+                for key, value in self.reconcile.items()}
+
+    @property
+    def reconciling(self):
+        return self.reconcile is not None and self.reconcile['state'] == 'running'
+
+    # --- READERS ---
+
+    def get(self, slot):
+        with self.lock:
+            record = self.slots.get(slot)
+            return dict(zip(FIELDS, record), slot=slot) if record else None
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "updated_at": self.updated_at,
+                "loaded_at": self.loaded_at,
+                "reconcile": self._reconcile_copy(),
+                "selections": [dict(zip(FIELDS, record), slot=slot)
+                               for slot, record in sorted(self.slots.items())],
+            }
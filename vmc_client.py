@@ -0,0 +1,223 @@
+# vmc_client.py
+# Thin client for vmc_daemon.py, used by web workers instead of a local DriverPool.
+#
+# DaemonClient keeps a small pool of Unix socket connections per process:
+# a call borrows an idle connection (or opens one), and returns it
+# afterwards. Long-polls and streams just hold theirs for the duration.
+# MachineClient mirrors vmc_service.MachineService method for method.
+
+import socket
+import threading
+from vmc_driver import DEFAULT_TIMEOUT
+from vmc_jobs import JOB_TIMEOUT
+from vmc_stream import STREAM_QUIET
+from vmc_scheduler import PRIORITY_CONTROL
+from vmc_ipc import encode, read_frame, raise_remote, DaemonUnavailable
+
+POOL_SIZE = 8          # Idle connections kept per process (more are opened on demand)
+CONNECT_TIMEOUT = 2.0  # Seconds; calls themselves are bounded by the daemon's own timeouts
+
+
+class DaemonClient:
+    def __init__(self, path, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT):
+        self.path = path
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        self.idle = []
+        self.clients = {}
+        self._default = None
+
+    @property
+    def default(self):
+        """The daemon's default machine (asked once)"""
+        if self._default is None:
+            self._default = self.describe()['default']
+        return self._default
+
+    def machine(self, machine_id):
+        """Unknown IDs raise UnknownMachine on the first call, from the daemon"""
+        client = self.clients.get(machine_id)
+        if client is None:
+            client = self.clients[machine_id] = MachineClient(self, machine_id)
+        return client
+
+    def describe(self):
+        return self.call(None, 'machines')
+
+    def call(self, machine_id, op, **args):
+        """Run one MachineService method in the daemon; its exceptions are raised here"""
+        sock = self._send(machine_id, op, args)
+        reply = self._receive(sock)
+        self._checkin(sock)
+        if 'error' in reply:
+            raise_remote(reply)
+        return reply['ok']
+
+    def stream(self, machine_id, op, **args):
+        """
+        Run a streaming method (vmc_daemon.STREAM_OPS): an iterator over its
+        items. Errors before the first item are raised here, not on iteration.
+        The connection stays checked out until the stream ends.
+        """
+        sock = self._send(machine_id, op, args)
+        first = self._receive(sock)
+        if 'item' not in first:
+            self._checkin(sock)
+            if 'error' in first:
+                raise_remote(first)
+            return iter(())
+        return self._items(sock, first)
+
+    def _items(self, sock, reply):
+        try:
+            while 'item' in reply:
+                yield reply['item']
+                reply = self._receive(sock)
+        except BaseException:
+            sock.close() # Left mid-stream: the rest of the replies are still coming
+            raise
+        self._checkin(sock)
+        if 'error' in reply:
+            raise_remote(reply)
+
+    def _send(self, machine_id, op, args):
+        message = encode({"op": op, "machine": machine_id, "args": args})
+        sock, reused = self._checkout()
+        try:
+            try:
+                sock.sendall(message)
+            except OSError:
+                if not reused:
+                    raise
+                # Pooled connection went stale (daemon restarted): nothing was sent
+                sock.close()
+                sock, reused = self._connect(), False
+                sock.sendall(message)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"{self.path}: {e}") from e
+        return sock
+
+    def _receive(self, sock):
+        """Next reply dict on a connection (closed on any failure)"""
+        try:
+            frame = read_frame(sock)
+            if frame is None:
+                raise ConnectionError("Daemon closed the connection")
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"{self.path}: {e}") from e
+        except BaseException:
+            sock.close() # Reply state unknown: never reuse
+            raise
+        return frame[1]
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for sock in idle:
+            sock.close()
+
+    def _checkout(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self._connect(), False
+
+    def _checkin(self, sock):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(sock)
+                return
+        sock.close()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.connect_timeout)
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(str(e)) from e
+        sock.settimeout(None)
+        return sock
+
+
+class MachineClient:
+    """Same methods and return values as MachineService, answered by the daemon"""
+
+    def __init__(self, client, machine_id):
+        self.client = client
+        self.machine_id = machine_id
+
+    def _call(self, op, **args):
+        return self.client.call(self.machine_id, op, **args)
+
+    def info(self):
+        return self._call('info')
+
+    def stream_command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, quiet=STREAM_QUIET,
+                       priority=PRIORITY_CONTROL):
+        return self.client.stream(self.machine_id, 'stream_command', cmd_byte=cmd_byte, data_bytes=bytes(data_bytes),
+                                  timeout=timeout, quiet=quiet, priority=priority)
+
+    def command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, priority=PRIORITY_CONTROL):
+        return self._call('command', cmd_byte=cmd_byte, data_bytes=bytes(data_bytes), timeout=timeout, priority=priority)
+
+    def status(self, cmd_byte, max_age=None, stale_window=None):
+        return tuple(self._call('status', cmd_byte=cmd_byte, max_age=max_age, stale_window=stale_window))
+
+    def submit_job(self, cmd_byte, data_bytes=b'', timeout=JOB_TIMEOUT, priority=PRIORITY_CONTROL):
+        return self._call('submit_job', cmd_byte=cmd_byte, data_bytes=bytes(data_bytes), timeout=timeout, priority=priority)
+
+    def get_job(self, job_id, wait=0):
+        return self._call('get_job', job_id=job_id, wait=wait)
+
+    def start_vend(self, selection, amount=None, check=False, timeout=DEFAULT_TIMEOUT, wait=None):
+        return self._call('start_vend', selection=selection, amount=amount, check=check, timeout=timeout, wait=wait)
+
+    def get_vend(self, vend_id, wait=0):
+        return self._call('get_vend', vend_id=vend_id, wait=wait)
+
+    def events(self, since=0, codes=None, limit=None, wait=0):
+        return tuple(self._call('events', since=since, codes=sorted(codes) if codes else None, limit=limit, wait=wait))
+
+    def credit(self, since=0, wait=0):
+        return self._call('credit', since=since, wait=wait)
+
+    def selections(self):
+        return self._call('selections')
+
+    def selection(self, slot):
+        return self._call('selection', slot=slot)
+
+    def apply_planogram(self, planogram, timeout=None):
+        return self._call('apply_planogram', planogram=planogram, timeout=timeout)
+
+    def apply_profile(self, profile, refresh=False, timeout=None):
+        return self._call('apply_profile', profile=profile, refresh=refresh, timeout=timeout)
+
+    def settings(self):
+        return self._call('settings')
+
+    def metrics(self):
+        return self._call('metrics')
+
+    def telemetry(self, resolution='raw', since=None, until=None, fields=None, limit=None):
+        return self._call('telemetry', resolution=resolution, since=since, until=until, fields=fields, limit=limit)
+
+    def sales_report(self, kind, since=None, until=None):
+        return self._call('sales_report', kind=kind, since=since, until=until)
+
+    def vend_log(self, since=None, until=None, selection=None, limit=None):
+        return self._call('vend_log', since=since, until=until, selection=selection, limit=limit)
+
+    def refresh_sales(self):
+        return self._call('refresh_sales')
+
+    def trace(self, since=0, level=None, span=None, limit=None):
+        return self._call('trace', since=since, level=level, span=span, limit=limit)
+
+    def configure_trace(self, level=None, sample=None):
+        return self._call('configure_trace', level=level, sample=sample)
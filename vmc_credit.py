@@ -0,0 +1,116 @@
+# vmc_credit.py
+# Current credit and recent payment activity, kept in memory by the driver.
+#
+# The VMC only reports payment state in frames of its own: 0x21 (money
+# received: mode + amount), 0x23 (total credit now available) and 0x26
+# (change paid out). CreditLedger folds them into one state on the serial
+# thread as they arrive, so a reader gets the current credit in one call
+# instead of replaying /events:
+# - 0x21 raises the credit by its amount (the 0x23 that follows confirms it)
+# - 0x23 is authoritative: the credit becomes its amount
+# - 0x26 pays the credit out: back to 0
+# A successful vend (final 0x04) is recorded too; what it cost shows up
+# in the VMC's next 0x23.
+#
+# Every change bumps `version`. Readers pass the version they have as
+# `since` and long-poll for the next one (a 0x23 that only confirms the
+# current credit is not a change and wakes nobody).
+
+import time
+import threading
+import collections
+
+CREDIT_CODES = frozenset((0x21, 0x23, 0x26)) # MONEY_RECEIVED_NOTICE, CURRENT_AMOUNT_REPORT, CHANGE_GIVEN_RESULT
+HISTORY = 256 # Transactions kept (the oldest fall off)
+
+
+class CreditLedger:
+    """
+    Credit, running totals and the last `capacity` transactions
+    ({'version', 'ts', 'kind', 'amount', 'credit', ...}; kind is received,
+    amount, change or vend). version starts at 0 and only grows.
+    """
+
+    def __init__(self, capacity=HISTORY):
+        self.cond = threading.Condition()
+        self.version = 0
+        self.credit = 0
+        self.updated = None # time.time() of the last change
+        self.totals = {"received": 0, "change": 0, "vends": 0, "by_mode": collections.Counter()}
+        self.transactions = collections.deque(maxlen=capacity)
+        self.listeners = [] # callback(transaction), called on the serial thread
+
+    # --- SERIAL THREAD SIDE ---
+
+    def apply(self, cmd_id, record):
+        """Fold one 0x21 / 0x23 / 0x26 record in (complete records only)"""
+        if cmd_id == 0x21:
+            self._record('received', record.amount, self.credit + record.amount, {'received': record.amount},
+                         mode=record.mode)
+        elif cmd_id == 0x23:
+            if record.amount != self.credit:
+                self._record('amount', record.amount, record.amount)
+        elif cmd_id == 0x26:
+            self._record('change', record.amount, 0, {'change': record.amount})
+
+    def note_vend(self, record, price):
+        """Terminal 0x04 record: a successful, complete one is a sale (price from the catalog, may be None)"""
+        if record.complete and record.status == 0x02:
+            self._record('vend', price, self.credit, {'vends': 1}, selection=record.selection)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _record(self, kind, amount, credit, totals=None, **extra):
+        """One transaction; totals ({name: increment}) change under the lock readers copy them with"""
+        with self.cond:
+            for name, increment in (totals or {}).items():
+                self.totals[name] += increment
+            if 'mode' in extra:
+                self.totals["by_mode"][extra['mode']] += amount
+            self.version += 1
+            self.credit = credit
+            self.updated = time.time()
+            transaction = dict(version=self.version, ts=self.updated, kind=kind, amount=amount, credit=credit, **extra)
+            self.transactions.append(transaction)
+            self.cond.notify_all()
+
+        for callback in self.listeners:
+            callback(transaction)
+
+    # --- READERS ---
+
+    def snapshot(self, since=0):
+        """
+        {'version', 'credit', 'updated', 'totals', 'transactions', 'missed'}:
+        transactions after version `since`; missed counts those that already
+        fell out of the history.
+        """
+        with self.cond:
+            return self._snapshot_locked(since)
+
+    def wait(self, since=0, timeout=None):
+        """Long-poll: like snapshot(), but blocks up to timeout for a version after `since`"""
+        with self.cond:
+            if timeout and timeout > 0:
+                self.cond.wait_for(lambda: self.version > since, timeout)
+            return self._snapshot_locked(since)
+
+    def _snapshot_locked(self, since):
+        transactions = []
+        missed = 0
+        if self.transactions and since < self.version:
+            first = self.transactions[0]['version']
+            missed = max(0, first - since - 1)
+            # version is contiguous inside the deque: jump straight to `since`
+            for i in range(max(0, since - first + 1), len(self.transactions)):
+                transactions.append(self.transactions[i])
+        totals = dict(self.totals, by_mode=dict(self.totals["by_mode"]))
+        return {
+            "version": self.version,
+            "credit": self.credit,
+            "updated": self.updated,
+            "totals": totals,
+            "transactions": transactions,
+            "missed": missed,
+        }
@@ -0,0 +1,214 @@
+# vmc_daemon.py
+# The one process that owns the serial ports.
+#
+# A serial port can only be opened once, which used to pin app.py to a
+# single process. The daemon runs the DriverPool and serves every
+# MachineService method (vmc_service.py) over a local Unix socket
+# (framing: vmc_ipc.py), so the HTTP layer can run as many worker
+# processes as there are cores while the link keeps a single owner.
+#
+# Run:  VMC_MACHINES="lobby=/dev/ttyUSB0" python vmc_daemon.py --socket /run/vmc/vmc.sock
+# then: VMC_DAEMON=/run/vmc/vmc.sock gunicorn -w 4 --threads 16 app:app
+#
+# Every connection gets its own thread, and one request at a time on it
+# (long-polls simply hold their connection); vmc_client.py pools them.
+
+import os
+import sys
+import socket
+import signal
+import argparse
+import threading
+import socketserver
+from vmc_pool import build_pool, parse_machines
+from vmc_service import LocalMachines
+from vmc_ipc import encode, read_frame, error_reply, DaemonError
+from vmc_poll_tuner import FAST_INTERVAL, SLOW_INTERVAL
+from vmc_telemetry import SAMPLE_INTERVAL
+from vmc_sales import SALES_INTERVAL
+
+DEFAULT_SOCKET = '/tmp/vmc-daemon.sock'
+SOCKET_MODE = 0o660 # Owner and group (the web workers' user) only
+BACKLOG = 128       # Pending connects (a burst of workers opening their pools)
+
+# MachineService methods a client may call ("machines" lists them all)
+OPS = frozenset((
+    'info', 'command', 'status', 'submit_job', 'get_job', 'start_vend', 'get_vend',
+    'events', 'credit', 'selections', 'selection', 'apply_planogram', 'apply_profile', 'settings',
+    'metrics', 'telemetry', 'sales_report', 'vend_log', 'refresh_sales', 'trace', 'configure_trace',
+    'stream_command',
+))
+# ...of which these return iterators: one reply frame per item, then {"ok": None}
+STREAM_OPS = frozenset(('stream_command',))
+
+
+class ConnectionHandler(socketserver.BaseRequestHandler):
+    """One client connection: request, reply, request, reply... until it closes"""
+
+    def handle(self):
+        daemon = self.server.vmc_daemon
+        while True:
+            try:
+                frame = read_frame(self.request)
+            except (OSError, ValueError, DaemonError) as e:
+                print(f"[Daemon] Dropping client: {e}")
+                return
+            if frame is None:
+                return
+
+            codec, request = frame
+            replies = daemon.replies(request)
+            try:
+                for reply in replies:
+                    try:
+                        data = encode(reply, codec)
+                    except (TypeError, ValueError) as e: # A result the codec cannot carry
+                        data = encode(error_reply(e), codec)
+                    self.request.sendall(data)
+            except OSError:
+                return # Client gave up (e.g. its worker was killed)
+            finally:
+                replies.close() # Abandons a stream cut short
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = BACKLOG
+
+
+class VMCDaemon:
+    def __init__(self, pool, path=DEFAULT_SOCKET, mode=SOCKET_MODE):
+        self.pool = pool
+        self.machines = LocalMachines(pool)
+        self.path = path
+        self.mode = mode
+        self.server = None
+        self.thread = None
+
+    def open(self):
+        """Binds the socket, then opens the serial ports"""
+        self._claim_path()
+        self.server = DaemonServer(self.path, ConnectionHandler)
+        self.server.vmc_daemon = self
+        os.chmod(self.path, self.mode)
+        self.pool.start()
+        print(f"[Daemon] Serving {len(self.pool)} machine(s) on {self.path}")
+
+    def start(self):
+        """open() and serve from a background thread"""
+        self.open()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def serve_forever(self):
+        """open() and serve from this thread until interrupted"""
+        self.open()
+        self.server.serve_forever()
+
+    def stop(self):
+        if self.server:
+            if self.thread:
+                self.server.shutdown()
+            self.server.server_close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self.pool.stop()
+
+    def _claim_path(self):
+        """Remove a socket file left behind by a dead daemon, but never a live one"""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path) # Stale
+        else:
+            raise RuntimeError(f"Another daemon is already serving {self.path}")
+        finally:
+            probe.close()
+
+    def handle(self, request):
+        """One decoded request -> reply dict"""
+        try:
+            op = request['op']
+            if op == 'machines':
+                return {"ok": self.machines.describe()}
+            return {"ok": self._call(request)}
+        except Exception as e:
+            return error_reply(e)
+
+    def replies(self, request):
+        """Reply dicts for one request: handle()'s, or a stream's items and its end"""
+        if request.get('op') not in STREAM_OPS:
+            yield self.handle(request)
+            return
+        try:
+            items = self._call(request)
+        except Exception as e:
+            yield error_reply(e)
+            return
+        try:
+            for item in items:
+                yield {"item": item}
+            yield {"ok": None}
+        except Exception as e:
+            yield error_reply(e)
+        finally:
+            items.close()
+
+    def _call(self, request):
+        op = request['op']
+        if op not in OPS:
+            raise DaemonError(f"Unknown op {op!r}")
+        machine_id = request.get('machine')
+        service = self.machines.machine(self.machines.default if machine_id is None else machine_id)
+        args = dict(request.get('args') or {})
+        if isinstance(args.get('data_bytes'), list):
+            args['data_bytes'] = bytes(args['data_bytes']) # JSON codec
+        return getattr(service, op)(**args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Own the VMC serial port(s) and serve them over a Unix socket")
+    parser.add_argument('--socket', default=os.environ.get('VMC_DAEMON', DEFAULT_SOCKET))
+    parser.add_argument('--machines', default=os.environ.get('VMC_MACHINES'),
+                        help="lobby=/dev/ttyUSB0,floor2=/dev/ttyUSB1 (default: one machine on VMC_SERIAL_PORT)")
+    parser.add_argument('--capture', default=os.environ.get('VMC_CAPTURE'))
+    parser.add_argument('--snapshot', default=os.environ.get('VMC_SNAPSHOT'))
+    parser.add_argument('--poll-fast', type=float, default=float(os.environ.get('VMC_POLL_FAST', FAST_INTERVAL)))
+    parser.add_argument('--poll-slow', type=float, default=float(os.environ.get('VMC_POLL_SLOW', SLOW_INTERVAL)))
+    parser.add_argument('--trace', default=os.environ.get('VMC_TRACE'), help="Append the trace to this file (JSON lines)")
+    parser.add_argument('--trace-level', default=os.environ.get('VMC_TRACE_LEVEL', 'debug'))
+    parser.add_argument('--trace-sample', type=int, default=int(os.environ.get('VMC_TRACE_SAMPLE', 1)))
+    parser.add_argument('--trace-echo', default=os.environ.get('VMC_TRACE_ECHO', 'info'))
+    parser.add_argument('--telemetry-interval', type=float,
+                        default=float(os.environ.get('VMC_TELEMETRY_INTERVAL', SAMPLE_INTERVAL)),
+                        help="Seconds between background full-status samples (0: off)")
+    parser.add_argument('--sales-db', default=os.environ.get('VMC_SALES_DB'),
+                        help="Ingest sales reports into this SQLite file")
+    parser.add_argument('--sales-interval', type=float,
+                        default=float(os.environ.get('VMC_SALES_INTERVAL', SALES_INTERVAL)))
+    args = parser.parse_args()
+
+    machines = parse_machines(args.machines) or {'default': os.environ.get('VMC_SERIAL_PORT', '/dev/ttyS1')}
+    pool = build_pool(machines, args.capture, args.snapshot, args.poll_fast, args.poll_slow, trace_path=args.trace,
+                      trace_options={'level': args.trace_level, 'sample': args.trace_sample, 'echo': args.trace_echo},
+                      telemetry_interval=args.telemetry_interval, sales_path=args.sales_db,
+                      sales_interval=args.sales_interval)
+    daemon = VMCDaemon(pool, args.socket)
+
+    # SIGTERM (systemd, docker stop) shuts down like Ctrl+C: snapshots saved, socket removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
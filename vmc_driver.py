@@ -1,54 +1,204 @@
 import time
 import threading
-import queue
 import serial
+from concurrent.futures import TimeoutError as FutureTimeout
 from vmc_codes import *
+from vmc_framing import FrameDecoder, xor_checksum
+from vmc_scheduler import CommandScheduler, PRIORITY_CONTROL, PRIORITY_STATUS
+from vmc_catalog import SelectionCatalog
+from vmc_events import EventBus
+from vmc_metrics import DriverMetrics
+from vmc_capture import CaptureWriter, RX, TX
+from vmc_schema import decode_response, encode_command
+from vmc_poll_tuner import PollTuner
+from vmc_jobs import JobTable
+from vmc_vend import VendPipeline
+from vmc_snapshot import SnapshotKeeper, load_snapshot
+from vmc_status_cache import StatusCache, STATUS_NEUTRAL_EVENTS
+from vmc_trace import Tracer, TraceWriter, DEBUG, INFO, WARN, ERROR
+from vmc_admission import AdmissionController
+from vmc_telemetry import TelemetryStore, TelemetrySampler
+from vmc_credit import CreditLedger, CREDIT_CODES
+from vmc_profile import SettingsCache
+from vmc_stream import ResponseStream, MULTI_FRAME_COMMANDS, STREAM_QUIET
+
+MAX_RETRIES = 5
+DEFAULT_TIMEOUT = 5.0
 
 class VMCDriver:
-    def __init__(self, port, baudrate=57600):
+    def __init__(self, port, baudrate=57600, capture_path=None, poll_tuner=None, snapshot_path=None,
+                 tracer=None, trace_path=None, telemetry_sampler=None, sales=None):
         self.port = port
         self.baudrate = baudrate
         self.serial = None
         
+        # Command spans and driver events in a ring buffer (see vmc_trace.py);
+        # a writer thread echoes / appends them to trace_path, never the serial thread
+        self.tracer = tracer or Tracer()
+        self.trace_path = trace_path
+        self.trace_writer = None
+        
+        # Optional wire capture (see vmc_capture.py / vmc_replay.py)
+        self.capture_path = capture_path
+        self.capture = None
+        
+        # Optional warm-start snapshot of the selection catalog (see vmc_snapshot.py)
+        self.snapshot_path = snapshot_path
+        self.snapshot = None
+        
+        # Optional sales ingestion into SQLite (vmc_sales.SalesIngestor), running while the port is open
+        self.sales = sales
+        
         # --- SHARED STATE ---
         self.running = False
+        self.thread = None
         self.packet_number = 1  # Valid range: 1-255
         
-        # This holds the command we WANT to send.
-        # Format: {'cmd': 0x00, 'data': [], 'retries': 0, 'expect_response': None}
-        self.pending_command = None
+        # Per-phase latency histograms and counters (served on /metrics)
+        self.metrics = DriverMetrics()
+        
+        # Commands waiting for a POLL (one future per command)
+        self.scheduler = CommandScheduler(on_done=self._command_done, tracer=self.tracer)
+        
+        # The command currently on the wire. Only touched by the serial thread.
+        # Format: see CommandScheduler (cmd, data, retries, sent_status, expect_code, future...)
+        self.active_command = None
+        
+        # Unsolicited event history (Money received, Errors pushed by VMC)
+        # Bounded and cursor-based: readers never consume each other's events
+        self.events = EventBus()
+        
+        # Commands submitted without waiting (202 + /jobs/<id>)
+        self.jobs = JobTable()
         
-        # This holds the response we received from the VMC
-        self.last_response = None
+        # Payment + check + dispense transactions, followed to their final 0x04
+        self.vends = VendPipeline(self.scheduler)
         
-        # Events for Thread Synchronization
-        self.evt_response_ready = threading.Event() # Set when VMC replies
-        self.lock = threading.Lock() # Protects shared variables
+        # Incoming byte stream -> validated frames
+        self.decoder = FrameDecoder()
+        self.rx_time = 0.0 # When the chunk being dispatched was read
         
-        # Unsolicited Data Queue (Money received, Errors pushed by VMC)
-        self.async_events = queue.Queue()
+        # Per-slot price / inventory / capacity / product ID learned from the VMC
+        self.catalog = SelectionCatalog()
+        
+        # Measured seconds per command; refuses work the backlog cannot finish in time
+        self.admission = AdmissionController(self)
+        
+        # Short-lived 0x53 / 0x51 replies shared by concurrent status readers (only new queries are admitted)
+        self.status_cache = StatusCache(self.scheduler, admission=self.admission)
+        
+        # Fast POLLs while busy, slow ones while idle (SET_POLL_INTERVAL)
+        self.poll_tuner = poll_tuner or PollTuner()
+        
+        # Background 0x51 samples in idle POLL slots; every 0x52 lands in the store
+        self.telemetry = TelemetryStore()
+        self.telemetry_sampler = telemetry_sampler or TelemetrySampler()
+        
+        # Current credit and payment history from 0x21 / 0x23 / 0x26, updated as they arrive
+        self.credit = CreditLedger()
+        
+        # Last reported value of each 0x70 setting (any 0x71 for one), for configuration profiles
+        self.settings = SettingsCache()
 
     def start(self):
         """Starts the Serial Thread"""
-        self.running = True
+        self.open(timeout=None) # Blocking read for efficiency
+        self.thread = threading.Thread(target=self._serial_loop, daemon=True)
+        self.thread.start()
+        print(f"[VMC] Driver started on {self.port}")
+
+    def open(self, timeout=0):
+        """
+        Opens the port (and capture) and queues the startup sync, without
+        starting a reader. start() adds the serial thread; DriverPool and
+        AsyncVMCDriver call _on_readable() when the port has data.
+        """
         self.serial = serial.Serial(
             self.port, 
             self.baudrate, 
-            timeout=None # Blocking read for efficiency
+            timeout=timeout
         )
-        self.thread = threading.Thread(target=self._serial_loop, daemon=True)
-        self.thread.start()
-        print(f"[VMC] Driver started on {self.port}")
+        # Only once the port is open: a failed open leaves nothing running or half-written
+        self.running = True
+        if self.capture_path:
+            self.capture = CaptureWriter(self.capture_path)
+        self.trace_writer = TraceWriter(self.tracer, self.trace_path, name=f"VMC {self.port}")
+        self.trace_writer.start()
+        if self.snapshot_path:
+            self._warm_start()
+        if self.sales:
+            self.sales.start(self)
         
         # Rule 8: Startup Sync (Queue this immediately)
-        self.send_command_nowait(CMD_SEND["REQUEST_INFO_SYNC"], [])
+        # With a warm start the catalog is already served; the sync reconciles it
+        entry = self.send_command_nowait(CMD_SEND["REQUEST_INFO_SYNC"], [])
+        self.catalog.begin_reconcile()
+        entry['future'].add_done_callback(self._on_sync_done)
+
+    def _warm_start(self):
+        """Seed the catalog from the last snapshot and keep saving it"""
+        loaded = load_snapshot(self.snapshot_path)
+        if loaded:
+            saved_at, slots = loaded
+            self.catalog.load(slots, saved_at)
+            self.tracer.event(INFO, 'catalog.warm_start', selections=len(slots), path=self.snapshot_path,
+                              age=round(time.time() - saved_at))
+        self.snapshot = SnapshotKeeper(self.catalog, self.snapshot_path)
+        self.snapshot.start()
+
+    def _on_sync_done(self, future):
+        # No 0x11 ever came: leave the catalog as it is
+        if 'error' in future.result():
+            self._end_reconcile(failed=True)
+
+    def _end_reconcile(self, failed=False):
+        reconcile = self.catalog.end_reconcile(failed)
+        if reconcile is None:
+            return
+        self.tracer.event(INFO, 'catalog.sync_' + reconcile['state'], reports=reconcile['reports'],
+                          changed=len(reconcile['changed']), added=len(reconcile['added']),
+                          removed=len(reconcile['removed']))
+        if self.snapshot:
+            self.snapshot.request_save()
+
+    def stop(self):
+        """Stops the Serial Thread and closes the port"""
+        self.running = False
+        if self.serial:
+            self.serial.close() # Unblocks the pending read
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self._close_capture()
+        self._close_snapshot()
+        self._close_sales()
+        self._close_trace()
+
+    def _close_trace(self):
+        # Last: flushes whatever the other closers traced
+        if self.trace_writer:
+            self.trace_writer.stop()
+            self.trace_writer = None
+
+    def _close_sales(self):
+        # Writes the vends logged so far
+        if self.sales:
+            self.sales.stop()
+
+    def _close_snapshot(self):
+        # Final save once nothing else touches the catalog
+        if self.snapshot:
+            self.snapshot.stop()
+            self.snapshot = None
+
+    def _close_capture(self):
+        # Only once the serial thread is done with it
+        if self.capture:
+            self.capture.close()
+            self.capture = None
 
     def calculate_xor(self, packet):
         """Calculates XOR from STX to end of payload (PDF Section 3)"""
-        xor = 0x00
-        for byte in packet:
-            xor ^= byte
-        return xor
+        return xor_checksum(packet)
 
     def build_packet(self, cmd_byte, data_bytes, pack_no):
         """Constructs the raw byte array to send"""
@@ -66,82 +216,91 @@ class VMCDriver:
         packet.append(xor)
         return bytearray(packet)
 
-    def send_command_blocking(self, cmd_byte, data_bytes=[], timeout=5.0):
+    def send_command_blocking(self, cmd_byte, data_bytes=[], timeout=DEFAULT_TIMEOUT, priority=PRIORITY_CONTROL):
         """
         API CALL: Sends a command and BLOCKS until response or timeout.
-        Implements 'One thing at a time' rule.
+        Commands are queued and go out one per POLL ('One thing at a time' rule),
+        so concurrent callers each get their own reply.
         """
-        with self.lock:
-            # 1. Setup the pending command
-            expect_code = EXPECTED_RESPONSES.get(cmd_byte, None)
-            
-            self.pending_command = {
-                'cmd': cmd_byte,
-                'data': data_bytes,
-                'retries': 0,
-                'sent_status': 'WAITING_FOR_POLL',
-                'expect_code': expect_code
-            }
-            
-            self.last_response = None
-            self.evt_response_ready.clear()
-            
-        print(f"[API] Queued Command {hex(cmd_byte)}. Waiting for VMC...")
-        
-        # 2. Wait for the Serial Thread to do the work
-        success = self.evt_response_ready.wait(timeout=timeout)
+        entry = self.scheduler.submit(cmd_byte, data_bytes, timeout, priority=priority)
         
-        with self.lock:
-            result = self.last_response
-            # Cleanup
-            self.pending_command = None
-            
-        if not success:
-            print("[API] Error: Timeout waiting for VMC response")
+        try:
+            return entry['future'].result(timeout=timeout)
+        except FutureTimeout:
+            # Pull it from the queue if it never went out
+            self.scheduler.cancel(entry)
+            self.tracer.span(entry, 'abandoned', WARN, status=entry['sent_status'])
             return {"error": "TIMEOUT"}
-            
-        return result
 
-    def send_command_nowait(self, cmd_byte, data_bytes=[]):
+    def stream_command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, quiet=STREAM_QUIET,
+                       priority=PRIORITY_CONTROL):
+        """
+        API CALL: Queues a command whose reply is a burst of frames and returns
+        a vmc_stream.ResponseStream right away; iterate it to get each frame as
+        it arrives. Ends at the VMC's next POLL, or after `quiet` seconds
+        without a frame.
+        """
+        stream = ResponseStream(quiet, timeout=timeout)
+        entry = self.scheduler.submit(cmd_byte, data_bytes, timeout, priority=priority, stream=stream)
+        stream.attach(self.scheduler, entry)
+        return stream
+
+    def send_command_nowait(self, cmd_byte, data_bytes=[], timeout=DEFAULT_TIMEOUT):
         """Internal use: Queue a command without waiting (e.g. startup sync)"""
-        with self.lock:
-            self.pending_command = {
-                'cmd': cmd_byte,
-                'data': data_bytes,
-                'retries': 0,
-                'sent_status': 'WAITING_FOR_POLL',
-                'expect_code': EXPECTED_RESPONSES.get(cmd_byte, None)
-            }
+        return self.scheduler.submit(cmd_byte, data_bytes, timeout)
+
+    def _command_done(self, entry):
+        """Scheduler callback: the command's future has a result (any thread)"""
+        self.metrics.command_done(entry)
+        result = entry['future'].result()
+        error = result.get('error')
+        self.tracer.span(entry, 'completed', WARN if error else DEBUG,
+                         ms=round((time.monotonic() - entry['submitted_at']) * 1000, 3),
+                         attempts=entry['retries'], **({'error': error} if error else {}))
+
+    def _complete_active(self, result):
+        """Resolve the in-flight command and free the line for the next one"""
+        entry = self.active_command
+        self.active_command = None
+        if entry and not entry['future'].done():
+            entry['future'].set_result(result)
 
     def _serial_loop(self):
         """Main Loop: Handles POLL, ACKs, and Data parsing"""
-        buffer = []
-        
         while self.running:
-            # A. READ ONE BYTE
-            if self.serial.in_waiting > 0:
-                byte = ord(self.serial.read(1))
-                buffer.append(byte)
+            # A. READ EVERYTHING AVAILABLE
+            # Blocks for the first byte when idle, then drains the port in one call
+            try:
+                chunk = self.serial.read(self.serial.in_waiting or 1)
+            except (serial.SerialException, TypeError, OSError):
+                if not self.running:
+                    break # Port closed by stop()
+                raise
+            if not chunk:
+                continue
                 
-                # B. CHECK HEADER (FA FB)
-                if len(buffer) >= 2:
-                    if buffer[-2] == 0xFA and buffer[-1] == 0xFB:
-                        # Found Start! Reset buffer to just these 2 bytes
-                        buffer = [0xFA, 0xFB]
-                        
-                # C. PARSE PACKET
-                # Min length is 5 (STX+CMD+LEN+XOR)
-                if len(buffer) >= 5:
-                    cmd_id = buffer[2]
-                    data_len = buffer[3]
-                    
-                    # Full packet length = 4 header bytes + data_len + 1 XOR
-                    expected_len = 4 + data_len + 1
-                    
-                    if len(buffer) >= expected_len:
-                        # Full packet received!
-                        self._process_incoming_packet(buffer)
-                        buffer = [] # Clear for next packet
+            # B. SPLIT INTO FRAMES AND DISPATCH
+            self._feed(chunk)
+
+    def _on_readable(self):
+        """Non-blocking read: the port has data (timeout=0, see open())"""
+        chunk = self.serial.read(self.serial.in_waiting or 1)
+        if chunk:
+            self._feed(chunk)
+
+    def _feed(self, chunk):
+        """Runs raw bytes through the decoder (length-delimited, XOR checked)"""
+        self.rx_time = time.monotonic()
+        if self.capture:
+            self.capture.write(RX, chunk)
+        for packet in self.decoder.feed(chunk):
+            self._process_incoming_packet(packet)
+
+    def _write(self, packet):
+        """Every outbound frame goes through here"""
+        if self.capture:
+            self.capture.write(TX, packet)
+        self.serial.write(packet)
 
     def _process_incoming_packet(self, packet):
         """Decides what to do with the valid packet from VMC"""
@@ -163,33 +322,65 @@ class VMCDriver:
         """VMC asked 'Do you have commands?'"""
         # Default action is to send ACK (Idle)
         send_ack = True
+        
+        # A POLL after the sync's reports: the VMC has sent them all
+        if self.catalog.reconciling and self.catalog.reconcile['reports']:
+            self._end_reconcile()
+        
+        # A multi-frame reply is over once the VMC polls again
+        entry = self.active_command
+        if entry and entry['frames'] and entry['sent_status'] == 'ACK_RECEIVED':
+            self._complete_active({"status": "STREAM_END", "frames": entry['frames']})
+        
+        # Drop the in-flight command once its caller has given up
+        entry = self.active_command
+        if entry and entry['deadline'] is not None and time.monotonic() >= entry['deadline']:
+            self.tracer.span(entry, 'expired', WARN, status=entry['sent_status'])
+            self._complete_active({"error": "TIMEOUT"})
+        
+        # Ask the VMC to poll faster while there is work, slower when idle
+        interval = self.poll_tuner.next_interval(len(self.scheduler), self.active_command is not None, self.rx_time)
+        if interval is not None:
+            self._set_poll_interval(interval)
+        
+        # Line is free: pull the next queued command
+        if self.active_command is None:
+            if self.telemetry_sampler.due(self.rx_time, len(self.scheduler)):
+                self._sample_telemetry()
+            self.active_command = self.scheduler.pop_next()
+            if self.active_command:
+                self.admission.on_pop(self.rx_time, len(self.scheduler))
+                self.metrics.observe(self.active_command['cmd'], 'queue_wait',
+                                     self.rx_time - self.active_command['submitted_at'])
 
-        if self.pending_command:
-            status = self.pending_command['sent_status']
+        if self.active_command:
+            entry = self.active_command
+            status = entry['sent_status']
             
             # STATE 1: WAITING_FOR_POLL or SENT_WAITING_FOR_ACK
             # We have a command that needs to be sent (or resent if lost)
             if status == 'WAITING_FOR_POLL' or status == 'SENT_WAITING_FOR_ACK':
-                if self.pending_command['retries'] >= 5:
-                    print("[Driver] Command failed 5 times. Terminating.")
-                    with self.lock:
-                        self.last_response = {"error": "MAX_RETRIES_REACHED"}
-                        self.evt_response_ready.set()
-                        # Do not clear pending_command here, logic continues to send ACK
+                if entry['retries'] >= MAX_RETRIES:
+                    self.tracer.span(entry, 'failed', ERROR, attempts=MAX_RETRIES)
+                    self._complete_active({"error": "MAX_RETRIES_REACHED"})
                     # send_ack remains True
                 else:
                     # SEND THE COMMAND
-                    cmd = self.pending_command['cmd']
-                    data = self.pending_command['data']
+                    cmd = entry['cmd']
+                    data = entry['data']
                     
                     raw_packet = self.build_packet(cmd, data, self.packet_number)
-                    self.serial.write(raw_packet)
-                    
-                    self.pending_command['sent_status'] = 'SENT_WAITING_FOR_ACK'
-                    self.pending_command['retries'] += 1
+                    self._write(raw_packet)
                     
-                    # Log the sent command so we know it went out!
-                    print(f"[Driver] Sent Command {hex(cmd)} (Attempt {self.pending_command['retries']})")
+                    entry['sent_at'] = time.monotonic()
+                    entry['sent_status'] = 'SENT_WAITING_FOR_ACK'
+                    entry['retries'] += 1
+                    self.metrics.observe(cmd, 'poll_to_send', entry['sent_at'] - self.rx_time)
+                    if entry['retries'] > 1:
+                        self.metrics.inc('retries', cmd)
+                        self.tracer.span(entry, 'retried', INFO, attempt=entry['retries'], packet=self.packet_number)
+                    else:
+                        self.tracer.span(entry, 'sent', packet=self.packet_number)
                     
                     send_ack = False # We sent data, so don't send ACK
             
@@ -201,24 +392,43 @@ class VMCDriver:
 
         # If no command logic took over, send the standard Idle ACK
         if send_ack:
-            self.serial.write(self.build_packet(CMD_ACK, [], 0))
+            self._write(self.build_packet(CMD_ACK, [], 0))
+            self.metrics.inc('idle_acks')
+
+    def _set_poll_interval(self, interval):
+        """Queues SET_POLL_INTERVAL ahead of everything else"""
+        tuner = self.poll_tuner
+        payload = encode_command(CMD_SEND["SET_POLL_INTERVAL"], interval=tuner.units(interval))
+        entry = self.scheduler.submit(CMD_SEND["SET_POLL_INTERVAL"], payload, DEFAULT_TIMEOUT, front=True)
+        tuner.requested(interval)
+        entry['future'].add_done_callback(lambda future: tuner.confirmed(interval, future.result()))
+
+    def _sample_telemetry(self):
+        """Queues REQUEST_STATUS_FULL; the reply is recorded like any other 0x52"""
+        sampler = self.telemetry_sampler
+        entry = self.scheduler.submit(CMD_SEND["REQUEST_STATUS_FULL"], b'', DEFAULT_TIMEOUT, priority=PRIORITY_STATUS)
+        sampler.started()
+        entry['future'].add_done_callback(lambda future: sampler.finished(future.result()))
 
     def _handle_ack(self):
         """We received an ACK from VMC"""
-        if self.pending_command and self.pending_command['sent_status'] == 'SENT_WAITING_FOR_ACK':
+        entry = self.active_command
+        if entry and entry['sent_status'] == 'SENT_WAITING_FOR_ACK':
             # Great! VMC got our command.
-            self.pending_command['sent_status'] = 'ACK_RECEIVED'
+            entry['sent_status'] = 'ACK_RECEIVED'
+            entry['acked_at'] = self.rx_time
+            self.metrics.observe(entry['cmd'], 'send_to_ack', entry['acked_at'] - entry['sent_at'])
+            self.tracer.span(entry, 'acked')
             
             # Rule 6: Increment Packet Number on success
             self.packet_number += 1
             if self.packet_number > 255: self.packet_number = 1
             
             # Does this command expect data?
-            if self.pending_command['expect_code'] is None:
+            if entry['expect_code'] is None:
                 # No data expected (e.g. Set Price). We are done!
-                with self.lock:
-                    self.last_response = {"status": "SUCCESS_ACK_ONLY"}
-                    self.evt_response_ready.set()
+                self.catalog.apply_set(entry['cmd'], entry['data'])
+                self._complete_active({"status": "SUCCESS_ACK_ONLY"})
             else:
                 # We must wait for the data packet (Process 3)
                 pass
@@ -234,27 +444,78 @@ class VMCDriver:
             vmc_pack_no = packet[4]
             payload = packet[5:-1]
         else:
-            payload = []
+            payload = b''
+        
+        # Typed view of the payload (vmc_schema). Lazy: fields decode when read.
+        record = decode_response(cmd_id, payload)
 
         # 1. ALWAYS Send ACK back immediately (Process 3 Rule)
-        self.serial.write(self.build_packet(CMD_ACK, [], 0))
+        self._write(self.build_packet(CMD_ACK, [], 0))
+        
+        # 2. Keep the selection catalog current
+        if cmd_id == 0x11:   # SELECTION_INFO_REPORT (one per slot during sync)
+            self.catalog.apply_report(record)
+        elif cmd_id == 0x04: # DISPENSING_STATUS
+            if record.complete:
+                self.catalog.apply_dispense(record)
+                self.poll_tuner.note_dispense(record, self.rx_time)
+                self.vends.on_status(record, payload)
+                if record.terminal:
+                    selection = self.catalog.get(record.selection)
+                    self.credit.note_vend(record, selection and selection['price'])
+                if self.sales and record.terminal:
+                    self.sales.note_dispense(record)
+            else:
+                self.tracer.event(WARN, 'dispense.short_frame', data=payload.hex())
+        elif cmd_id in CREDIT_CODES: # Money in, credit report, change paid (solicited or not)
+            if record.complete:
+                self.credit.apply(cmd_id, record)
+            else:
+                self.tracer.event(WARN, 'credit.short_frame', cmd=cmd_id, data=payload.hex())
+        elif cmd_id == 0x71: # MENU_SETTING_RESPONSE: the setting's value, queried or just written
+            self.settings.note(record)
+        elif cmd_id == 0x52: # MACHINE_STATUS_FULL (sampled or asked for)
+            if record.complete:
+                self.telemetry.add(record)
+                self.telemetry_sampler.note_reading(self.rx_time)
+            else:
+                self.tracer.event(WARN, 'telemetry.short_frame', data=payload.hex())
         
-        # 2. Check if this is the response we are waiting for
+        # 3. Check if this is the response we are waiting for
         is_expected = False
-        if self.pending_command and self.pending_command['expect_code'] == cmd_id:
-            with self.lock:
-                self.last_response = {
-                    "cmd": hex(cmd_id),
-                    "data_hex": [hex(x) for x in payload],
-                    "raw_data": list(payload)
-                }
-                self.evt_response_ready.set() # Wake up API
+        entry = self.active_command
+        if entry and entry['expect_code'] == cmd_id:
+            if 'acked_at' in entry and not entry['frames']:
+                self.metrics.observe(entry['cmd'], 'ack_to_data', self.rx_time - entry['acked_at'])
+            result = {
+                "cmd": hex(cmd_id),
+                "raw_data": payload,
+                "fields": record
+            }
+            stream = entry['stream']
+            if stream is not None or entry['cmd'] in MULTI_FRAME_COMMANDS:
+                # One of a burst: hand it over and keep the line until the next POLL
+                entry['frames'] += 1
+                if entry['deadline'] is not None:
+                    quiet = stream.quiet if stream is not None else STREAM_QUIET
+                    entry['deadline'] = max(entry['deadline'], self.rx_time + quiet)
+                if stream is not None:
+                    stream.push(result)
+            else:
+                self._complete_active(result) # Wake up API
             is_expected = True
             
-        # 3. If it's unsolicited data (Money in, Error), log or queue it
+        # A dispense or a status-relevant event makes cached status stale
+        if cmd_id == 0x04 or (not is_expected and cmd_id not in STATUS_NEUTRAL_EVENTS):
+            self.status_cache.invalidate()
+            
+        # 4. If it's unsolicited data (Money in, Error), log or queue it
+        # (extra 0x11 reports are already in the catalog)
         if not is_expected:
-            print(f"[Async] Received Event {hex(cmd_id)}: {list(payload)}")
-            self.async_events.put({"cmd": cmd_id, "data": payload})
+            self.metrics.inc('unsolicited', cmd_id)
+            if cmd_id != 0x11:
+                self.tracer.event(INFO, 'vmc.event', cmd=cmd_id, data=payload.hex())
+                self.events.publish(cmd_id, payload, record)
             
             # Also increment packet number for unsolicited successful transactions?
             # PDF implies PackNO increments on "correct completion". 
@@ -0,0 +1,89 @@
+# vmc_events.py
+# Bounded, sequence-numbered history of unsolicited VMC events.
+# Readers keep their own cursor (last seq seen), so any number of consumers
+# see the whole stream and nobody's read removes anything.
+
+import time
+import threading
+import collections
+from vmc_codes import VMC_INCOMING_COMMANDS
+
+DEFAULT_CAPACITY = 1024
+
+
+class EventBus:
+    """
+    Ring buffer of {'seq', 'ts', 'cmd', 'name', 'data', 'fields'} dicts
+    (fields: the vmc_schema record for the payload, or None).
+    seq starts at 1 and never repeats; the oldest events fall off once
+    `capacity` is reached.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.events = collections.deque(maxlen=capacity)
+        self.last_seq = 0
+        self.cond = threading.Condition()
+        self.listeners = [] # callback(event), called on the publishing thread
+
+    def publish(self, cmd_id, data, fields=None):
+        """Serial thread: record one event and wake every waiting reader"""
+        with self.cond:
+            self.last_seq += 1
+            event = {
+                "seq": self.last_seq,
+                "ts": time.time(),
+                "cmd": cmd_id,
+                "name": VMC_INCOMING_COMMANDS.get(cmd_id, "UNKNOWN"),
+                "data": data,
+                "fields": fields,
+            }
+            self.events.append(event)
+            self.cond.notify_all()
+
+        for callback in self.listeners:
+            callback(event)
+        return event
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def read(self, since=0, codes=None, limit=None):
+        """
+        Events with seq > since, optionally only the given command codes.
+        Returns (events, missed, cursor): missed counts events that already
+        fell out of the buffer after `since`, cursor is the `since` to pass
+        on the next call.
+        """
+        with self.cond:
+            return self._read_locked(since, codes, limit)
+
+    def wait(self, since=0, codes=None, timeout=None, limit=None):
+        """Long-poll: like read(), but blocks up to timeout for a matching event"""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self.cond:
+            while True:
+                events, missed, cursor = self._read_locked(since, codes, limit)
+                remaining = deadline - time.monotonic() if deadline else 0
+                if events or missed or remaining <= 0:
+                    return events, missed, cursor
+
+                # Nothing up to cursor matched: only look at newer events next time
+                since = cursor
+                self.cond.wait(remaining)
+
+    def _read_locked(self, since, codes, limit):
+        if not self.events or since >= self.last_seq:
+            return [], 0, self.last_seq
+        first_seq = self.events[0]['seq']
+        missed = max(0, first_seq - since - 1)
+
+        # seq is contiguous inside the deque: jump straight to the cursor
+        selected = []
+        for i in range(max(0, since - first_seq + 1), len(self.events)):
+            event = self.events[i]
+            if codes and event['cmd'] not in codes:
+                continue
+            selected.append(event)
+            if limit is not None and len(selected) >= limit:
+                return selected, missed, event['seq']
+        return selected, missed, self.last_seq
@@ -0,0 +1,109 @@
+# vmc_framing.py
+# Streaming frame decoder for the VMC serial protocol.
+# Frame layout: STX(2) + CMD(1) + LEN(1) + [PackNO(1) + Data(n)] + XOR(1)
+
+from vmc_codes import STX
+
+STX_BYTES = bytes(STX)
+HEADER_LEN = 4                      # STX(2) + CMD(1) + LEN(1)
+MIN_FRAME_LEN = HEADER_LEN + 1      # Header + XOR (POLL / ACK)
+
+
+def xor_checksum(data):
+    """XOR of every byte in data (STX through end of payload)"""
+    xor = 0x00
+    for byte in data:
+        xor ^= byte
+    return xor
+
+
+class FrameDecoder:
+    """
+    Incremental decoder: feed() it whatever the port returned and it hands
+    back every complete, checksum-valid frame.
+
+    Frames are delimited by their LEN byte, not by scanning for STX, so an
+    FA FB pair inside a payload is never mistaken for a new header. A frame
+    with a bad XOR is dropped and the decoder resynchronizes on the next
+    FA FB after its first byte. So is a frame still waiting for its
+    LEN bytes when a complete frame already sits inside that span (a
+    corrupted LEN would otherwise stall everything behind it).
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames_ok = 0
+        self.checksum_errors = 0
+        self.length_errors = 0
+        self.discarded_bytes = 0
+
+    def reset(self):
+        del self.buffer[:]
+
+    def feed(self, data):
+        """Append raw bytes and return a list of complete frames (bytes)"""
+        buf = self.buffer
+        buf += data
+        end = len(buf)
+        frames = []
+        pos = 0
+
+        view = memoryview(buf)
+        try:
+            while True:
+                start = buf.find(STX_BYTES, pos)
+                if start < 0:
+                    # Keep a trailing 0xFA: it may be the first half of a header
+                    keep = 1 if end > pos and buf[end - 1] == STX[0] else 0
+                    self.discarded_bytes += end - pos - keep
+                    pos = end - keep
+                    break
+
+                self.discarded_bytes += start - pos
+                pos = start
+
+                if end - start < MIN_FRAME_LEN:
+                    break # Header not complete yet
+
+                frame_len = HEADER_LEN + buf[start + 3] + 1
+                if end - start < frame_len:
+                    if self._frame_inside(buf, view, start + 2, end):
+                        # A corrupted LEN would hold back every frame behind it (POLLs
+                        # included) until it filled up: a complete frame already in
+                        # its span means this header is bad. Resync past it.
+                        self.length_errors += 1
+                        self.discarded_bytes += 1
+                        pos = start + 1
+                        continue
+                    break # Wait for the rest of the frame
+
+                xor_pos = start + frame_len - 1
+                if xor_checksum(view[start:xor_pos]) != buf[xor_pos]:
+                    # Bad checksum: skip this STX and hunt for the next one
+                    self.checksum_errors += 1
+                    self.discarded_bytes += 1
+                    pos = start + 1
+                    continue
+
+                frames.append(bytes(view[start:start + frame_len]))
+                self.frames_ok += 1
+                pos = start + frame_len
+        finally:
+            view.release()
+
+        # Compact once per feed instead of once per frame
+        if pos:
+            del buf[:pos]
+        return frames
+
+    @staticmethod
+    def _frame_inside(buf, view, pos, end):
+        """True if a complete, checksum-valid frame starts anywhere in buf[pos:end]"""
+        while True:
+            start = buf.find(STX_BYTES, pos, end)
+            if start < 0 or end - start < MIN_FRAME_LEN:
+                return False
+            xor_pos = start + HEADER_LEN + buf[start + 3]
+            if xor_pos < end and xor_checksum(view[start:xor_pos]) == buf[xor_pos]:
+                return True
+            pos = start + 1
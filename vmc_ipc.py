@@ -0,0 +1,109 @@
+# vmc_ipc.py
+# Wire format between vmc_daemon.py and vmc_client.py (Unix stream socket).
+#
+# Frame: LEN(4, big endian) + CODEC(1) + body(LEN - 1)
+#   CODEC 'M': msgpack (used whenever the msgpack package is installed)
+#   CODEC 'J': compact JSON (fallback; bytes travel as int lists)
+# The daemon answers in the codec the request came in, so either side
+# may lack msgpack.
+#
+# Request:  {"op": MachineService method (or "machines"), "machine": id or None, "args": {...}}
+# Response: {"ok": value}  or  {"error": exception class name, "args": [...]}
+# Streaming ops (vmc_daemon.STREAM_OPS) send {"item": value} per item first,
+# then {"ok": None}; an error can end the stream at any point.
+# One request at a time per connection; clients pool connections for concurrency.
+
+import json
+import struct
+from vmc_schema import SchemaError, to_jsonable
+from vmc_vend import VendInProgress
+from vmc_pool import UnknownMachine
+from vmc_admission import Overloaded
+from vmc_sales import SalesNotConfigured
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER = struct.Struct('>IB')
+MAX_FRAME = 16 * 1024 * 1024 # Refuse anything bigger than this (a corrupt length)
+
+CODEC_MSGPACK = ord('M')
+CODEC_JSON = ord('J')
+DEFAULT_CODEC = CODEC_MSGPACK if msgpack else CODEC_JSON
+
+# Exceptions raised in the daemon that the client raises again as themselves
+REMOTE_ERRORS = {cls.__name__: cls for cls in (SchemaError, VendInProgress, UnknownMachine, Overloaded, SalesNotConfigured,
+                                                    ValueError, TypeError)}
+
+
+class DaemonError(RuntimeError):
+    """The daemon failed the call with an unexpected error"""
+
+
+class DaemonUnavailable(ConnectionError):
+    """Cannot reach the daemon (not running, or the connection dropped)"""
+
+
+def encode(message, codec=DEFAULT_CODEC):
+    if codec == CODEC_MSGPACK:
+        body = msgpack.packb(message, default=to_jsonable, use_bin_type=True)
+    else:
+        body = json.dumps(message, default=to_jsonable, separators=(',', ':')).encode()
+    return HEADER.pack(len(body) + 1, codec) + body
+
+
+def decode(codec, body):
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise DaemonError("Peer sent msgpack, but msgpack is not installed here")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    if codec == CODEC_JSON:
+        return json.loads(body)
+    raise DaemonError(f"Unknown codec {codec:#04x}")
+
+
+def read_exact(sock, size):
+    """None on a clean EOF before the first byte"""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            if chunks:
+                raise ConnectionError("Connection closed mid-frame")
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frame(sock):
+    """(codec, message), or None when the peer closed the connection"""
+    header = read_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    length, codec = HEADER.unpack(header)
+    if not 1 <= length <= MAX_FRAME:
+        raise ConnectionError(f"Bad frame length {length}")
+    body = read_exact(sock, length - 1) if length > 1 else b''
+    if body is None:
+        raise ConnectionError("Connection closed mid-frame")
+    return codec, decode(codec, body)
+
+
+def error_reply(e):
+    return {"error": type(e).__name__, "args": [to_wire(arg) for arg in e.args]}
+
+
+def to_wire(value):
+    """Exception args must survive both codecs"""
+    return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+
+def raise_remote(reply):
+    """Client side: re-raise a daemon error reply"""
+    cls = REMOTE_ERRORS.get(reply['error'])
+    if cls is None:
+        raise DaemonError(reply['error'], *reply.get('args', []))
+    raise cls(*reply.get('args', []))
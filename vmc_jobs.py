@@ -0,0 +1,107 @@
+# vmc_jobs.py
+# Non-blocking commands: the API queues the command, answers 202 with a job
+# ID right away and the client checks /jobs/<id> (optionally long-polling)
+# instead of holding an HTTP worker for a slow command (a sync, a selection
+# test).
+#
+# A job follows its scheduler entry (queued -> sent -> acked) until the
+# VMC's reply makes it done, or failed. Dispenses run as vends instead (vmc_vend.py), which follow
+# every 0x04 to the final status.
+
+import time
+import uuid
+import threading
+from concurrent.futures import Future
+from vmc_scheduler import PRIORITY_CONTROL
+
+JOB_TTL = 300.0  # Seconds a job is kept after its last change
+MAX_JOBS = 4096  # Oldest jobs are dropped beyond this
+JOB_TIMEOUT = 60.0 # How long a job's command may wait for its POLL / reply
+
+# Scheduler entry sent_status -> job state, until the VMC replies
+ENTRY_STATES = {
+    'WAITING_FOR_POLL': 'queued',
+    'SENT_WAITING_FOR_ACK': 'sent',
+    'ACK_RECEIVED': 'acked',
+}
+FINAL_STATES = ('done', 'failed')
+
+
+class JobTable:
+    """
+    job_id -> {'id', 'cmd', 'state', 'created', 'updated', 'result',
+               'entry' (scheduler entry), 'final' (Future, resolves with the job)}
+
+    Thread-safe. Results arrive on the serial thread (future callbacks);
+    readers are API threads or coroutines.
+    """
+
+    def __init__(self, ttl=JOB_TTL, capacity=MAX_JOBS):
+        self.lock = threading.Lock()
+        self.jobs = {}  # Insertion order = creation order
+        self.ttl = ttl
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def submit(self, scheduler, cmd_byte, data_bytes=b'', timeout=None, priority=PRIORITY_CONTROL):
+        """Queue the command and return its job"""
+        entry = scheduler.submit(cmd_byte, data_bytes, timeout, priority=priority)
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'cmd': cmd_byte,
+            'state': None, # Follows the entry until a result is in
+            'created': now,
+            'updated': now,
+            'result': None,
+            'entry': entry,
+            'final': Future(),
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+            self._expire(now)
+        entry['future'].add_done_callback(lambda future: self._on_result(job, future.result()))
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            self._expire(time.time())
+            return self.jobs.get(job_id)
+
+    def view(self, job):
+        """JSON-ready snapshot of a job"""
+        state = job['state'] or ENTRY_STATES.get(job['entry']['sent_status'], 'queued')
+        return {
+            "id": job['id'],
+            "cmd": hex(job['cmd']),
+            "state": state,
+            "final": state in FINAL_STATES,
+            "created": job['created'],
+            "updated": job['updated'],
+            "result": job['result'],
+        }
+
+    # --- UPDATES (serial thread) ---
+
+    def _on_result(self, job, result):
+        """The command's future resolved: the VMC replied, or it failed / timed out"""
+        with self.lock:
+            job['state'] = 'failed' if 'error' in result else 'done'
+            job['result'] = result
+            job['updated'] = time.time()
+        job['final'].set_result(job)
+
+    def _expire(self, now):
+        """Drop jobs untouched for ttl seconds (and the oldest beyond capacity)"""
+        cutoff = now - self.ttl
+        expired = []
+        for job in self.jobs.values():
+            if job['created'] >= cutoff and len(self.jobs) - len(expired) <= self.capacity:
+                break # Everything after this one is newer
+            if job['updated'] < cutoff or len(self.jobs) - len(expired) > self.capacity:
+                expired.append(job)
+
+        for job in expired:
+            del self.jobs[job['id']]
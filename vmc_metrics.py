@@ -0,0 +1,127 @@
+# vmc_metrics.py
+# Prometheus-style counters and latency histograms for the driver.
+# Recording is a dict lookup, a bisect and an increment under a short lock;
+# nothing here ever runs while serial I/O is in progress.
+
+import time
+import bisect
+import threading
+from vmc_codes import VMC_INCOMING_COMMANDS
+
+# Seconds. Spans one fast POLL reply up to a slow dispense.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Command lifecycle phases (see VMCDriver._handle_poll / _handle_ack / _handle_data_packet)
+PHASES = ('queue_wait', 'poll_to_send', 'send_to_ack', 'ack_to_data', 'end_to_end')
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class DriverMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}    # (cmd, phase) -> Histogram
+        self.counters = {}      # (name, cmd) -> int
+        self.started = time.time()
+
+    # --- RECORDING ---
+
+    def observe(self, cmd_byte, phase, seconds):
+        key = (cmd_byte, phase)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name, cmd_byte=None, amount=1):
+        key = (name, cmd_byte)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def command_done(self, entry):
+        """Scheduler callback: the command's future has a result (any thread)"""
+        result = entry['future'].result()
+        cmd_byte = entry['cmd']
+        self.observe(cmd_byte, 'end_to_end', time.monotonic() - entry['submitted_at'])
+
+        error = result.get('error')
+        if error == "TIMEOUT":
+            self.inc('timeouts', cmd_byte)
+        elif error == "MAX_RETRIES_REACHED":
+            self.inc('max_retries', cmd_byte)
+        else:
+            self.inc('completed', cmd_byte)
+
+    # --- EXPOSITION ---
+
+    def render(self, driver):
+        """Prometheus text format (version 0.0.4)"""
+        with self.lock:
+            histograms = {key: (list(h.counts), h.total, h.count) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            "# HELP vmc_command_phase_seconds Command latency by phase",
+            "# TYPE vmc_command_phase_seconds histogram",
+        ]
+        for (cmd_byte, phase), (counts, total, count) in sorted(histograms.items()):
+            labels = f'cmd="{cmd_byte:#04x}",phase="{phase}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'vmc_command_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'vmc_command_phase_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'vmc_command_phase_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'vmc_command_phase_seconds_count{{{labels}}} {count}')
+
+        per_command = {
+            'completed': "Commands answered by the VMC",
+            'retries': "Command re-sends after a missing ACK",
+            'max_retries': "Commands abandoned after MAX_RETRIES",
+            'timeouts': "Commands whose caller timed out",
+        }
+        for name, help_text in per_command.items():
+            lines.append(f"# HELP vmc_command_{name}_total {help_text}")
+            lines.append(f"# TYPE vmc_command_{name}_total counter")
+            for (counter, cmd_byte), value in sorted(counters.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+                if counter == name:
+                    lines.append(f'vmc_command_{name}_total{{cmd="{cmd_byte:#04x}"}} {value}')
+
+        lines.append("# HELP vmc_unsolicited_events_total Unsolicited frames from the VMC by code")
+        lines.append("# TYPE vmc_unsolicited_events_total counter")
+        for (counter, cmd_byte), value in sorted(counters.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+            if counter == 'unsolicited':
+                name = VMC_INCOMING_COMMANDS.get(cmd_byte, "UNKNOWN")
+                lines.append(f'vmc_unsolicited_events_total{{cmd="{cmd_byte:#04x}",name="{name}"}} {value}')
+
+        decoder = driver.decoder
+        simple = [
+            ('vmc_idle_acks_total', 'counter', "ACKs sent to POLLs with nothing queued", counters.get(('idle_acks', None), 0)),
+            ('vmc_frames_total', 'counter', "Valid frames received", decoder.frames_ok),
+            ('vmc_checksum_errors_total', 'counter', "Frames dropped for a bad XOR", decoder.checksum_errors),
+            ('vmc_length_errors_total', 'counter', "Headers dropped for a LEN that spans a complete frame", decoder.length_errors),
+            ('vmc_discarded_bytes_total', 'counter', "Bytes skipped while resynchronizing", decoder.discarded_bytes),
+            ('vmc_queue_depth', 'gauge', "Commands waiting for a POLL", len(driver.scheduler)),
+            ('vmc_poll_interval_seconds', 'gauge', "POLL interval last set on the VMC (0: VMC default)", driver.poll_tuner.current or 0),
+            ('vmc_poll_interval_changes_total', 'counter', "SET_POLL_INTERVAL commands ACKed", driver.poll_tuner.changes),
+            ('vmc_start_time_seconds', 'gauge', "When metrics collection started", self.started),
+        ]
+        for name, kind, help_text, value in simple:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
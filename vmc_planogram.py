@@ -0,0 +1,97 @@
+# vmc_planogram.py
+# Bulk SET_PRICE / SET_INVENTORY / SET_CAPACITY / SET_PRODUCT_ID.
+# Only values that differ from the selection catalog are written, and all
+# writes are queued at once so they go out on consecutive POLLs.
+
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from vmc_codes import CMD_SEND
+from vmc_catalog import FIELDS
+from vmc_schema import SchemaError, encode_command
+
+# field -> SET command (payload layouts in vmc_schema.COMMAND_SCHEMAS)
+FIELD_COMMANDS = {
+    'price': CMD_SEND["SET_PRICE"],
+    'inventory': CMD_SEND["SET_INVENTORY"],
+    'capacity': CMD_SEND["SET_CAPACITY"],
+    'product_id': CMD_SEND["SET_PRODUCT_ID"],
+}
+
+BASE_TIMEOUT = 5.0
+PER_WRITE_TIMEOUT = 0.5 # Roughly two POLL cycles (send + ACK) at the default interval
+
+
+def plan_writes(catalog, planogram):
+    """
+    Diff the planogram against the catalog.
+    Returns (writes, results): writes is a list of (slot, field, cmd, payload),
+    results is {slot: {field: status}} pre-filled with UNCHANGED / errors.
+    """
+    writes = []
+    results = {}
+
+    for item in planogram:
+        slot = item.get('slot_id', item.get('slot'))
+        if not isinstance(slot, int) or not 0 <= slot <= 0xFFFF:
+            results.setdefault(str(slot), {})['error'] = "INVALID_SLOT"
+            continue
+
+        current = catalog.get(slot) or {}
+        slot_results = results.setdefault(slot, {})
+
+        for field in FIELDS:
+            if field not in item:
+                continue
+            value = item[field]
+            if current.get(field) == value:
+                slot_results[field] = "UNCHANGED"
+                continue
+
+            cmd_byte = FIELD_COMMANDS[field]
+            try:
+                payload = encode_command(cmd_byte, {'selection': slot, field: value})
+            except SchemaError:
+                slot_results[field] = "INVALID_VALUE"
+                continue
+            writes.append((slot, field, cmd_byte, payload))
+
+    return writes, results
+
+
+def apply_planogram(driver, planogram, timeout=None):
+    """
+    Writes every changed value back to back. Returns per-slot results and
+    total elapsed time.
+    """
+    t_start = time.monotonic()
+    writes, results = plan_writes(driver.catalog, planogram)
+
+    if timeout is None:
+        timeout = BASE_TIMEOUT + PER_WRITE_TIMEOUT * len(writes)
+    deadline = t_start + timeout
+
+    # Queue everything now: the driver sends one per POLL, no gaps between them
+    queued = [(slot, field, driver.scheduler.submit(cmd_byte, payload, timeout))
+              for slot, field, cmd_byte, payload in writes]
+
+    failed = 0
+    for slot, field, entry in queued:
+        try:
+            result = entry['future'].result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            driver.scheduler.cancel(entry)
+            result = {"error": "TIMEOUT"}
+
+        if 'error' in result:
+            failed += 1
+            results[slot][field] = result['error']
+        else:
+            results[slot][field] = "UPDATED"
+
+    return {
+        "elapsed": round(time.monotonic() - t_start, 3),
+        "updated": len(writes) - failed,
+        "failed": failed,
+        "unchanged": sum(1 for fields in results.values() for status in fields.values() if status == "UNCHANGED"),
+        "results": [dict(fields, slot=slot) for slot, fields in results.items()],
+    }
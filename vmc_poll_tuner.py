@@ -0,0 +1,84 @@
+# vmc_poll_tuner.py
+# Adaptive POLL interval (SET_POLL_INTERVAL, 0x16).
+# A command can only go out when the VMC polls us, so the POLL interval is
+# the floor on command latency. While there is work (several commands
+# queued, a vend running) we ask the VMC to poll fast; once the link has
+# been idle for a while we ask it to slow down again, which cuts serial
+# chatter and wakeups on both ends.
+
+import time
+
+FAST_INTERVAL = 0.05  # Seconds between POLLs while busy
+SLOW_INTERVAL = 0.5   # ...and while idle
+IDLE_AFTER = 2.0      # Seconds without work before slowing down
+BUSY_DEPTH = 2        # Queued commands worth spending one POLL on 0x16 for
+VEND_TIMEOUT = 30.0   # Stop treating a vend as running if its final 0x04 never came
+RETRY_AFTER = 30.0    # Back off after the VMC rejects / ignores a 0x16
+
+INTERVAL_UNIT = 0.01  # Protocol: one byte, 10 ms units
+
+
+class PollTuner:
+    """
+    Decides, at each POLL, whether the VMC's poll interval should change.
+    Only the serial thread calls into it.
+    """
+
+    def __init__(self, fast=FAST_INTERVAL, slow=SLOW_INTERVAL, idle_after=IDLE_AFTER, busy_depth=BUSY_DEPTH,
+                 enabled=True):
+        """enabled=False never asks for a change (e.g. replays, where every 0x16 is already recorded)"""
+        for interval in (fast, slow):
+            if not INTERVAL_UNIT <= interval <= 0xFF * INTERVAL_UNIT:
+                raise ValueError(f"Poll interval must be {INTERVAL_UNIT}..{0xFF * INTERVAL_UNIT}s, got {interval}")
+        if fast > slow:
+            raise ValueError(f"Fast poll interval {fast} is slower than slow interval {slow}")
+
+        self.fast = fast
+        self.slow = slow
+        self.idle_after = idle_after
+        self.busy_depth = busy_depth
+        self.enabled = enabled
+
+        self.current = None       # Last interval the VMC ACKed (None: its own default)
+        self.pending = None       # 0x16 on its way
+        self.last_busy = time.monotonic()
+        self.vend_until = 0.0
+        self.retry_at = 0.0
+        self.changes = 0
+
+    @staticmethod
+    def units(interval):
+        """Seconds -> 0x16 payload byte"""
+        return max(1, min(0xFF, round(interval / INTERVAL_UNIT)))
+
+    def note_dispense(self, status, now):
+        """0x04 DISPENSING_STATUS record: a vend is running until a terminal status"""
+        self.vend_until = 0.0 if status.terminal else now + VEND_TIMEOUT
+
+    def next_interval(self, queued, line_busy, now):
+        """Interval to request at this POLL, or None to leave it as is"""
+        vending = now < self.vend_until
+        if queued or line_busy or vending:
+            self.last_busy = now
+        if not self.enabled or line_busy or self.pending is not None or now < self.retry_at:
+            return None # One command at a time; this one waits for a free line
+
+        if queued >= self.busy_depth or vending:
+            target = self.fast
+        elif now - self.last_busy >= self.idle_after:
+            target = self.slow
+        else:
+            return None
+        return None if target == self.current else target
+
+    def requested(self, interval):
+        self.pending = interval
+
+    def confirmed(self, interval, result):
+        """0x16 finished (any thread that resolves the future: the serial thread)"""
+        self.pending = None
+        if 'error' in result:
+            self.retry_at = time.monotonic() + RETRY_AFTER
+            return
+        self.current = interval
+        self.changes += 1
@@ -0,0 +1,179 @@
+# vmc_pool.py
+# Several VMCs wired to one host, served from a single thread.
+#
+# Every machine is still a full VMCDriver (own scheduler, packet numbering,
+# catalog, event bus, metrics); only the reading changes. Instead of one
+# blocked thread per port, all ports are opened non-blocking and watched by
+# one selector (epoll on Linux), which hands each readable port to its
+# driver's _on_readable(). Idle machines cost nothing; a POLL costs one
+# wakeup wherever it arrives.
+#
+# POSIX only: Windows serial handles cannot be selected on.
+
+import os
+import selectors
+import traceback
+import threading
+import serial
+from vmc_driver import VMCDriver
+from vmc_poll_tuner import PollTuner, FAST_INTERVAL, SLOW_INTERVAL
+from vmc_trace import Tracer, ERROR
+from vmc_telemetry import TelemetrySampler, SAMPLE_INTERVAL
+from vmc_sales import SalesStore, SalesIngestor, SALES_INTERVAL
+
+
+class UnknownMachine(LookupError):
+    """No machine with that ID is configured"""
+
+
+def parse_machines(spec):
+    """'lobby=/dev/ttyUSB0,floor2=/dev/ttyUSB1' -> {'lobby': '/dev/ttyUSB0', ...}"""
+    machines = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        machine_id, _, port = item.partition('=')
+        if not port:
+            raise ValueError(f"Expected machine_id=port, got {item!r}")
+        machines[machine_id.strip()] = port.strip()
+    return machines
+
+
+def build_pool(machines, capture_path=None, snapshot_path=None, poll_fast=FAST_INTERVAL, poll_slow=SLOW_INTERVAL,
+               trace_path=None, trace_options=None, telemetry_interval=SAMPLE_INTERVAL,
+               sales_path=None, sales_interval=SALES_INTERVAL):
+    """
+    DriverPool for {machine_id: port}; with several machines each gets its
+    own capture / snapshot / trace file. trace_options: Tracer keyword arguments.
+    telemetry_interval: seconds between background 0x51 samples (0: off).
+    sales_path: one SQLite database for every machine's sales reports.
+    """
+    pool = DriverPool()
+    sales = SalesStore(sales_path) if sales_path else None
+    for machine_id, port in machines.items():
+        capture, snapshot, trace = capture_path, snapshot_path, trace_path
+        if len(machines) > 1:
+            capture = capture and f"{capture}.{machine_id}"
+            snapshot = snapshot and f"{snapshot}.{machine_id}"
+            trace = trace and f"{trace}.{machine_id}"
+        pool.add(machine_id, port, capture_path=capture, snapshot_path=snapshot,
+                 poll_tuner=PollTuner(poll_fast, poll_slow),
+                 tracer=Tracer(**(trace_options or {})), trace_path=trace,
+                 telemetry_sampler=TelemetrySampler(telemetry_interval),
+                 sales=sales and SalesIngestor(sales, machine_id, sales_interval))
+    return pool
+
+
+class DriverPool:
+    def __init__(self):
+        self.machines = {} # machine_id -> VMCDriver
+        self.selector = None
+        self.running = False
+        self.thread = None
+
+        # Ports opened after start(): registered by the loop thread itself,
+        # which a byte on the wake pipe interrupts
+        self.lock = threading.Lock()
+        self.pending = []
+        self.wake_r = self.wake_w = None
+
+    def __len__(self):
+        return len(self.machines)
+
+    def __contains__(self, machine_id):
+        return machine_id in self.machines
+
+    def __getitem__(self, machine_id):
+        return self.machines[machine_id]
+
+    def get(self, machine_id):
+        return self.machines.get(machine_id)
+
+    def add(self, machine_id, port, **options):
+        """
+        Creates the machine's driver (options: VMCDriver keyword arguments);
+        opened right away if the pool is running.
+        """
+        if machine_id in self.machines:
+            raise ValueError(f"Machine {machine_id!r} already exists")
+        driver = VMCDriver(port, **options)
+        self.machines[machine_id] = driver
+        if self.running:
+            self._open(machine_id, driver)
+            with self.lock:
+                self.pending.append((machine_id, driver))
+            os.write(self.wake_w, b'\0')
+        return driver
+
+    def start(self):
+        """Opens every port and starts the selector thread"""
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+
+        for machine_id, driver in self.machines.items():
+            if self._open(machine_id, driver):
+                self.selector.register(driver.serial.fileno(), selectors.EVENT_READ, (machine_id, driver))
+
+        self.running = True
+        self.thread = threading.Thread(target=self._select_loop, daemon=True)
+        self.thread.start()
+        print(f"[Pool] Serving {len(self.machines)} machine(s) with {type(self.selector).__name__}")
+
+    def stop(self):
+        """Stops the selector thread, then closes every port"""
+        self.running = False
+        if self.thread:
+            os.write(self.wake_w, b'\0')
+            self.thread.join(timeout=1.0)
+        for driver in self.machines.values():
+            if driver.serial:
+                driver.stop() # No thread of its own: closes port and capture
+        if self.selector:
+            self.selector.close()
+            os.close(self.wake_r)
+            os.close(self.wake_w)
+
+    def _open(self, machine_id, driver):
+        try:
+            driver.open(timeout=0) # Non-blocking: only read what is already there
+        except serial.SerialException as e:
+            print(f"[Pool] {machine_id}: failed to open {driver.port}: {e}")
+            return False
+        print(f"[VMC] Driver {machine_id} started on {driver.port}")
+        return True
+
+    def _select_loop(self):
+        """Main Loop: waits on every port at once and dispatches to its driver"""
+        while self.running:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    self._drain_wake_pipe()
+                    continue
+
+                machine_id, driver = key.data
+                try:
+                    driver._on_readable()
+                except (serial.SerialException, OSError) as e:
+                    # Unplugged: drop this port, keep serving the others
+                    driver.tracer.event(ERROR, 'pool.read_failed', machine=machine_id, port=driver.port, error=str(e))
+                    self.selector.unregister(key.fd)
+                    driver.running = False
+                except Exception as e:
+                    # A bug or bad frame in one driver's handlers: log it, keep serving every machine
+                    driver.tracer.event(ERROR, 'pool.dispatch_failed', machine=machine_id, port=driver.port,
+                                        error=repr(e), traceback=traceback.format_exc())
+
+    def _drain_wake_pipe(self):
+        try:
+            while os.read(self.wake_r, 64):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for machine_id, driver in pending:
+            if driver.serial and driver.serial.is_open:
+                self.selector.register(driver.serial.fileno(), selectors.EVENT_READ, (machine_id, driver))
@@ -0,0 +1,161 @@
+# vmc_profile.py
+# Machine configuration profiles over the 0x70 menu command.
+#
+# A profile names the settings a machine should have:
+#   {"LIGHT_CONTROL": {"mode": 1}, "TEMP_CONTROLLER_SETTING": {"mode": 1, "target": 4},
+#    "AUTO_CHANGE_TIME": [30]}
+# (named fields for sub-commands declared in vmc_schema.MENU_SCHEMAS, raw
+# parameter bytes for the rest).
+#
+# The VMC answers every 0x70 for a setting, query or write, with a 0x71
+# carrying the setting's current value; SettingsCache keeps the last one
+# per setting. apply_profile() queries only the settings it has never seen
+# (or all of them with refresh=True), in one back-to-back group, diffs the
+# profile against the cache and writes only what differs, in a second
+# group. A re-applied profile costs no writes at all, and a first one
+# costs one query per setting plus one write per change, on consecutive
+# POLLs.
+
+import time
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from vmc_codes import CMD_SEND, MENU_SUB_COMMANDS
+from vmc_schema import SchemaError, MENU_SCHEMAS, encode_menu
+from vmc_planogram import BASE_TIMEOUT, PER_WRITE_TIMEOUT
+from vmc_scheduler import PRIORITY_CONTROL
+
+# Persistent settings a profile may hold (not actions, tests, clears or queries)
+PROFILE_SETTINGS = frozenset(MENU_SUB_COMMANDS[name] for name in (
+    # Payment
+    "COIN_SYSTEM_SETTING", "UNIONPAY_POS_SETTING", "BILL_VALUE_ACCEPTED", "BILL_ACCEPTING_MODE",
+    "BILL_LOW_CHANGE", "AUTO_CHANGE_TIME", "AUTO_HOLDING_TIME", "REMAINING_CREDIT_MODE",
+    # Machine
+    "MACHINE_ID", "DECIMAL_POINT", "LIGHT_CONTROL",
+    # Hardware / motors
+    "SELECTION_MODE_SETTING", "MOTOR_AD_SETTING", "COUPLING_SYNC_TIME", "MOTOR_SHORT_VALUE",
+    "DELIVERY_DOOR_CLOSE_TIME", "CONNECTING_LIFT", "ANTI_THEFT_BOARD_TIME", "DROP_SENSOR_SETTING",
+    "BELT_DETECTION_SETTING", "EXTRA_QUARTER_TURN", "JAMMED_SELECTION_ACTION",
+    "DROP_SENSOR_FREQ_ADJ", "DROP_SENSOR_SENSITIVITY",
+    # Temperature
+    "TEMP_CONTROLLER_SETTING", "COMPRESSOR_PERIOD", "CONNECT_TEMP_CONTROLLER",
+    # Lift
+    "LIFT_SPEED", "LIFT_SENSITIVITY",
+))
+SETTING_NAMES = {sub_cmd: name for name, sub_cmd in MENU_SUB_COMMANDS.items() if sub_cmd in PROFILE_SETTINGS}
+
+
+class SettingsCache:
+    """Last reported value per setting: {sub_cmd: (params bytes, time.time())}"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def note(self, record):
+        """Serial thread: a 0x71 reply (settings only; query results are not cached)"""
+        if record.sub_type in PROFILE_SETTINGS:
+            with self.lock:
+                self.values[record.sub_type] = (bytes(record.params), time.time())
+
+    def get(self, sub_cmd):
+        """Params bytes, or None if the setting was never reported"""
+        with self.lock:
+            value = self.values.get(sub_cmd)
+        return value and value[0]
+
+    def snapshot(self):
+        """{name: {"params", "values" (named fields, if declared), "ts"}}"""
+        with self.lock:
+            values = dict(self.values)
+        settings = {}
+        for sub_cmd, (params, ts) in sorted(values.items()):
+            schema = MENU_SCHEMAS.get(sub_cmd)
+            record = schema.decode(params) if schema else None
+            decoded = record.to_dict() if record is not None and record.complete else None # Short: raw params only
+            settings[SETTING_NAMES[sub_cmd]] = {"params": list(params), "values": decoded, "ts": ts}
+        return settings
+
+
+def plan_profile(profile):
+    """
+    Validate and encode the profile.
+    Returns (wanted, results): wanted is {sub_cmd: (name, params bytes)},
+    results is {name: status} pre-filled with errors.
+    """
+    wanted = {}
+    results = {}
+    for name, params in profile.items():
+        sub_cmd = MENU_SUB_COMMANDS.get(name)
+        if sub_cmd not in PROFILE_SETTINGS:
+            results[name] = "INVALID_SETTING"
+            continue
+        try:
+            payload = encode_menu(name, params)
+        except (SchemaError, TypeError, ValueError):
+            payload = None
+        if not payload or len(payload) < 2: # No params would be a query, not a write
+            results[name] = "INVALID_VALUE"
+            continue
+        wanted[sub_cmd] = (name, payload[1:]) # Minus the sub-command byte
+    return wanted, results
+
+
+def apply_profile(driver, profile, refresh=False, timeout=None, priority=PRIORITY_CONTROL):
+    """
+    Brings the machine's settings to the profile, writing only what differs.
+    Returns per-setting results, the number of queries and writes, and the
+    total elapsed time.
+    """
+    t_start = time.monotonic()
+    wanted, results = plan_profile(profile)
+    settings = driver.settings
+    menu = CMD_SEND["MENU_COMMAND_WRAPPER"]
+
+    if timeout is None:
+        timeout = BASE_TIMEOUT + PER_WRITE_TIMEOUT * 2 * len(wanted)
+    deadline = t_start + timeout
+
+    # 1. Current values: one query per setting never seen, back to back
+    unknown = [sub_cmd for sub_cmd in wanted if refresh or settings.get(sub_cmd) is None]
+    for entry in submit_group(driver, [(menu, bytes([sub_cmd])) for sub_cmd in unknown], timeout, priority):
+        wait_entry(driver, entry, deadline) # A failed read just leaves the value unknown: written below
+
+    # 2. Diff, then every change back to back
+    writes = []
+    for sub_cmd, (name, params) in wanted.items():
+        if settings.get(sub_cmd) == params:
+            results[name] = "UNCHANGED"
+        else:
+            writes.append((name, bytes([sub_cmd]) + params))
+    entries = submit_group(driver, [(menu, payload) for name, payload in writes], timeout, priority)
+
+    failed = 0
+    for (name, payload), entry in zip(writes, entries):
+        result = wait_entry(driver, entry, deadline)
+        if 'error' in result:
+            failed += 1
+            results[name] = result['error']
+        else:
+            results[name] = "UPDATED"
+
+    return {
+        "elapsed": round(time.monotonic() - t_start, 3),
+        "queried": len(unknown),
+        "updated": len(writes) - failed,
+        "failed": failed,
+        "unchanged": sum(1 for status in results.values() if status == "UNCHANGED"),
+        "results": results,
+    }
+
+
+def submit_group(driver, commands, timeout, priority):
+    return driver.scheduler.submit_group(commands, timeout, priority=priority) if commands else []
+
+
+def wait_entry(driver, entry, deadline):
+    """An entry's result, or TIMEOUT (and cancelled) once the deadline has passed"""
+    try:
+        return entry['future'].result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        driver.scheduler.cancel(entry)
+        return {"error": "TIMEOUT"}
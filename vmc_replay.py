@@ -0,0 +1,135 @@
+# vmc_replay.py
+# Feeds a capture written by VMCDriver(capture_path=...) back through the
+# driver's decoder and POLL/ACK/data state machine, without a serial port.
+#
+#   python vmc_replay.py kiosk.cap                 # as fast as possible, print a summary
+#   python vmc_replay.py kiosk.cap --speed 1       # original timing
+#   python vmc_replay.py kiosk.cap --dump          # list every record
+#   python vmc_replay.py kiosk.cap --metrics       # driver metrics after the replay
+
+import time
+import argparse
+from vmc_codes import *
+from vmc_driver import VMCDriver
+from vmc_poll_tuner import PollTuner
+from vmc_telemetry import TelemetrySampler
+from vmc_capture import read_capture, RX, TX
+from vmc_framing import FrameDecoder
+
+
+class ReplaySerial:
+    """Stands in for the port: collects what the driver writes"""
+    in_waiting = 0
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        return len(data)
+
+
+def frame_name(cmd_id, direction):
+    if direction == RX:
+        return VMC_INCOMING_COMMANDS.get(cmd_id, f"{cmd_id:#04x}")
+    for name, code in CMD_SEND.items():
+        if code == cmd_id:
+            return name
+    return "ACK" if cmd_id == CMD_ACK else f"{cmd_id:#04x}"
+
+
+def outbound_commands(records):
+    """
+    For each RX record index, the commands we sent in reply to it (TX frames
+    up to the next RX), minus re-sends of the same PackNO.
+    """
+    commands = {}
+    last_rx = None
+    last_pack_no = None
+    for index, (_, direction, data) in enumerate(records):
+        if direction == RX:
+            last_rx = index
+            continue
+        for frame in FrameDecoder().feed(data):
+            if frame[2] == CMD_ACK or last_rx is None:
+                continue
+            pack_no = frame[4]
+            if pack_no == last_pack_no:
+                continue # Retry of the previous command
+            last_pack_no = pack_no
+            commands.setdefault(last_rx, []).append((frame[2], frame[5:-1]))
+    return commands
+
+
+def replay(path, speed=0.0, commands=True, dump=False):
+    """
+    Replays the capture into a fresh driver and returns (driver, summary).
+    speed: 0 = as fast as possible, 1 = original timing, 10 = 10x faster...
+    commands: re-queue our recorded commands so ACK/data replies match up.
+    """
+    header, records = read_capture(path)
+    records = list(records)
+
+    # Nothing of the driver's own: no telemetry samples or 0x16s the capture does not have
+    driver = VMCDriver('replay', poll_tuner=PollTuner(enabled=False), telemetry_sampler=TelemetrySampler(0))
+    driver.serial = ReplaySerial()
+    to_queue = outbound_commands(records) if commands else {}
+
+    dump_decoders = {RX: FrameDecoder(), TX: FrameDecoder()}
+    first_ts = records[0][0] if records else header['monotonic']
+    rx_bytes = 0
+    tx_frames = 0
+    t_start = time.perf_counter()
+
+    for index, (ts, direction, data) in enumerate(records):
+        if speed:
+            delay = (ts - first_ts) / speed - (time.perf_counter() - t_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        if dump:
+            arrow = '<-' if direction == RX else '->'
+            for frame in dump_decoders[direction].feed(data):
+                print(f"{ts - first_ts:10.4f} {arrow} {frame_name(frame[2], direction):<24} {frame.hex(' ')}")
+
+        if direction == RX:
+            rx_bytes += len(data)
+            # The driver sent these in reply to this chunk: have them ready for its POLL
+            for cmd_byte, payload in to_queue.get(index, ()):
+                driver.scheduler.submit(cmd_byte, payload, None)
+            driver._feed(data)
+        else:
+            tx_frames += 1
+
+    elapsed = time.perf_counter() - t_start
+    duration = records[-1][0] - first_ts if records else 0.0
+    summary = {
+        'records': len(records),
+        'rx_bytes': rx_bytes,
+        'tx_frames_recorded': tx_frames,
+        'tx_frames_replayed': len(driver.serial.written),
+        'frames_ok': driver.decoder.frames_ok,
+        'checksum_errors': driver.decoder.checksum_errors,
+        'events': driver.events.last_seq,
+        'selections': len(driver.catalog),
+        'captured_seconds': round(duration, 3),
+        'replay_seconds': round(elapsed, 3),
+        'speedup': round(duration / elapsed, 1) if elapsed else None,
+    }
+    return driver, summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a VMC wire capture through the driver")
+    parser.add_argument('capture')
+    parser.add_argument('--speed', type=float, default=0.0, help="0 = as fast as possible, 1 = real time")
+    parser.add_argument('--no-commands', action='store_true', help="Do not re-queue our recorded commands")
+    parser.add_argument('--dump', action='store_true', help="Print every record")
+    parser.add_argument('--metrics', action='store_true', help="Print driver metrics afterwards")
+    args = parser.parse_args()
+
+    driver, summary = replay(args.capture, args.speed, not args.no_commands, args.dump)
+    for key, value in summary.items():
+        print(f"{key:<20} {value}")
+    if args.metrics:
+        print(driver.metrics.render(driver))
@@ -0,0 +1,424 @@
+# vmc_sales.py
+# Sales reports in a local SQLite database, so back-office reporting reads
+# a file instead of asking the VMC.
+#
+# SalesIngestor (one thread per machine) pulls the 0x70 sales queries
+# (DAILY / MONTHLY / YEARLY / ENTIRE_MACHINE / SELECTION sales and
+# QUERY_COIN_NUMBER) one at a time, only while the link is idle, at
+# PRIORITY_BACKGROUND. Passes are incremental:
+# - a closed period (an earlier day, last month, last year) is fetched
+#   until a reply arrives after it ended, then never again
+# - today / this month / this year, the machine total, coin levels and
+#   per-slot totals are fetched again only after a vend was logged (only
+#   the slots that sold), or every REFRESH_AFTER in full
+# Terminal 0x04 results are logged too: the serial thread appends them to
+# a deque (no I/O) and the ingestor thread writes them.
+#
+# WAL mode: /sales readers never wait for the writer.
+
+import time
+import sqlite3
+import datetime
+import traceback
+import threading
+import collections
+from contextlib import closing
+from concurrent.futures import TimeoutError as FutureTimeout
+from vmc_codes import CMD_SEND, MENU_SUB_COMMANDS
+from vmc_schema import encode_menu
+from vmc_scheduler import PRIORITY_BACKGROUND
+from vmc_catalog import DISPENSE_SUCCESS
+from vmc_trace import INFO, WARN, ERROR
+
+SALES_INTERVAL = 300.0 # Seconds between ingestion passes
+REFRESH_AFTER = 3600.0 # Refetch open periods and every slot at least this often, vends or not
+BACKFILL_DAYS = 31     # Closed days fetched on the first passes
+FLUSH_INTERVAL = 1.0   # Seconds between vend log writes
+QUERY_TIMEOUT = 5.0
+IDLE_WAIT = 0.1        # Seconds between "is the link idle?" checks
+MAX_IDLE_WAIT = 30.0   # Link busy this long: leave the rest of the pass for later
+
+# Report kinds served by SalesStore.report()
+PERIOD_KINDS = ('daily', 'monthly', 'yearly', 'total')
+REPORT_KINDS = PERIOD_KINDS + ('selection', 'coins')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS period_sales (
+    machine TEXT NOT NULL, kind TEXT NOT NULL, period TEXT NOT NULL,
+    count INTEGER NOT NULL, amount INTEGER NOT NULL,
+    fetched_at REAL NOT NULL, final INTEGER NOT NULL,
+    PRIMARY KEY (machine, kind, period)
+);
+CREATE TABLE IF NOT EXISTS selection_sales (
+    machine TEXT NOT NULL, selection INTEGER NOT NULL,
+    count INTEGER NOT NULL, amount INTEGER NOT NULL, fetched_at REAL NOT NULL,
+    PRIMARY KEY (machine, selection)
+);
+CREATE TABLE IF NOT EXISTS coin_tubes (
+    machine TEXT NOT NULL, value INTEGER NOT NULL, count INTEGER NOT NULL, fetched_at REAL NOT NULL,
+    PRIMARY KEY (machine, value)
+);
+CREATE TABLE IF NOT EXISTS vends (
+    id INTEGER PRIMARY KEY, machine TEXT NOT NULL, ts REAL NOT NULL,
+    selection INTEGER, status INTEGER NOT NULL, success INTEGER NOT NULL, price INTEGER
+);
+CREATE INDEX IF NOT EXISTS vends_by_time ON vends (machine, ts);
+CREATE INDEX IF NOT EXISTS vends_by_selection ON vends (machine, selection, ts);
+"""
+
+
+class SalesNotConfigured(RuntimeError):
+    """args: (machine_id,): no sales database for this machine (VMC_SALES_DB unset)"""
+
+
+class SalesQueryFailed(RuntimeError):
+    """args: (sub-command name, error)"""
+
+
+class SalesStore:
+    """
+    The database (a file: readers open their own connections). One writer
+    connection shared by every machine's ingestor, under a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+        self.pending = collections.deque() # Vend log rows from the serial threads
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.db.close()
+
+    # --- WRITES ---
+
+    def note_vend(self, machine, ts, selection, status, price):
+        """Any thread; never blocks (written by the next flush())"""
+        self.pending.append((machine, ts, selection, status, int(status == DISPENSE_SUCCESS), price))
+
+    def flush(self):
+        """Writes the queued vend log rows; if the write fails they stay queued for the next flush()"""
+        with self.lock:
+            rows = []
+            while self.pending:
+                rows.append(self.pending.popleft())
+            if not rows:
+                return 0
+            try:
+                with self.db:
+                    self.db.executemany(
+                        'INSERT INTO vends (machine, ts, selection, status, success, price) VALUES (?, ?, ?, ?, ?, ?)',
+                        rows)
+            except sqlite3.Error:
+                self.pending.extendleft(reversed(rows)) # Back in front, in order, of any appended meanwhile
+                raise
+        return len(rows)
+
+    def save_period(self, machine, kind, period, count, amount, final):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO period_sales VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (machine, kind, period, count, amount, time.time(), int(final)))
+
+    def save_selection(self, machine, selection, count, amount):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO selection_sales VALUES (?, ?, ?, ?, ?)',
+                            (machine, selection, count, amount, time.time()))
+
+    def save_coins(self, machine, tubes):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM coin_tubes WHERE machine = ?', (machine,))
+            self.db.executemany('INSERT INTO coin_tubes VALUES (?, ?, ?, ?)',
+                                [(machine, tube['value'], tube['count'], now) for tube in tubes])
+
+    # --- READS ---
+
+    def _query(self, sql, args=()):
+        with closing(sqlite3.connect(self.path)) as db:
+            db.row_factory = sqlite3.Row
+            return [dict(row) for row in db.execute(sql, args)]
+
+    def final_periods(self, machine):
+        """{(kind, period)} that will not change any more"""
+        rows = self._query('SELECT kind, period FROM period_sales WHERE machine = ? AND final', (machine,))
+        return {(row['kind'], row['period']) for row in rows}
+
+    def sold_since(self, machine, ts):
+        """Slots with a vend logged at or after ts"""
+        rows = self._query('SELECT DISTINCT selection FROM vends WHERE machine = ? AND ts >= ? AND success',
+                           (machine, ts))
+        return {row['selection'] for row in rows}
+
+    def report(self, machine, kind, since=None, until=None):
+        """
+        Stored rows of one report kind (REPORT_KINDS), oldest period first.
+        since / until bound the period ('2026-10-01', '2026-10'...) for period kinds.
+        """
+        if kind in PERIOD_KINDS:
+            sql = 'SELECT period, count, amount, fetched_at, final FROM period_sales WHERE machine = ? AND kind = ?'
+            args = [machine, kind]
+            if since is not None:
+                sql += ' AND period >= ?'
+                args.append(since)
+            if until is not None:
+                sql += ' AND period <= ?'
+                args.append(until)
+            rows = self._query(sql + ' ORDER BY period', args)
+            for row in rows:
+                row['final'] = bool(row['final'])
+            return rows
+        if kind == 'selection':
+            return self._query('SELECT selection, count, amount, fetched_at FROM selection_sales '
+                               'WHERE machine = ? ORDER BY selection', (machine,))
+        if kind == 'coins':
+            return self._query('SELECT value, count, fetched_at FROM coin_tubes WHERE machine = ? ORDER BY value',
+                               (machine,))
+        raise ValueError(f"Unknown sales report {kind!r} (expected one of {', '.join(REPORT_KINDS)})")
+
+    def vends(self, machine, since=None, until=None, selection=None, limit=None):
+        """Logged 0x04 results in [since, until] (epoch seconds), oldest first (the newest `limit`)"""
+        sql = 'SELECT id, ts, selection, status, success, price FROM vends WHERE machine = ?'
+        args = [machine]
+        if since is not None:
+            sql += ' AND ts >= ?'
+            args.append(since)
+        if until is not None:
+            sql += ' AND ts <= ?'
+            args.append(until)
+        if selection is not None:
+            sql += ' AND selection = ?'
+            args.append(selection)
+        sql += ' ORDER BY ts DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        rows = self._query(sql, args)
+        for row in rows:
+            row['success'] = bool(row['success'])
+        return rows[::-1]
+
+
+class SalesIngestor:
+    """One machine's ingestion thread. The driver calls start(driver) / stop() from open() / stop()."""
+
+    def __init__(self, store, machine_id, interval=SALES_INTERVAL):
+        self.store = store
+        self.machine_id = machine_id
+        self.interval = interval
+        self.driver = None
+        self.refreshed_at = None # Wall time of the last pass that refetched the open periods
+        self.full_at = None      # ...and of the last one that refetched every slot
+        self.queries = 0
+        self.failed = 0
+        self.last_pass = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, driver):
+        self.driver = driver
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the thread; logged vends are written"""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=QUERY_TIMEOUT + 1.0)
+            self.thread = None
+        self.store.flush()
+
+    def refresh(self):
+        """Run a pass now (within FLUSH_INTERVAL) instead of at the next interval"""
+        self.wake.set()
+
+    def note_dispense(self, record):
+        """Serial thread, terminal 0x04 record: queue it for the vend log (complete records only)"""
+        if not record.complete:
+            return
+        selection = self.driver.catalog.get(record.selection)
+        self.store.note_vend(self.machine_id, time.time(), record.selection, record.status,
+                             selection and selection['price'])
+
+    def state(self):
+        return {
+            "interval": self.interval,
+            "queries": self.queries,
+            "failed": self.failed,
+            "refreshed_at": self.refreshed_at,
+            "last_pass": self.last_pass,
+        }
+
+    def _run(self):
+        next_pass = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                self.store.flush()
+                if self.wake.is_set() or time.monotonic() >= next_pass:
+                    self.wake.clear()
+                    if self.driver.running:
+                        self.run_pass()
+                    next_pass = time.monotonic() + self.interval
+            except sqlite3.Error as e:
+                self.driver.tracer.event(ERROR, 'sales.db_failed', error=str(e), path=self.store.path)
+            except Exception as e:
+                # E.g. a malformed report: this pass is lost, ingestion carries on
+                self.driver.tracer.event(ERROR, 'sales.pass_failed', error=repr(e), traceback=traceback.format_exc())
+                next_pass = time.monotonic() + self.interval
+            self.stopped.wait(FLUSH_INTERVAL)
+
+    # --- INGESTION ---
+
+    def _plan(self, now):
+        """[(kind, key)] to fetch in this pass"""
+        today = datetime.date.fromtimestamp(now)
+        final = self.store.final_periods(self.machine_id)
+        plan = []
+
+        # Closed periods: until a reply arrived after they ended
+        for back in range(BACKFILL_DAYS, 0, -1):
+            day = today - datetime.timedelta(days=back)
+            if ('daily', period_key('daily', day)) not in final:
+                plan.append(('daily', day))
+        last_month = today.replace(day=1) - datetime.timedelta(days=1)
+        last_year = today.replace(year=today.year - 1, month=1, day=1)
+        for kind, date in (('monthly', last_month), ('yearly', last_year)):
+            if (kind, period_key(kind, date)) not in final:
+                plan.append((kind, date))
+
+        # Open periods: only after vends (or every REFRESH_AFTER)
+        full = self.full_at is None or now - self.full_at >= REFRESH_AFTER
+        sold = set() if full else self.store.sold_since(self.machine_id, self.refreshed_at)
+        if full or sold:
+            plan += [('daily', today), ('monthly', today), ('yearly', today), ('total', None), ('coins', None)]
+            slots = [row['slot'] for row in self.driver.catalog.snapshot()['selections']] if full else sorted(sold)
+            plan += [('selection', slot) for slot in slots]
+            # Catalog not synced yet: every slot on the next pass
+            full = full and bool(slots)
+        return plan, full
+
+    def run_pass(self):
+        """Fetch what the plan needs; stops early when the link stays busy or a query fails"""
+        started = time.time()
+        plan, full = self._plan(started)
+        done = 0
+        error = None
+        try:
+            for kind, key in plan:
+                if not self._fetch(kind, key, started):
+                    error = "STOPPED" if self.stopped.is_set() else "LINK_BUSY"
+                    break
+                done += 1
+        except SalesQueryFailed as e:
+            self.failed += 1
+            error = f"{e.args[0]}: {e.args[1]}"
+            self.driver.tracer.event(WARN, 'sales.query_failed', query=e.args[0], error=e.args[1])
+
+        if error is None:
+            # Vends logged from `started` on are picked up by the next pass
+            self.refreshed_at = started
+            if full:
+                self.full_at = started
+        self.last_pass = {"started": started, "finished": time.time(), "planned": len(plan), "fetched": done,
+                          "error": error}
+        if plan:
+            self.driver.tracer.event(INFO, 'sales.pass', planned=len(plan), fetched=done, error=error)
+
+    def _fetch(self, kind, key, started):
+        """One query into the store. False if the link never went idle."""
+        machine = self.machine_id
+        if kind == 'coins':
+            values = self._query("QUERY_COIN_NUMBER")
+            if values is None:
+                return False
+            self.store.save_coins(machine, values['tubes'])
+            return True
+
+        if kind == 'selection':
+            values = self._query("SELECTION_SALES_MSG", {'selection': key})
+        elif kind == 'total':
+            values = self._query("ENTIRE_MACHINE_SALES")
+        else:
+            values = self._query(PERIOD_QUERIES[kind], period_params(kind, key))
+        if values is None:
+            return False
+        if values.get('count') is None or values.get('amount') is None:
+            raise SalesQueryFailed(kind, "SHORT_REPLY")
+
+        if kind == 'selection':
+            self.store.save_selection(machine, key, values['count'], values['amount'])
+        elif kind == 'total':
+            self.store.save_period(machine, 'total', 'all', values['count'], values['amount'], final=False)
+        else:
+            final = started >= period_end(kind, key)
+            self.store.save_period(machine, kind, period_key(kind, key), values['count'], values['amount'], final)
+        return True
+
+    def _query(self, name, params=None):
+        """Values of the 0x71 reply to one sales query, or None if the link stayed busy"""
+        driver = self.driver
+        waited = 0.0
+        while driver.active_command is not None or len(driver.scheduler):
+            if waited >= MAX_IDLE_WAIT or self.stopped.is_set():
+                return None
+            self.stopped.wait(IDLE_WAIT)
+            waited += IDLE_WAIT
+
+        entry = driver.scheduler.submit(CMD_SEND["MENU_COMMAND_WRAPPER"], encode_menu(name, params),
+                                        QUERY_TIMEOUT, priority=PRIORITY_BACKGROUND)
+        self.queries += 1
+        deadline = time.monotonic() + QUERY_TIMEOUT + 1.0
+        while True:
+            try:
+                result = entry['future'].result(timeout=IDLE_WAIT)
+                break
+            except FutureTimeout:
+                if self.stopped.is_set(): # A closed link may never answer: do not hold up stop()
+                    driver.scheduler.cancel(entry)
+                    return None
+                if time.monotonic() >= deadline:
+                    result = {"error": "TIMEOUT"}
+                    break
+        if 'error' in result and self.stopped.is_set():
+            return None # Driver shutting down
+        if 'error' in result:
+            raise SalesQueryFailed(name, result['error'])
+        record = result['fields']
+        if record.sub_type != MENU_SUB_COMMANDS[name] or record.values is None:
+            raise SalesQueryFailed(name, "UNEXPECTED_REPLY")
+        return record.values
+
+
+PERIOD_QUERIES = {'daily': "DAILY_SALES", 'monthly': "MONTHLY_SALES", 'yearly': "YEARLY_SALES"}
+PERIOD_FORMATS = {'daily': '%Y-%m-%d', 'monthly': '%Y-%m', 'yearly': '%Y'}
+
+
+def period_key(kind, date):
+    """'2026-10-17' / '2026-10' / '2026'"""
+    return date.strftime(PERIOD_FORMATS[kind])
+
+
+def period_params(kind, date):
+    params = {'year': date.year}
+    if kind in ('daily', 'monthly'):
+        params['month'] = date.month
+    if kind == 'daily':
+        params['day'] = date.day
+    return params
+
+
+def period_end(kind, date):
+    """Epoch seconds (local time) at which the period containing date is over"""
+    if kind == 'daily':
+        end = date + datetime.timedelta(days=1)
+    elif kind == 'monthly':
+        end = (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    else:
+        end = date.replace(year=date.year + 1, month=1, day=1)
+    return time.mktime(end.timetuple())
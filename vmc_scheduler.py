@@ -0,0 +1,182 @@
+# vmc_scheduler.py
+# Command queue between the API threads and the serial thread.
+# The VMC only accepts one command per POLL, so callers queue here and the
+# serial thread pulls the next command each time it is polled.
+
+import time
+import itertools
+import threading
+import collections
+from concurrent.futures import Future
+from vmc_codes import CMD_SEND, EXPECTED_RESPONSES
+
+# Priority classes, lowest first: a customer's vend never waits behind
+# queued writes, and writes never wait behind status / diagnostic queries
+PRIORITY_VEND = 0
+PRIORITY_CONTROL = 1
+PRIORITY_STATUS = 2
+PRIORITY_BACKGROUND = 3 # Sales ingestion: behind everything, and only queued while the link is idle
+PRIORITY_FRONT = -1 # submit(front=True): driver housekeeping, ahead of everything
+
+# Read-only queries: identical requests waiting in the queue share one reply
+COALESCE_COMMANDS = {
+    CMD_SEND["REQUEST_STATUS_SIMPLE"],
+    CMD_SEND["REQUEST_STATUS_FULL"],
+}
+
+
+class CommandScheduler:
+    """
+    Thread-safe queue of commands waiting for a POLL: FIFO within a
+    priority class, lower classes first.
+
+    Each entry is a dict:
+    {'cmd': 0x00, 'data': b'', 'retries': 0, 'sent_status': 'WAITING_FOR_POLL',
+     'expect_code': None, 'future': Future(), 'deadline': float, 'waiters': 1,
+     'submitted_at': float, 'span': int, 'priority': int,
+     'stream': ResponseStream or None, 'frames': 0}
+
+    on_done(entry) is called once per command when its future resolves.
+    tracer (vmc_trace.Tracer) gets each new command's cmd.queued.
+    """
+
+    def __init__(self, on_done=None, tracer=None):
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.on_done = on_done
+        self.tracer = tracer
+        self.span_ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def submit(self, cmd_byte, data_bytes=b'', timeout=None, front=False, priority=PRIORITY_CONTROL, stream=None):
+        """
+        Queue a command and return its entry. entry['future'] resolves with the result.
+        front=True jumps the queue (driver housekeeping such as SET_POLL_INTERVAL).
+        stream: vmc_stream.ResponseStream that gets every reply frame (never coalesced).
+        """
+        data = bytes(data_bytes)
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+
+        with self.lock:
+            if cmd_byte in COALESCE_COMMANDS and stream is None:
+                for entry in self.queue:
+                    if entry['cmd'] == cmd_byte and entry['data'] == data:
+                        # Piggyback on the identical query already waiting
+                        entry['waiters'] += 1
+                        if entry['deadline'] is not None:
+                            entry['deadline'] = None if deadline is None else max(entry['deadline'], deadline)
+                        if self.tracer is not None:
+                            self.tracer.span(entry, 'joined', waiters=entry['waiters'])
+                        return entry
+
+            entry = self._new_entry(cmd_byte, data, now, deadline, PRIORITY_FRONT if front else priority, stream)
+            if front:
+                self.queue.appendleft(entry)
+            else:
+                self._insert([entry])
+            depth = len(self.queue)
+
+        if self.tracer is not None:
+            self.tracer.span(entry, 'queued', depth=depth, front=front)
+        if self.on_done is not None:
+            entry['future'].add_done_callback(lambda _: self.on_done(entry))
+        return entry
+
+    def submit_group(self, commands, timeout=None, priority=PRIORITY_CONTROL):
+        """
+        Queue [(cmd_byte, data_bytes), ...] back to back: nothing else can slip
+        in between, so they go out on consecutive POLLs. Returns their entries.
+        """
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+
+        with self.lock:
+            entries = [self._new_entry(cmd_byte, bytes(data_bytes), now, deadline, priority)
+                       for cmd_byte, data_bytes in commands]
+            self._insert(entries)
+            depth = len(self.queue)
+
+        if self.tracer is not None:
+            for entry in entries:
+                self.tracer.span(entry, 'queued', depth=depth, group=len(entries))
+        if self.on_done is not None:
+            for entry in entries:
+                entry['future'].add_done_callback(lambda _, entry=entry: self.on_done(entry))
+        return entries
+
+    def _insert(self, entries):
+        """Lock held. After everything of the same or a more urgent class, before the rest."""
+        queue = self.queue
+        priority = entries[0]['priority']
+        if not queue or queue[-1]['priority'] <= priority:
+            queue.extend(entries) # Common case: nothing less urgent is waiting
+            return
+        index = next(i for i, queued in enumerate(queue) if queued['priority'] > priority)
+        for offset, entry in enumerate(entries):
+            queue.insert(index + offset, entry)
+
+    def depth(self, priority=None):
+        """Commands that go out before a new one of this priority would (all by default)"""
+        with self.lock:
+            if priority is None:
+                return len(self.queue)
+            return sum(1 for entry in self.queue if entry['priority'] <= priority)
+
+    def _new_entry(self, cmd_byte, data, now, deadline, priority, stream=None):
+        return {
+            'cmd': cmd_byte,
+            'data': data,
+            'retries': 0,
+            'sent_status': 'WAITING_FOR_POLL',
+            'expect_code': EXPECTED_RESPONSES.get(cmd_byte, None),
+            'future': Future(),
+            'deadline': deadline,
+            'waiters': 1,
+            'submitted_at': now,
+            'span': next(self.span_ids),
+            'priority': priority,
+            'stream': stream,
+            'frames': 0, # Reply frames so far (multi-frame commands)
+        }
+
+    def cancel(self, entry):
+        """
+        A caller gave up on entry. If nobody else is waiting on it and it has
+        not been sent yet, remove it so it never reaches the VMC.
+        Returns True if the command was removed.
+        """
+        with self.lock:
+            entry['waiters'] -= 1
+            if entry['waiters'] > 0 or entry['sent_status'] != 'WAITING_FOR_POLL':
+                return False
+            try:
+                self.queue.remove(entry)
+            except ValueError:
+                return False
+
+        if not entry['future'].done():
+            entry['future'].set_result({"error": "TIMEOUT"})
+        return True
+
+    def pop_next(self):
+        """Serial thread: take the next command that is still worth sending"""
+        expired = []
+        entry = None
+        now = time.monotonic()
+
+        with self.lock:
+            while self.queue:
+                candidate = self.queue.popleft()
+                if candidate['deadline'] is not None and now >= candidate['deadline']:
+                    expired.append(candidate)
+                    continue
+                entry = candidate
+                break
+
+        for stale in expired:
+            if not stale['future'].done():
+                stale['future'].set_result({"error": "TIMEOUT"})
+        return entry
@@ -0,0 +1,268 @@
+# vmc_schema.py
+# Declarative payload layouts for every command, response and 0x70 menu
+# sub-command, built on the tables in vmc_codes.py.
+#
+# Each layout is a list of (field, struct code), big-endian, optionally
+# followed by one variable-length byte field ('rest'). From that we
+# precompile:
+#   - an encoder: one struct.Struct.pack() after range validation
+#   - a record class with __slots__ whose fields are properties that
+#     unpack_from() the raw payload only when read
+# so the serial thread never decodes anything a consumer does not look at.
+
+import struct
+from vmc_codes import *
+
+# struct code -> (min, max)
+FIELD_RANGES = {
+    'B': (0, 0xFF),
+    'b': (-0x80, 0x7F),
+    'H': (0, 0xFFFF),
+    'I': (0, 0xFFFFFFFF),
+}
+
+
+class SchemaError(ValueError):
+    """Payload values do not fit the declared layout"""
+
+
+class LazyRecord:
+    """Base for generated records: holds the payload, decodes per field on access"""
+    __slots__ = ('payload',)
+    FIELDS = ()
+    SIZE = 0 # Bytes of the fixed part
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    @property
+    def complete(self):
+        """False for a short frame (its missing fields read as None)"""
+        return len(self.payload) >= self.SIZE
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+
+class PayloadSchema:
+    def __init__(self, name, fields=(), rest=None, extras=None):
+        """
+        fields: [(name, struct code), ...] fixed part, in wire order
+        rest:   name of a trailing variable-length byte field, if any
+        extras: {name: function(record)} derived, read-only fields
+        """
+        self.name = name
+        self.fields = tuple(fields)
+        self.rest = rest
+        self.struct = struct.Struct('>' + ''.join(code for _, code in self.fields))
+        self.size = self.struct.size
+        self.record_class = self._build_record_class(extras or {})
+
+    def _build_record_class(self, extras):
+        namespace = {'__slots__': ()}
+        names = []
+        offset = 0
+
+        for field, code in self.fields:
+            unpack_from = struct.Struct('>' + code).unpack_from
+            end = offset + struct.calcsize(code)
+
+            def getter(record, _unpack_from=unpack_from, _offset=offset, _end=end):
+                if len(record.payload) < _end:
+                    return None # Short frame
+                return _unpack_from(record.payload, _offset)[0]
+
+            namespace[field] = property(getter)
+            names.append(field)
+            offset = end
+
+        if self.rest:
+            size = self.size
+            namespace[self.rest] = property(lambda record: bytes(record.payload[size:]))
+            names.append(self.rest)
+
+        for field, func in extras.items():
+            namespace[field] = property(func)
+            names.append(field)
+
+        namespace['FIELDS'] = tuple(names)
+        namespace['SIZE'] = self.size
+        return type(self.name, (LazyRecord,), namespace)
+
+    def encode(self, values=None, **kwargs):
+        """Validated payload bytes. values/kwargs map field name -> int (rest: bytes or list)."""
+        values = dict(values or {}, **kwargs)
+        ordered = []
+        for field, code in self.fields:
+            value = values.get(field)
+            low, high = FIELD_RANGES[code]
+            if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+                raise SchemaError(f"{self.name}.{field} must be an integer in {low}..{high}, got {value!r}")
+            ordered.append(value)
+
+        packed = self.struct.pack(*ordered)
+        if self.rest:
+            extra = values.get(self.rest) or b''
+            try:
+                packed += bytes(extra)
+            except (TypeError, ValueError):
+                raise SchemaError(f"{self.name}.{self.rest} must be a list of bytes (0..255)")
+        return packed
+
+    def decode(self, payload):
+        """Lazy record over payload (nothing is unpacked yet)"""
+        return self.record_class(payload)
+
+
+# --- 1. COMMANDS WE SEND (payload after PackNO) ---
+COMMAND_SCHEMAS = {
+    # Payment
+    CMD_SEND["REQUEST_GIVE_CHANGE"]: PayloadSchema('GiveChange'),
+    CMD_SEND["NOTIFY_CASHLESS_PAYMENT"]: PayloadSchema('CashlessPayment', [('amount', 'I')]),
+    CMD_SEND["SET_PAYMENT_ACCEPTANCE"]: PayloadSchema('PaymentAcceptance', [('coins', 'B'), ('bills', 'B')]),
+
+    # Selection & Config
+    CMD_SEND["SET_PRICE"]: PayloadSchema('SetPrice', [('selection', 'H'), ('price', 'I')]),
+    CMD_SEND["SET_INVENTORY"]: PayloadSchema('SetInventory', [('selection', 'H'), ('inventory', 'B')]),
+    CMD_SEND["SET_CAPACITY"]: PayloadSchema('SetCapacity', [('selection', 'H'), ('capacity', 'B')]),
+    CMD_SEND["SET_PRODUCT_ID"]: PayloadSchema('SetProductId', [('selection', 'H'), ('product_id', 'H')]),
+
+    # Dispensing
+    CMD_SEND["CHECK_SELECTION_STATUS"]: PayloadSchema('CheckSelection', [('selection', 'H')]),
+    CMD_SEND["DISPENSE_ITEM"]: PayloadSchema('Dispense', [('selection', 'H')]),
+    CMD_SEND["CANCEL_SELECTION"]: PayloadSchema('CancelSelection'),
+    CMD_SEND["DIRECT_DRIVE_MOTOR"]: PayloadSchema('DriveMotor', [('selection', 'H')]),
+
+    # System
+    CMD_SEND["SET_POLL_INTERVAL"]: PayloadSchema('SetPollInterval', [('interval', 'B')]), # 10 ms units
+    CMD_SEND["REQUEST_INFO_SYNC"]: PayloadSchema('InfoSync'),
+    CMD_SEND["REQUEST_STATUS_SIMPLE"]: PayloadSchema('StatusSimpleRequest'),
+    CMD_SEND["REQUEST_STATUS_FULL"]: PayloadSchema('StatusFullRequest'),
+    CMD_SEND["CHECK_IC_CARD_BALANCE"]: PayloadSchema('CardBalanceRequest'),
+    CMD_SEND["REQUEST_CARD_DEDUCTION"]: PayloadSchema('CardDeduction', [('amount', 'I')]),
+
+    # Menu Wrapper: sub-command byte, then that sub-command's own layout (MENU_SCHEMAS)
+    CMD_SEND["MENU_COMMAND_WRAPPER"]: PayloadSchema('MenuCommand', [('sub_cmd', 'B')], rest='params'),
+}
+
+# --- 2. 0x70 / 0x71 MENU SUB-COMMAND PARAMETERS ---
+# Sub-commands not listed here carry raw parameter bytes.
+MENU_SCHEMAS = {
+    MENU_SUB_COMMANDS["SYSTEM_TIME"]: PayloadSchema('SystemTime', [
+        ('year', 'H'), ('month', 'B'), ('day', 'B'), ('hour', 'B'), ('minute', 'B'), ('second', 'B')]),
+    MENU_SUB_COMMANDS["DECIMAL_POINT"]: PayloadSchema('DecimalPoint', [('digits', 'B')]),
+    MENU_SUB_COMMANDS["LIGHT_CONTROL"]: PayloadSchema('LightControl', [('mode', 'B')]),
+    MENU_SUB_COMMANDS["BILL_ACCEPTING_MODE"]: PayloadSchema('BillAcceptingMode', [('mode', 'B')]),
+    MENU_SUB_COMMANDS["DROP_SENSOR_SETTING"]: PayloadSchema('DropSensorSetting', [('enabled', 'B')]),
+    MENU_SUB_COMMANDS["JAMMED_SELECTION_ACTION"]: PayloadSchema('JammedSelectionAction', [('action', 'B')]),
+    MENU_SUB_COMMANDS["TEMP_CONTROLLER_SETTING"]: PayloadSchema('TempControllerSetting', [
+        ('mode', 'B'), ('target', 'b')]),
+    MENU_SUB_COMMANDS["SELECTION_TEST"]: PayloadSchema('SelectionTest', [('selection', 'H')]),
+    MENU_SUB_COMMANDS["CLEAR_JAMMED_SELECTION"]: PayloadSchema('ClearJammedSelection', [('selection', 'H')]),
+
+    # Sales queries: the period / slot asked about
+    MENU_SUB_COMMANDS["DAILY_SALES"]: PayloadSchema('DailySalesQuery', [('year', 'H'), ('month', 'B'), ('day', 'B')]),
+    MENU_SUB_COMMANDS["MONTHLY_SALES"]: PayloadSchema('MonthlySalesQuery', [('year', 'H'), ('month', 'B')]),
+    MENU_SUB_COMMANDS["YEARLY_SALES"]: PayloadSchema('YearlySalesQuery', [('year', 'H')]),
+    MENU_SUB_COMMANDS["SELECTION_SALES_MSG"]: PayloadSchema('SelectionSalesQuery', [('selection', 'H')]),
+}
+
+
+def _coin_tubes(record):
+    """tube_data: (coin value H, coins I) per tube"""
+    data = record.tube_data
+    return [{"value": value, "count": count} for value, count in struct.iter_unpack('>HI', data[:len(data) // 6 * 6])]
+
+
+# 0x71 replies whose params differ from the query's (query layout above, if any)
+MENU_REPLY_SCHEMAS = {
+    MENU_SUB_COMMANDS["DAILY_SALES"]: PayloadSchema('DailySales', [
+        ('year', 'H'), ('month', 'B'), ('day', 'B'), ('count', 'I'), ('amount', 'I')]),
+    MENU_SUB_COMMANDS["MONTHLY_SALES"]: PayloadSchema('MonthlySales', [
+        ('year', 'H'), ('month', 'B'), ('count', 'I'), ('amount', 'I')]),
+    MENU_SUB_COMMANDS["YEARLY_SALES"]: PayloadSchema('YearlySales', [('year', 'H'), ('count', 'I'), ('amount', 'I')]),
+    MENU_SUB_COMMANDS["ENTIRE_MACHINE_SALES"]: PayloadSchema('EntireMachineSales', [('count', 'I'), ('amount', 'I')]),
+    MENU_SUB_COMMANDS["SELECTION_SALES_MSG"]: PayloadSchema('SelectionSales', [
+        ('selection', 'H'), ('count', 'I'), ('amount', 'I')]),
+    MENU_SUB_COMMANDS["QUERY_COIN_NUMBER"]: PayloadSchema('CoinNumber', rest='tube_data', extras={'tubes': _coin_tubes}),
+}
+
+
+def _menu_setting(record):
+    return MENU_COMMAND_TYPES.get(record.sub_type)
+
+
+def _menu_values(record):
+    schema = MENU_REPLY_SCHEMAS.get(record.sub_type) or MENU_SCHEMAS.get(record.sub_type)
+    return schema.decode(record.params).to_dict() if schema else None
+
+
+# --- 3. RESPONSES / EVENTS FROM THE VMC (payload after PackNO) ---
+RESPONSE_SCHEMAS = {
+    0x02: PayloadSchema('SelectionCheckResult', [('status', 'B'), ('selection', 'H')]),
+    0x04: PayloadSchema('DispensingStatus', [('status', 'B'), ('selection', 'H')], extras={
+        'status_text': lambda record: DISPENSE_STATUS_CODES.get(record.status, "Unknown"),
+        'terminal': lambda record: record.status != 0x01, # Anything but "Dispensing..."
+    }),
+    0x05: PayloadSchema('SelectionMadeCancel', [('selection', 'H')]),
+    0x11: PayloadSchema('SelectionInfoReport', [
+        ('selection', 'H'), ('price', 'I'), ('inventory', 'B'), ('capacity', 'B'), ('product_id', 'H')]),
+    0x17: PayloadSchema('OneKeyFullLoading'),
+    0x21: PayloadSchema('MoneyReceived', [('mode', 'B'), ('amount', 'I')]),
+    0x23: PayloadSchema('CurrentAmount', [('amount', 'I')]),
+    0x26: PayloadSchema('ChangeGiven', [('amount', 'I')]),
+    0x52: PayloadSchema('MachineStatusFull', [
+        ('temperature', 'b'), ('humidity', 'B'), ('bill_acceptor', 'B'),
+        ('coin_acceptor', 'B'), ('cashless', 'B'), ('door', 'B')]),
+    0x54: PayloadSchema('MachineStatusSimple', [
+        ('door', 'B'), ('lift', 'B'), ('drop_sensor', 'B'), ('payment', 'B')]),
+    0x62: PayloadSchema('CardBalance', [('balance', 'I')]),
+    0x71: PayloadSchema('MenuSettingResponse', [('sub_type', 'B')], rest='params', extras={
+        'setting': _menu_setting,
+        'values': _menu_values,
+    }),
+}
+
+
+# --- HELPERS ---
+
+def encode_command(cmd_byte, values=None, **kwargs):
+    """Payload bytes for an outgoing command (raises SchemaError)"""
+    return COMMAND_SCHEMAS[cmd_byte].encode(values, **kwargs)
+
+
+def encode_menu(sub_cmd_name, params=None):
+    """
+    0x70 payload for a MENU_SUB_COMMANDS name.
+    params: dict of named fields (declared sub-commands) or a raw list of bytes.
+    """
+    if sub_cmd_name not in MENU_SUB_COMMANDS:
+        raise SchemaError(f"Unknown menu sub-command {sub_cmd_name!r}")
+    sub_cmd = MENU_SUB_COMMANDS[sub_cmd_name]
+
+    if isinstance(params, dict):
+        schema = MENU_SCHEMAS.get(sub_cmd)
+        if schema is None:
+            raise SchemaError(f"{sub_cmd_name} has no declared fields; pass params as a list of bytes")
+        raw = schema.encode(params)
+    else:
+        raw = params or []
+    return COMMAND_SCHEMAS[CMD_SEND["MENU_COMMAND_WRAPPER"]].encode(sub_cmd=sub_cmd, params=raw)
+
+
+def decode_response(cmd_id, payload):
+    """Lazy record for a VMC frame payload, or None if the code has no declared layout"""
+    schema = RESPONSE_SCHEMAS.get(cmd_id)
+    return schema.decode(payload) if schema else None
+
+
+def to_jsonable(value):
+    """JSON fallback for driver results: records -> dicts, bytes -> int lists"""
+    if isinstance(value, LazyRecord):
+        return value.to_dict()
+    if isinstance(value, (bytes, bytearray)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
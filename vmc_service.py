@@ -0,0 +1,350 @@
+# vmc_service.py
+# Everything the HTTP layer asks of a machine, answered with plain values
+# (views, dicts, lists) instead of live driver objects.
+#
+# MachineService wraps an in-process VMCDriver. vmc_client.MachineClient has
+# the same methods but forwards them to vmc_daemon.py over a Unix socket,
+# so app.py runs unchanged whether it owns the serial ports itself or
+# shares one daemon with other worker processes.
+#
+# AsyncMachineService is the same service over a vmc_async.AsyncVMCDriver,
+# for asgi_app.py: the methods that wait on the link or the database are
+# coroutines there, everything else is inherited as is.
+
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeout
+from vmc_driver import DEFAULT_TIMEOUT
+from vmc_jobs import JOB_TIMEOUT
+from vmc_planogram import apply_planogram
+from vmc_profile import apply_profile
+from vmc_pool import UnknownMachine
+from vmc_scheduler import PRIORITY_VEND, PRIORITY_CONTROL
+from vmc_sales import SalesNotConfigured
+from vmc_stream import STREAM_QUIET
+
+
+class MachineService:
+    def __init__(self, machine_id, driver):
+        self.machine_id = machine_id
+        self.driver = driver
+
+    def info(self):
+        driver = self.driver
+        return {
+            "id": self.machine_id,
+            "port": driver.port,
+            "running": driver.running,
+            "queued": len(driver.scheduler),
+            "selections": len(driver.catalog),
+            "admission": driver.admission.state(),
+            "telemetry": driver.telemetry_sampler.state(),
+        }
+
+    # Everything that queues serial commands is admitted first (vmc_admission.py):
+    # Overloaded when the backlog ahead of its priority class is too long
+
+    def command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, priority=PRIORITY_CONTROL):
+        """Blocks until the VMC replies (or {"error": ...})"""
+        self.driver.admission.check(priority)
+        return self.driver.send_command_blocking(cmd_byte, data_bytes, timeout, priority)
+
+    def stream_command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, quiet=STREAM_QUIET,
+                       priority=PRIORITY_CONTROL):
+        """
+        Queues now (admission errors are raised here); returns an iterator of
+        {"frame": reply frame} as each arrives, then one {"end": final result}.
+        """
+        self.driver.admission.check(priority)
+        return stream_lines(self.driver.stream_command(cmd_byte, data_bytes, timeout, quiet, priority))
+
+    def status(self, cmd_byte, max_age=None, stale_window=None):
+        """(result, age_seconds) through the status cache (admitted only when it has to ask the VMC)"""
+        return self.driver.status_cache.get(cmd_byte, max_age=max_age, stale_window=stale_window)
+
+    # --- JOBS / VENDS ---
+
+    def submit_job(self, cmd_byte, data_bytes=b'', timeout=JOB_TIMEOUT, priority=PRIORITY_CONTROL):
+        self.driver.admission.check(priority)
+        jobs = self.driver.jobs
+        return jobs.view(jobs.submit(self.driver.scheduler, cmd_byte, data_bytes, timeout, priority))
+
+    def get_job(self, job_id, wait=0):
+        """Job view (None if unknown); wait > 0 blocks until it is final"""
+        jobs = self.driver.jobs
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        wait_final(job, wait)
+        return jobs.view(job)
+
+    def start_vend(self, selection, amount=None, check=False, timeout=DEFAULT_TIMEOUT, wait=None):
+        """
+        Vend view. wait=None returns as soon as it is queued; otherwise blocks
+        up to wait seconds for the final 0x04 and gives up on the vend after that.
+        """
+        self.driver.admission.check(PRIORITY_VEND)
+        vends = self.driver.vends
+        vend = vends.start(selection, amount=amount, check=check, timeout=timeout)
+        if wait is not None:
+            vend = vends.wait(vend, wait)
+        return vends.view(vend)
+
+    def get_vend(self, vend_id, wait=0):
+        """Vend view (None if unknown); wait > 0 blocks until it is final"""
+        vends = self.driver.vends
+        vend = vends.get(vend_id)
+        if vend is None:
+            return None
+        wait_final(vend, wait)
+        return vends.view(vend)
+
+    # --- EVENTS / CATALOG ---
+
+    def events(self, since=0, codes=None, limit=None, wait=0):
+        """(events, missed, next cursor); wait > 0 long-polls"""
+        return self.driver.events.wait(since, set(codes) if codes else None, timeout=wait, limit=limit)
+
+    def credit(self, since=0, wait=0):
+        """Credit ledger (see vmc_credit.CreditLedger.snapshot); wait > 0 long-polls for a version after `since`"""
+        return self.driver.credit.wait(since, timeout=wait)
+
+    def selections(self):
+        return self.driver.catalog.snapshot()
+
+    def selection(self, slot):
+        return self.driver.catalog.get(slot)
+
+    def apply_planogram(self, planogram, timeout=None):
+        self.driver.admission.check(PRIORITY_CONTROL)
+        return apply_planogram(self.driver, planogram, timeout=timeout)
+
+    def apply_profile(self, profile, refresh=False, timeout=None):
+        """Configuration profile {setting name: params}: only changed settings are written"""
+        self.driver.admission.check(PRIORITY_CONTROL)
+        return apply_profile(self.driver, profile, refresh=refresh, timeout=timeout)
+
+    def settings(self):
+        """Last reported value of each menu setting, from memory"""
+        return self.driver.settings.snapshot()
+
+    def metrics(self):
+        """Prometheus text"""
+        return self.driver.metrics.render(self.driver)
+
+    # --- TELEMETRY ---
+
+    def telemetry(self, resolution='raw', since=None, until=None, fields=None, limit=None):
+        """Sampled 0x52 readings from memory (see vmc_telemetry.TelemetryStore.query); never touches the link"""
+        series = self.driver.telemetry.query(resolution, since, until, fields, limit)
+        series["sampler"] = self.driver.telemetry_sampler.state()
+        return series
+
+    # --- SALES ---
+    # Read from the SQLite store (vmc_sales.py), never from the link
+
+    def sales_report(self, kind, since=None, until=None):
+        """Stored rows of one report (daily, monthly, yearly, total, selection, coins)"""
+        ingestor = self._sales()
+        return {"kind": kind, "rows": ingestor.store.report(self.machine_id, kind, since, until),
+                "ingest": ingestor.state()}
+
+    def vend_log(self, since=None, until=None, selection=None, limit=None):
+        """Logged 0x04 results, oldest first"""
+        return self._sales().store.vends(self.machine_id, since, until, selection, limit)
+
+    def refresh_sales(self):
+        """Start an ingestion pass now"""
+        ingestor = self._sales()
+        ingestor.refresh()
+        return ingestor.state()
+
+    def _sales(self):
+        if self.driver.sales is None:
+            raise SalesNotConfigured(self.machine_id)
+        return self.driver.sales
+
+    # --- TRACE ---
+
+    def trace(self, since=0, level=None, span=None, limit=None):
+        """Trace records after cursor `since` (see vmc_trace.Tracer.read) and the tracer's settings"""
+        tracer = self.driver.tracer
+        records, missed, cursor = tracer.read(since, level, span, limit)
+        return {"records": records, "missed": missed, "next": cursor, "tracer": tracer.state()}
+
+    def configure_trace(self, level=None, sample=None):
+        """Change what is recorded at runtime (raises ValueError for unknown levels)"""
+        self.driver.tracer.configure(level, sample)
+        return self.driver.tracer.state()
+
+
+class AsyncMachineService(MachineService):
+    """
+    MachineService for an AsyncVMCDriver (on the event loop). Waiting on
+    the link is awaited instead of blocking a thread; work that blocks
+    anyway (planograms, profiles, SQLite) runs in a worker thread.
+    """
+
+    def __init__(self, machine_id, driver):
+        super().__init__(machine_id, driver)
+        # Replaced (and set) whenever the driver publishes an event or its credit changes
+        self.signal = asyncio.Event()
+        driver.events.add_listener(self._on_change)
+        driver.credit.add_listener(self._on_change)
+
+    async def command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, priority=PRIORITY_CONTROL):
+        self.driver.admission.check(priority)
+        return await self.driver.send_command(cmd_byte, data_bytes, timeout, priority)
+
+    def stream_command(self, cmd_byte, data_bytes=b'', timeout=DEFAULT_TIMEOUT, quiet=STREAM_QUIET,
+                       priority=PRIORITY_CONTROL):
+        """Queues now (admission errors are raised here); returns an async iterator of lines"""
+        self.driver.admission.check(priority)
+        return async_stream_lines(self.driver.stream_command(cmd_byte, data_bytes, timeout, quiet, priority))
+
+    async def status(self, cmd_byte, max_age=None, stale_window=None):
+        value, age, future = self.driver.status_cache.fetch(cmd_byte, max_age=max_age, stale_window=stale_window)
+        if future is None:
+            return value, age
+        try:
+            # shield(): other readers may share the same query
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), DEFAULT_TIMEOUT), 0.0
+        except asyncio.TimeoutError:
+            return {"error": "TIMEOUT"}, None
+
+    async def get_job(self, job_id, wait=0):
+        jobs = self.driver.jobs
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        await async_wait_final(job, wait)
+        return jobs.view(job)
+
+    async def start_vend(self, selection, amount=None, check=False, timeout=DEFAULT_TIMEOUT, wait=None):
+        self.driver.admission.check(PRIORITY_VEND)
+        vends = self.driver.vends
+        vend = vends.start(selection, amount=amount, check=check, timeout=timeout)
+        if wait is not None and not await async_wait_final(vend, wait):
+            vends.abandon(vend)
+        return vends.view(vend)
+
+    async def get_vend(self, vend_id, wait=0):
+        vends = self.driver.vends
+        vend = vends.get(vend_id)
+        if vend is None:
+            return None
+        await async_wait_final(vend, wait)
+        return vends.view(vend)
+
+    async def events(self, since=0, codes=None, limit=None, wait=0):
+        """Parks on the loop, not a thread"""
+        bus = self.driver.events
+        codes = set(codes) if codes else None
+        signal = self.signal # Taken before reading so a publish in between is not lost
+        events, missed, cursor = bus.read(since, codes, limit)
+        if events or missed or not wait or wait <= 0:
+            return events, missed, cursor
+        try:
+            await asyncio.wait_for(signal.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+        return bus.read(cursor, codes, limit)
+
+    async def credit(self, since=0, wait=0):
+        ledger = self.driver.credit
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (wait or 0)
+        while ledger.version <= since and loop.time() < deadline:
+            try:
+                await asyncio.wait_for(self.signal.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+        return ledger.snapshot(since)
+
+    async def apply_planogram(self, planogram, timeout=None):
+        # Waits on the link's futures: off the event loop
+        return await asyncio.to_thread(super().apply_planogram, planogram, timeout)
+
+    async def apply_profile(self, profile, refresh=False, timeout=None):
+        return await asyncio.to_thread(super().apply_profile, profile, refresh, timeout)
+
+    async def sales_report(self, kind, since=None, until=None):
+        # SQLite reads block: off the event loop
+        return await asyncio.to_thread(super().sales_report, kind, since, until)
+
+    async def vend_log(self, since=None, until=None, selection=None, limit=None):
+        return await asyncio.to_thread(super().vend_log, since, until, selection, limit)
+
+    def _on_change(self, item):
+        # May run on an executor reader thread: hop onto the loop
+        self.driver.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        signal, self.signal = self.signal, asyncio.Event()
+        signal.set()
+
+
+def stream_lines(stream):
+    """ResponseStream -> {"frame": ...}... {"end": ...}; closing early abandons the stream"""
+    try:
+        for frame in stream:
+            yield {"frame": frame}
+        yield {"end": stream.result}
+    finally:
+        stream.close()
+
+
+def wait_final(item, wait):
+    """Block up to wait seconds on a job's / vend's 'final' future"""
+    if wait and wait > 0:
+        try:
+            item['final'].result(timeout=wait)
+        except FutureTimeout:
+            pass
+
+
+async def async_stream_lines(stream):
+    """stream_lines() for an async consumer"""
+    try:
+        async for frame in stream:
+            yield {"frame": frame}
+        yield {"end": stream.result}
+    finally:
+        stream.close()
+
+
+async def async_wait_final(item, wait):
+    """wait_final() on the loop; True once the item is final"""
+    if wait and wait > 0:
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(item['final'])), wait)
+        except asyncio.TimeoutError:
+            pass
+    return item['final'].done()
+
+
+class LocalMachines:
+    """A MachineService for every machine of an in-process DriverPool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.services = {}
+
+    @property
+    def default(self):
+        """Routes without a /machines/<machine_id> prefix address the first machine"""
+        return next(iter(self.pool.machines))
+
+    def machine(self, machine_id):
+        service = self.services.get(machine_id)
+        if service is None:
+            driver = self.pool.get(machine_id)
+            if driver is None:
+                raise UnknownMachine(machine_id)
+            service = self.services[machine_id] = MachineService(machine_id, driver)
+        return service
+
+    def describe(self):
+        return {
+            "machines": [self.machine(machine_id).info() for machine_id in self.pool.machines],
+            "default": self.default,
+        }
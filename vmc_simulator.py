@@ -0,0 +1,318 @@
+# vmc_simulator.py
+# A fake VMC on a Linux pseudo-terminal, for load testing the driver without
+# a physical machine. Point VMCDriver (or app.py via VMC_SERIAL_PORT) at the
+# path printed on startup.
+#
+#   python vmc_simulator.py --poll-interval 0.05 --event-interval 2 --drop-ack 0.05
+
+import os
+import pty
+import tty
+import time
+import random
+import select
+import argparse
+import datetime
+import threading
+from vmc_codes import *
+from vmc_framing import FrameDecoder, xor_checksum
+from vmc_schema import COMMAND_SCHEMAS, RESPONSE_SCHEMAS, MENU_SCHEMAS, MENU_REPLY_SCHEMAS
+
+
+def build_frame(cmd_byte, payload, pack_no):
+    """VMC -> upper computer frame. POLL/ACK carry no PackNO."""
+    if cmd_byte in (CMD_POLL, CMD_ACK):
+        packet = STX + [cmd_byte, 0x00]
+    else:
+        packet = STX + [cmd_byte, 1 + len(payload), pack_no] + list(payload)
+    packet.append(xor_checksum(packet))
+    return bytes(packet)
+
+
+class VMCSimulator:
+    """
+    Emulates the VMC side of the protocol:
+    - sends POLL every poll_interval seconds
+    - ACKs our commands and answers with the EXPECTED_RESPONSES codes
+    - re-sends its own data frames until we ACK them
+    - optionally pushes unsolicited 0x21 / 0x23 money events
+    Fault injection rates are probabilities in [0, 1] per frame.
+    """
+
+    def __init__(self, poll_interval=0.2, slots=60, event_interval=None,
+                 drop_ack=0.0, corrupt_xor=0.0, split_frames=0.0,
+                 dispense_time=0.0, seed=None):
+        self.poll_interval = poll_interval
+        self.event_interval = event_interval
+        self.drop_ack = drop_ack
+        self.corrupt_xor = corrupt_xor
+        self.split_frames = split_frames
+        self.dispense_time = dispense_time
+        self.rng = random.Random(seed)
+
+        # --- MACHINE STATE ---
+        # slot -> {'price': cents, 'inventory': n, 'capacity': n, 'product_id': n}
+        self.selections = {
+            slot: {'price': 100 + slot, 'inventory': 5, 'capacity': 10, 'product_id': slot}
+            for slot in range(1, slots + 1)
+        }
+        self.menu_settings = {} # sub-command byte -> param bytes
+        self.sales = []         # (date, slot, price) per successful vend
+        self.coin_tubes = {10: 40, 50: 25, 100: 12} # coin value -> coins
+        self.credit = 0
+        self.door_open = 0
+        self.temperature = 4
+        self.humidity = 40
+
+        # --- PROTOCOL STATE ---
+        self.pack_no = 1
+        self.last_rx_pack_no = None # Duplicate detection for resent commands
+        self.outbox = []            # Our data frames waiting for the host's ACK
+        self.outbox_sent = False    # outbox[0] is on the wire
+        self.delayed = []           # (due, cmd, payload) frames not ready yet (e.g. vend in progress)
+        self.decoder = FrameDecoder()
+
+        self.stats = {
+            'polls': 0, 'commands': 0, 'duplicates': 0, 'acks_dropped': 0,
+            'xor_corrupted': 0, 'frames_split': 0, 'events': 0,
+        }
+
+        self.master_fd = None
+        self.slave_fd = None
+        self.port = None
+        self.running = False
+        self.thread = None
+
+    # --- LIFECYCLE ---
+
+    def start(self):
+        """Opens the pty and starts the VMC thread. Returns the port path."""
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    # --- I/O ---
+
+    def _write(self, frame):
+        if self.corrupt_xor and self.rng.random() < self.corrupt_xor:
+            frame = frame[:-1] + bytes([frame[-1] ^ 0xFF])
+            self.stats['xor_corrupted'] += 1
+
+        if self.split_frames and len(frame) > 2 and self.rng.random() < self.split_frames:
+            cut = self.rng.randrange(1, len(frame))
+            os.write(self.master_fd, frame[:cut])
+            time.sleep(0.002)
+            os.write(self.master_fd, frame[cut:])
+            self.stats['frames_split'] += 1
+        else:
+            os.write(self.master_fd, frame)
+
+    def _queue_data(self, cmd_byte, payload, delay=0.0):
+        if delay:
+            self.delayed.append((time.monotonic() + delay, cmd_byte, bytes(payload)))
+        else:
+            self.outbox.append((cmd_byte, bytes(payload)))
+
+    def _run(self):
+        next_poll = time.monotonic()
+        next_event = next_poll + self.event_interval if self.event_interval else None
+
+        while self.running:
+            wait = max(0.0, next_poll - time.monotonic())
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], wait)
+            except (OSError, ValueError):
+                break
+            if readable:
+                try:
+                    chunk = os.read(self.master_fd, 4096)
+                except OSError:
+                    break
+                for frame in self.decoder.feed(chunk):
+                    self._on_frame(frame)
+
+            now = time.monotonic()
+            if self.delayed:
+                due = [item for item in self.delayed if item[0] <= now]
+                for item in due:
+                    self.delayed.remove(item)
+                    self.outbox.append(item[1:])
+
+            if next_event is not None and now >= next_event:
+                self._push_money_event()
+                next_event = now + self.event_interval
+
+            if now >= next_poll:
+                self._tick()
+                next_poll = now + self.poll_interval
+
+    def _tick(self):
+        """One VMC poll slot: re-send pending data, otherwise POLL"""
+        if self.outbox:
+            cmd_byte, payload = self.outbox[0]
+            self._write(build_frame(cmd_byte, payload, self.pack_no))
+            self.outbox_sent = True
+        else:
+            self.stats['polls'] += 1
+            self._write(build_frame(CMD_POLL, [], 0))
+
+    def _on_frame(self, frame):
+        cmd_id = frame[2]
+
+        if cmd_id == CMD_ACK:
+            # Host accepted our data frame (idle ACKs after a POLL are ignored)
+            if self.outbox_sent:
+                self.outbox_sent = False
+                self.outbox.pop(0)
+                self.pack_no = self.pack_no % 255 + 1
+            return
+
+        if self.drop_ack and self.rng.random() < self.drop_ack:
+            self.stats['acks_dropped'] += 1
+            return # Host will re-send on the next POLL
+
+        self._write(build_frame(CMD_ACK, [], 0))
+
+        pack_no = frame[4]
+        if pack_no == self.last_rx_pack_no:
+            self.stats['duplicates'] += 1
+            return # Already executed, our previous ACK got lost
+        self.last_rx_pack_no = pack_no
+
+        self.stats['commands'] += 1
+        self._execute(cmd_id, frame[5:-1])
+
+    # --- COMMAND HANDLING ---
+
+    def _reply(self, cmd_id, delay=0.0, **fields):
+        """Queue a VMC frame, payload packed by its vmc_schema layout"""
+        self._queue_data(cmd_id, RESPONSE_SCHEMAS[cmd_id].encode(fields), delay)
+
+    def _execute(self, cmd_byte, data):
+        schema = COMMAND_SCHEMAS.get(cmd_byte)
+        command = schema.decode(data) if schema else None
+        slot = getattr(command, 'selection', None)
+        sel = self.selections.get(slot)
+
+        if cmd_byte == CMD_SEND["CHECK_SELECTION_STATUS"]:
+            status = 0x01 if sel and sel['inventory'] > 0 else 0x02
+            self._reply(0x02, status=status, selection=slot)
+
+        elif cmd_byte == CMD_SEND["DISPENSE_ITEM"]:
+            if sel is None or sel['inventory'] == 0:
+                self._reply(0x04, status=0xFF, selection=slot or 0)
+            else:
+                self._reply(0x04, status=0x01, selection=slot)
+                sel['inventory'] -= 1
+                self.sales.append((datetime.date.today(), slot, sel['price']))
+                self._reply(0x04, delay=self.dispense_time, status=0x02, selection=slot)
+                if self.credit:
+                    self.credit = 0 # The vend used it up
+                    self._reply(0x23, delay=self.dispense_time, amount=0)
+
+        elif cmd_byte == CMD_SEND["SET_PRICE"] and sel:
+            sel['price'] = command.price
+        elif cmd_byte == CMD_SEND["SET_INVENTORY"] and sel:
+            sel['inventory'] = command.inventory
+        elif cmd_byte == CMD_SEND["SET_CAPACITY"] and sel:
+            sel['capacity'] = command.capacity
+        elif cmd_byte == CMD_SEND["SET_PRODUCT_ID"] and sel:
+            sel['product_id'] = command.product_id
+
+        elif cmd_byte == CMD_SEND["SET_POLL_INTERVAL"] and command.interval is not None:
+            # Units of 10 ms
+            self.poll_interval = max(1, command.interval) / 100.0
+
+        elif cmd_byte == CMD_SEND["NOTIFY_CASHLESS_PAYMENT"]:
+            self.credit += command.amount or 0
+            self._reply(0x23, amount=self.credit)
+        elif cmd_byte == CMD_SEND["REQUEST_GIVE_CHANGE"]:
+            self._reply(0x26, amount=self.credit)
+            self.credit = 0
+
+        elif cmd_byte == CMD_SEND["REQUEST_INFO_SYNC"]:
+            for slot, sel in self.selections.items():
+                self._reply(0x11, selection=slot, **sel)
+
+        elif cmd_byte == CMD_SEND["REQUEST_STATUS_SIMPLE"]:
+            self._reply(0x54, door=self.door_open, lift=0, drop_sensor=0, payment=0)
+        elif cmd_byte == CMD_SEND["REQUEST_STATUS_FULL"]:
+            temp = self.temperature + self.rng.choice((-1, 0, 0, 1))
+            self._reply(0x52, temperature=temp, humidity=self.humidity, bill_acceptor=0,
+                        coin_acceptor=0, cashless=0, door=self.door_open)
+        elif cmd_byte == CMD_SEND["CHECK_IC_CARD_BALANCE"]:
+            self._reply(0x62, balance=5000)
+
+        elif cmd_byte == CMD_SEND["MENU_COMMAND_WRAPPER"] and command.sub_cmd in MENU_REPLY_SCHEMAS:
+            self._sales_report(command.sub_cmd, command.params)
+        elif cmd_byte == CMD_SEND["MENU_COMMAND_WRAPPER"] and command.sub_cmd is not None:
+            # Params present: store them (set). Empty: report current value (query)
+            if command.params:
+                self.menu_settings[command.sub_cmd] = command.params
+            self._reply(0x71, sub_type=command.sub_cmd, params=self.menu_settings.get(command.sub_cmd, b''))
+
+        # Everything else (cancel, motor drive, payment acceptance...) is ACK only
+
+    def _sales_report(self, sub_cmd, params):
+        """0x71 answer to a sales / coin query, computed from self.sales"""
+        query = MENU_SCHEMAS[sub_cmd].decode(params) if sub_cmd in MENU_SCHEMAS else None
+        if sub_cmd == MENU_SUB_COMMANDS["QUERY_COIN_NUMBER"]:
+            reply = {'tube_data': b''.join(value.to_bytes(2, 'big') + count.to_bytes(4, 'big')
+                                           for value, count in sorted(self.coin_tubes.items()))}
+        else:
+            match = {
+                MENU_SUB_COMMANDS["DAILY_SALES"]: lambda day, slot: (day.year, day.month, day.day) == (query.year, query.month, query.day),
+                MENU_SUB_COMMANDS["MONTHLY_SALES"]: lambda day, slot: (day.year, day.month) == (query.year, query.month),
+                MENU_SUB_COMMANDS["YEARLY_SALES"]: lambda day, slot: day.year == query.year,
+                MENU_SUB_COMMANDS["ENTIRE_MACHINE_SALES"]: lambda day, slot: True,
+                MENU_SUB_COMMANDS["SELECTION_SALES_MSG"]: lambda day, slot: slot == query.selection,
+            }[sub_cmd]
+            sold = [price for day, slot, price in self.sales if match(day, slot)]
+            reply = dict(query.to_dict() if query else {}, count=len(sold), amount=sum(sold))
+        params = MENU_REPLY_SCHEMAS[sub_cmd].encode(reply)
+        self._reply(0x71, sub_type=sub_cmd, params=params)
+
+    def _push_money_event(self):
+        amount = self.rng.choice((100, 500, 1000))
+        self.credit += amount
+        self._reply(0x21, mode=0x01, amount=amount) # Mode: bill
+        self._reply(0x23, amount=self.credit)
+        self.stats['events'] += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="VMC emulator on a pseudo-terminal")
+    parser.add_argument('--poll-interval', type=float, default=0.2, help="Seconds between POLLs")
+    parser.add_argument('--slots', type=int, default=60)
+    parser.add_argument('--event-interval', type=float, default=None, help="Push 0x21/0x23 every N seconds")
+    parser.add_argument('--drop-ack', type=float, default=0.0, help="Probability of ignoring a command")
+    parser.add_argument('--corrupt-xor', type=float, default=0.0, help="Probability of a bad XOR per frame")
+    parser.add_argument('--split-frames', type=float, default=0.0, help="Probability of writing a frame in two parts")
+    parser.add_argument('--dispense-time', type=float, default=0.0, help="Seconds from 'Dispensing...' to success")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    sim = VMCSimulator(
+        poll_interval=args.poll_interval, slots=args.slots, event_interval=args.event_interval,
+        drop_ack=args.drop_ack, corrupt_xor=args.corrupt_xor, split_frames=args.split_frames,
+        dispense_time=args.dispense_time, seed=args.seed,
+    )
+    port = sim.start()
+    print(f"[SIM] VMC simulator listening on {port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"[SIM] {sim.stats}")
+    except KeyboardInterrupt:
+        sim.stop()
@@ -0,0 +1,112 @@
+# vmc_snapshot.py
+# Warm start: the selection catalog saved to disk, so a restarted driver
+# can serve /selections straight away while the VMC's full sync (0x31)
+# reconciles it in the background.
+#
+# File layout:
+#   MAGIC(8) + saved_at(8, double) + count(4)
+#   then count records, each one a 0x11 SELECTION_INFO_REPORT payload
+#   (vmc_schema layout: selection, price, inventory, capacity, product_id)
+# Written to a temp file and renamed over the old one, so a crash mid-write
+# never leaves a torn snapshot.
+
+import os
+import time
+import struct
+import threading
+from vmc_schema import RESPONSE_SCHEMAS, SchemaError
+
+MAGIC = b'VMCSNAP1'
+HEADER = struct.Struct('<8sdI')
+REPORT = RESPONSE_SCHEMAS[0x11]
+
+SAVE_INTERVAL = 30.0 # Seconds between checks for catalog changes worth saving
+
+
+def save_snapshot(path, slots, saved_at=None):
+    """slots: {slot: [price, inventory, capacity, product_id]}. Incomplete records are skipped."""
+    records = []
+    for slot, (price, inventory, capacity, product_id) in sorted(slots.items()):
+        try:
+            records.append(REPORT.encode(selection=slot, price=price, inventory=inventory,
+                                         capacity=capacity, product_id=product_id))
+        except SchemaError:
+            continue # Only partly known (e.g. a SET_PRICE before any report)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, saved_at or time.time(), len(records)))
+        f.write(b''.join(records))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def load_snapshot(path):
+    """Returns (saved_at, {slot: [price, inventory, capacity, product_id]}), or None if unusable"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+
+    magic, saved_at, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or len(data) != HEADER.size + count * REPORT.size:
+        return None
+
+    slots = {}
+    for offset in range(HEADER.size, len(data), REPORT.size):
+        report = REPORT.decode(data[offset:offset + REPORT.size])
+        slots[report.selection] = [report.price, report.inventory, report.capacity, report.product_id]
+    return saved_at, slots
+
+
+class SnapshotKeeper:
+    """Background thread: re-saves the catalog whenever its version moved"""
+
+    def __init__(self, catalog, path, interval=SAVE_INTERVAL):
+        self.catalog = catalog
+        self.path = path
+        self.interval = interval
+        self.saved_version = catalog.version
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the thread and writes a final snapshot"""
+        self.stopped = True
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.save()
+
+    def request_save(self):
+        """Save now rather than at the next interval (any thread)"""
+        self.wake.set()
+
+    def save(self):
+        version, slots = self.catalog.export()
+        if version == self.saved_version:
+            return False
+        try:
+            save_snapshot(self.path, slots)
+        except OSError as e:
+            print(f"[Snapshot] Could not save {self.path}: {e}")
+            return False
+        self.saved_version = version
+        return True
+
+    def _run(self):
+        while not self.stopped:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self.stopped:
+                self.save()
@@ -0,0 +1,126 @@
+# vmc_status_cache.py
+# TTL cache in front of REQUEST_STATUS_SIMPLE (0x53) and REQUEST_STATUS_FULL (0x51).
+# Many dashboards asking for status at once cost at most one VMC query.
+
+import time
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from vmc_codes import CMD_SEND
+from vmc_scheduler import PRIORITY_STATUS
+from vmc_admission import Overloaded
+
+DEFAULT_MAX_AGE = 1.0       # Seconds a status reply is served without asking the VMC
+DEFAULT_STALE_WINDOW = 0.0  # Extra seconds a stale reply may be served while refreshing
+DEFAULT_TIMEOUT = 5.0
+
+CACHEABLE_COMMANDS = (
+    CMD_SEND["REQUEST_STATUS_SIMPLE"],
+    CMD_SEND["REQUEST_STATUS_FULL"],
+)
+
+# Unsolicited frames that do not change machine status (everything else invalidates)
+STATUS_NEUTRAL_EVENTS = {
+    0x11, # SELECTION_INFO_REPORT
+    0x21, # MONEY_RECEIVED_NOTICE
+    0x23, # CURRENT_AMOUNT_REPORT
+}
+
+
+class StatusCache:
+    """
+    Per-command cache: {'value': dict, 'at': monotonic, 'inflight': Future, 'generation': int}
+
+    - fresh (age <= max_age): served from memory
+    - stale but inside the stale window: served from memory, one refresh queued
+    - otherwise: callers share a single in-flight VMC query
+    Only a new VMC query is admitted (admission.check, if given): a reply
+    served from memory or shared with a query already queued costs the
+    link nothing, so it is never shed.
+    invalidate() bumps the generation so replies to queries sent before the
+    invalidating event are not cached.
+    """
+
+    def __init__(self, scheduler, max_age=DEFAULT_MAX_AGE, stale_window=DEFAULT_STALE_WINDOW, admission=None):
+        self.scheduler = scheduler
+        self.admission = admission
+        self.max_age = max_age
+        self.stale_window = stale_window
+        self.lock = threading.Lock()
+        self.entries = {
+            cmd: {'value': None, 'at': 0.0, 'inflight': None, 'generation': 0}
+            for cmd in CACHEABLE_COMMANDS
+        }
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'shared': 0, 'invalidations': 0}
+
+    def fetch(self, cmd_byte, max_age=None, stale_window=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Non-blocking core. Returns (value, age, future):
+        value/age are set when memory can answer, otherwise future resolves
+        with the VMC reply. Raises Overloaded when a new query is needed and
+        the serial backlog is too long for it.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        stale_window = self.stale_window if stale_window is None else stale_window
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries[cmd_byte]
+            if entry['value'] is not None:
+                age = now - entry['at']
+                if age <= max_age:
+                    self.stats['hits'] += 1
+                    return entry['value'], age, None
+                if age <= max_age + stale_window:
+                    self.stats['stale_hits'] += 1
+                    try:
+                        self._refresh_locked(cmd_byte, entry, timeout)
+                    except Overloaded:
+                        pass # Still served; the next reader after the backlog drains refreshes it
+                    return entry['value'], age, None
+
+            if entry['inflight'] is not None:
+                self.stats['shared'] += 1
+            else:
+                self.stats['misses'] += 1
+            return None, None, self._refresh_locked(cmd_byte, entry, timeout)
+
+    def get(self, cmd_byte, max_age=None, stale_window=None, timeout=DEFAULT_TIMEOUT):
+        """Blocking: returns (result, age_seconds). age is 0.0 for a fresh VMC reply."""
+        value, age, future = self.fetch(cmd_byte, max_age, stale_window, timeout)
+        if future is None:
+            return value, age
+        try:
+            return future.result(timeout=timeout), 0.0
+        except FutureTimeout:
+            return {"error": "TIMEOUT"}, None
+
+    def invalidate(self, cmd_byte=None):
+        """Drop cached replies (all commands by default)"""
+        with self.lock:
+            for cmd, entry in self.entries.items():
+                if cmd_byte is None or cmd == cmd_byte:
+                    entry['value'] = None
+                    entry['generation'] += 1
+            self.stats['invalidations'] += 1
+
+    def _refresh_locked(self, cmd_byte, entry, timeout):
+        """Single flight: reuse the query already on its way to the VMC"""
+        if entry['inflight'] is not None:
+            return entry['inflight']
+
+        if self.admission is not None:
+            self.admission.check(PRIORITY_STATUS)
+        future = self.scheduler.submit(cmd_byte, b'', timeout, priority=PRIORITY_STATUS)['future']
+        entry['inflight'] = future
+        generation = entry['generation']
+        future.add_done_callback(lambda f: self._on_reply(cmd_byte, generation, f))
+        return future
+
+    def _on_reply(self, cmd_byte, generation, future):
+        result = future.result()
+        with self.lock:
+            entry = self.entries[cmd_byte]
+            entry['inflight'] = None
+            if 'error' not in result and entry['generation'] == generation:
+                entry['value'] = result
+                entry['at'] = time.monotonic()
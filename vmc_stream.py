@@ -0,0 +1,146 @@
+# vmc_stream.py
+# Multi-frame replies, handed to the caller frame by frame.
+#
+# Some commands are answered by a burst of data frames: REQUEST_INFO_SYNC
+# (0x31) by one 0x11 per selection, some menu queries by several 0x71.
+# A command submitted with a ResponseStream stays on the line until the
+# burst is over, and every matching frame is pushed to the stream as it
+# arrives. The burst is over at:
+# - the VMC's next POLL after at least one frame (it only polls again once
+#   it has nothing left to send): the protocol's own terminator
+# - or a quiet period: once frames flow, the consumer waits at most
+#   stream.quiet seconds for the next one, and the command's deadline moves
+#   with every frame so a long burst is never cut off by its timeout
+#
+# The consumer iterates the stream (for, or async for) while the burst is
+# still coming in, so the first frames reach it right away and nothing
+# collects the whole reply in a list. Abandoning it (close()) drops the
+# rest of the burst.
+
+import asyncio
+import threading
+import collections
+from concurrent.futures import Future, InvalidStateError
+from vmc_codes import CMD_SEND
+
+STREAM_QUIET = 1.0 # Seconds without a frame that end a burst
+
+# Always followed to the end of their burst, streamed or not (a plain call
+# gets {"status": "STREAM_END", "frames": n}; the frames still reach the catalog)
+MULTI_FRAME_COMMANDS = {CMD_SEND["REQUEST_INFO_SYNC"]}
+
+
+class StreamTimeout(TimeoutError):
+    """The consumer waited longer than its timeout for the next frame"""
+
+
+class ResponseStream:
+    """
+    Frames of one command's reply, from the serial thread to one consumer.
+    Items are the same dicts send_command_blocking() returns for single
+    frames ({"cmd", "raw_data", "fields"}). After iteration, `result` is
+    the command's final result ({"status": "STREAM_END", "frames": n} or
+    {"error": ...}).
+    """
+
+    def __init__(self, quiet=STREAM_QUIET, timeout=None):
+        self.quiet = quiet
+        self.timeout = timeout  # Longest wait for the first frame while iterating (then: quiet)
+        self.cond = threading.Condition()
+        self.items = collections.deque()
+        self.result = None      # Set when the burst is over
+        self.abandoned = False  # Consumer gone: push() drops frames
+        self.waker = None       # Future an async consumer awaits
+        self.entry = None       # Scheduler entry, once submitted
+        self.scheduler = None
+
+    # --- SERIAL THREAD SIDE ---
+
+    def push(self, item):
+        with self.cond:
+            if self.abandoned:
+                return
+            self.items.append(item)
+            self.cond.notify()
+            waker, self.waker = self.waker, None
+        wake(waker)
+
+    def finish(self, result):
+        """The command's future resolved: no more frames"""
+        with self.cond:
+            self.result = result
+            self.cond.notify_all()
+            waker, self.waker = self.waker, None
+        wake(waker)
+
+    # --- CONSUMER SIDE ---
+
+    def attach(self, scheduler, entry):
+        self.scheduler = scheduler
+        self.entry = entry
+        entry['future'].add_done_callback(lambda future: self.finish(future.result()))
+
+    def next(self, timeout=None):
+        """Next frame; None once the burst is over. Raises StreamTimeout."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items or self.result is not None, timeout):
+                raise StreamTimeout(timeout)
+            return self.items.popleft() if self.items else None
+
+    def __iter__(self):
+        timeout = self.timeout
+        while True:
+            try:
+                item = self.next(timeout)
+            except StreamTimeout:
+                self._give_up()
+                return
+            if item is None:
+                return
+            yield item
+            timeout = self.quiet
+
+    async def __aiter__(self):
+        timeout = self.timeout
+        while True:
+            with self.cond:
+                if self.items:
+                    item = self.items.popleft()
+                elif self.result is not None:
+                    return
+                else:
+                    item = None
+                    waker = self.waker = Future()
+            if item is not None:
+                yield item
+                timeout = self.quiet
+                continue
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(waker), timeout)
+            except asyncio.TimeoutError:
+                self._give_up()
+                return
+
+    def _give_up(self):
+        """The link went silent without ending the burst (e.g. the port closed)"""
+        self.close()
+        with self.cond:
+            if self.result is None:
+                self.result = {"error": "TIMEOUT"}
+
+    def close(self):
+        """Consumer gave up: drop further frames, and the command itself if it never went out"""
+        with self.cond:
+            self.abandoned = True
+            self.items.clear()
+        if self.entry is not None and self.result is None:
+            self.scheduler.cancel(self.entry)
+
+
+def wake(waker):
+    """Resolve an async consumer's waker (it may have been cancelled by its timeout)"""
+    if waker is not None:
+        try:
+            waker.set_result(None)
+        except InvalidStateError:
+            pass
@@ -0,0 +1,217 @@
+# vmc_telemetry.py
+# Full machine status (0x52: temperature, humidity, peripherals) sampled in
+# the background and kept in memory for /telemetry.
+#
+# TelemetrySampler decides when the driver queues a REQUEST_STATUS_FULL
+# (0x51): only at a POLL where the line is free and nothing else is
+# waiting, so customer commands always come first. If the link stays busy
+# for too long, the sample is queued anyway at status priority, behind
+# vends and writes.
+#
+# Every 0x52 the driver sees (sampled or asked for by an API caller) goes
+# into TelemetryStore: fixed-size array-backed rings, one column per field,
+# plus 1 min and 1 h rollups (count, min, max, mean per field).
+
+import time
+import threading
+from array import array
+
+FIELDS = ('temperature', 'humidity', 'bill_acceptor', 'coin_acceptor', 'cashless', 'door')
+
+SAMPLE_INTERVAL = 30.0 # Seconds between samples (0 disables the sampler)
+FORCE_AFTER = 60.0     # Overdue by this much: queue it even though the link is busy
+
+RAW_CAPACITY = 2880    # 24 h at the default interval
+RESOLUTIONS = {        # name -> (bucket seconds, buckets kept)
+    '1m': (60, 1440),  # 24 h
+    '1h': (3600, 744), # 31 days
+}
+
+
+class SeriesRing:
+    """
+    Fixed-capacity time series: a 'd' array of timestamps plus one array per
+    column ({name: typecode}). The oldest point is overwritten when full.
+    """
+
+    def __init__(self, columns, capacity):
+        self.capacity = capacity
+        self.ts = array('d', bytes(8 * capacity))
+        self.columns = {name: array(code, bytes(array(code).itemsize * capacity)) for name, code in columns.items()}
+        self.head = 0  # Next slot to write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ts, values):
+        """values: {column: number}"""
+        head = self.head
+        self.ts[head] = ts
+        for name, column in self.columns.items():
+            column[head] = values[name]
+        self.head = (head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _slot(self, index):
+        """Chronological index (0 = oldest) -> array slot"""
+        return (self.head - self.count + index) % self.capacity
+
+    def _bisect(self, ts):
+        """First chronological index with a timestamp >= ts"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.ts[self._slot(mid)] < ts:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def select(self, since=None, until=None, limit=None):
+        """Array slots of the points in [since, until], oldest first (the newest `limit` of them)"""
+        start = self._bisect(since) if since is not None else 0
+        end = self._bisect(until + 1e-9) if until is not None else self.count
+        if limit is not None:
+            start = max(start, end - limit)
+        return [self._slot(index) for index in range(start, end)]
+
+
+class Rollup:
+    """Per field count / min / max / sum over fixed buckets of `width` seconds"""
+
+    def __init__(self, fields, width, capacity):
+        self.fields = fields
+        self.width = width
+        columns = {'count': 'I'}
+        for field in fields:
+            columns.update({field + '_min': 'h', field + '_max': 'h', field + '_sum': 'd'})
+        self.ring = SeriesRing(columns, capacity)
+        self.bucket = None # Start of the bucket being filled
+        self.open = None   # Its accumulators (same keys as the ring's columns)
+
+    def add(self, ts, values):
+        bucket = ts - ts % self.width
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                self.ring.append(self.bucket, self.open)
+            self.bucket = bucket
+            self.open = {'count': 0}
+            for field in self.fields:
+                value = values[field]
+                self.open.update({field + '_min': value, field + '_max': value, field + '_sum': 0.0})
+
+        acc = self.open
+        acc['count'] += 1
+        for field in self.fields:
+            value = values[field]
+            if value < acc[field + '_min']:
+                acc[field + '_min'] = value
+            if value > acc[field + '_max']:
+                acc[field + '_max'] = value
+            acc[field + '_sum'] += value
+
+    def query(self, fields, since=None, until=None, limit=None):
+        ring = self.ring
+        rows = [(ring.ts[slot], {name: column[slot] for name, column in ring.columns.items()})
+                for slot in ring.select(since, until, limit)]
+        # The bucket still filling counts too
+        if self.bucket is not None and (since is None or self.bucket >= since) and (until is None or self.bucket <= until):
+            rows.append((self.bucket, self.open))
+            if limit is not None:
+                rows = rows[-limit:]
+
+        return {
+            "ts": [ts for ts, _ in rows],
+            "count": [acc['count'] for _, acc in rows],
+            "min": {field: [acc[field + '_min'] for _, acc in rows] for field in fields},
+            "max": {field: [acc[field + '_max'] for _, acc in rows] for field in fields},
+            "mean": {field: [round(acc[field + '_sum'] / acc['count'], 3) for _, acc in rows] for field in fields},
+        }
+
+
+class TelemetryStore:
+    """Raw 0x52 readings plus rollups. add() runs on the serial thread; query() on API threads."""
+
+    def __init__(self, raw_capacity=RAW_CAPACITY, resolutions=RESOLUTIONS):
+        self.lock = threading.Lock()
+        self.raw = SeriesRing({field: 'h' for field in FIELDS}, raw_capacity)
+        self.rollups = {name: Rollup(FIELDS, width, capacity) for name, (width, capacity) in resolutions.items()}
+        self.latest = None
+
+    def add(self, record, ts=None):
+        """record: the 0x52 MachineStatusFull record"""
+        ts = time.time() if ts is None else ts
+        values = {field: getattr(record, field) for field in FIELDS}
+        with self.lock:
+            self.raw.append(ts, values)
+            for rollup in self.rollups.values():
+                rollup.add(ts, values)
+            self.latest = dict(values, ts=ts)
+
+    def query(self, resolution='raw', since=None, until=None, fields=None, limit=None):
+        """Columnar points in [since, until] (epoch seconds). Raises ValueError for unknown names."""
+        fields = list(fields or FIELDS)
+        unknown = [field for field in fields if field not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown telemetry field(s) {', '.join(unknown)} (expected {', '.join(FIELDS)})")
+        if resolution != 'raw' and resolution not in self.rollups:
+            raise ValueError(f"Unknown resolution {resolution!r} (expected raw, {', '.join(self.rollups)})")
+
+        with self.lock:
+            if resolution == 'raw':
+                slots = self.raw.select(since, until, limit)
+                series = {
+                    "ts": [self.raw.ts[slot] for slot in slots],
+                    "values": {field: [self.raw.columns[field][slot] for slot in slots] for field in fields},
+                }
+            else:
+                series = self.rollups[resolution].query(fields, since, until, limit)
+            latest = dict(self.latest) if self.latest else None
+        return dict(series, resolution=resolution, fields=fields, latest=latest)
+
+
+class TelemetrySampler:
+    """When to queue the next 0x51. Serial thread only (plus the reply callback)."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, force_after=FORCE_AFTER):
+        self.interval = interval
+        self.force_after = force_after
+        self.next_at = None    # monotonic; None: sample at the first idle POLL
+        self.inflight = False
+        self.samples = 0
+        self.forced = 0
+        self.failed = 0
+
+    def due(self, now, queued):
+        """At a POLL with a free line: queue a sample now?"""
+        if not self.interval or self.inflight:
+            return False
+        if self.next_at is None:
+            self.next_at = now
+        if now < self.next_at:
+            return False
+        if queued and now < self.next_at + self.force_after:
+            return False # Customer commands first
+        if queued:
+            self.forced += 1
+        return True
+
+    def started(self):
+        self.inflight = True
+        self.samples += 1
+
+    def note_reading(self, now):
+        """Any 0x52 counts as this interval's sample"""
+        if self.interval:
+            self.next_at = now + self.interval
+
+    def finished(self, result):
+        """Reply callback. A failed sample waits for the next interval too."""
+        self.inflight = False
+        if 'error' in result:
+            self.failed += 1
+            self.note_reading(time.monotonic())
+
+    def state(self):
+        return {"interval": self.interval, "samples": self.samples, "forced": self.forced, "failed": self.failed}
@@ -0,0 +1,188 @@
+# vmc_trace.py
+# Structured tracing that the serial thread can afford.
+#
+# Recording an event is one level check and one deque append under a lock:
+# no I/O. The lock makes seq order and ring order agree across threads (the
+# TraceWriter cursor relies on it). It is held only for the append, so the
+# serial thread can wait at most for another thread's append, never for a
+# reader or the writer. A fixed-size ring keeps the most recent records.
+# TraceWriter drains the ring from its own thread, appending JSON lines to
+# a file and echoing the important records (INFO and up by default) to
+# stdout.
+#
+# Every command is a span (the scheduler entry's 'span' ID):
+#   cmd.queued -> cmd.sent -> [cmd.retried...] -> cmd.acked -> cmd.completed
+# Sampling keeps or drops whole spans, so a kept span is always complete.
+# WARN and ERROR records are never sampled away.
+
+import json
+import time
+import itertools
+import threading
+import collections
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARN: 'WARN', ERROR: 'ERROR'}
+
+TRACE_CAPACITY = 8192  # Records kept in memory
+FLUSH_INTERVAL = 0.5   # Seconds between TraceWriter drains
+
+
+def parse_level(level):
+    """'debug' / 'INFO' / 20 -> 20"""
+    if isinstance(level, int):
+        return level
+    for value, name in LEVEL_NAMES.items():
+        if name == str(level).upper():
+            return value
+    raise ValueError(f"Unknown trace level {level!r} (expected one of {', '.join(LEVEL_NAMES.values())})")
+
+
+class Tracer:
+    """
+    Ring buffer of (seq, ts, level, name, span, fields) tuples.
+    level: records below it are not kept at all.
+    sample: keep 1 in `sample` spans / events below WARN.
+    echo: TraceWriter prints records at or above this level.
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY, level=DEBUG, sample=1, echo=INFO):
+        self.ring = collections.deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.seq = itertools.count(1)
+        self.last_seq = 0
+        self.ticks = itertools.count()
+        self.level = parse_level(level)
+        self.sample = max(1, int(sample))
+        self.echo = parse_level(echo)
+
+    def event(self, level, name, span=None, **fields):
+        """Any thread; only ever waits for another append"""
+        if level < self.level:
+            return
+        if level < WARN and self.sample > 1:
+            if (span if span is not None else next(self.ticks)) % self.sample:
+                return
+        with self.lock: # seq and ring order must agree: TraceWriter's cursor relies on it
+            seq = self.last_seq = next(self.seq)
+            self.ring.append((seq, time.time(), level, name, span, fields))
+
+    def span(self, entry, phase, level=DEBUG, **fields):
+        """One step of a command's span (entry: scheduler entry). event() inlined: hot path."""
+        if level < self.level:
+            return
+        span = entry['span']
+        if level < WARN and span % self.sample:
+            return
+        fields['cmd'] = entry['cmd']
+        with self.lock:
+            seq = self.last_seq = next(self.seq)
+            self.ring.append((seq, time.time(), level, 'cmd.' + phase, span, fields))
+
+    def configure(self, level=None, sample=None):
+        if level is not None:
+            self.level = parse_level(level)
+        if sample is not None:
+            self.sample = max(1, int(sample))
+
+    def read(self, since=0, level=None, span=None, limit=None):
+        """
+        Records after cursor `since`, oldest first, as dicts.
+        Returns (records, missed, next_cursor); missed counts records that
+        fell off the ring before they were read.
+        """
+        ring = self.ring.copy() # Atomic under the GIL
+        if not ring:
+            return [], 0, since
+        min_level = parse_level(level) if level is not None else None
+        missed = max(0, ring[0][0] - since - 1)
+
+        records = []
+        cursor = since
+        for seq, ts, record_level, name, record_span, fields in ring:
+            if seq <= since:
+                continue
+            cursor = seq
+            if min_level is not None and record_level < min_level:
+                continue
+            if span is not None and record_span != span:
+                continue
+            records.append(to_record(seq, ts, record_level, name, record_span, fields))
+            if limit is not None and len(records) >= limit:
+                break
+        return records, missed, cursor
+
+    def state(self):
+        return {
+            "level": LEVEL_NAMES.get(self.level, self.level),
+            "sample": self.sample,
+            "capacity": self.ring.maxlen,
+            "buffered": len(self.ring),
+            "last_seq": self.last_seq,
+        }
+
+
+def to_record(seq, ts, level, name, span, fields):
+    record = {"seq": seq, "ts": ts, "level": LEVEL_NAMES.get(level, level), "event": name}
+    if span is not None:
+        record["span"] = span
+    if 'cmd' in fields:
+        fields = dict(fields, cmd=hex(fields['cmd']))
+    record.update(fields)
+    return record
+
+
+class TraceWriter:
+    """Background thread: ring -> JSON-lines file (optional) and stdout echo"""
+
+    def __init__(self, tracer, path=None, name='VMC', interval=FLUSH_INTERVAL):
+        self.tracer = tracer
+        self.path = path
+        self.name = name
+        self.interval = interval
+        self.cursor = 0
+        self.file = open(path, 'a') if path else None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the thread after a final flush"""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def flush(self):
+        records, missed, self.cursor = self.tracer.read(self.cursor)
+        if missed:
+            records.insert(0, {"ts": time.time(), "level": "WARN", "event": "trace.dropped", "records": missed})
+        if not records:
+            return
+
+        for record in records:
+            if parse_level(record['level']) >= self.tracer.echo:
+                print(f"[{self.name}] {format_record(record)}")
+        if self.file:
+            self.file.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+            self.file.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[Trace] Could not write {self.path}: {e}")
+
+
+def format_record(record):
+    """'WARN cmd.completed span=12 cmd=0x3 error=TIMEOUT'"""
+    skip = ('seq', 'ts', 'level', 'event')
+    details = ' '.join(f"{key}={value}" for key, value in record.items() if key not in skip)
+    return f"{record['level']} {record['event']} {details}".rstrip()
@@ -0,0 +1,197 @@
+# vmc_vend.py
+# One vend as one transaction: optional cashless notify (0x27), optional
+# selection check (0x01), then dispense (0x03), queued as a group so they go
+# out on consecutive POLLs. The dispense is then followed through every
+# 0x04 DISPENSING_STATUS for its selection until a terminal status
+# (success, jam, motor error...), not just the first "Dispensing...".
+#
+# A failed step cancels the steps behind it before they are sent.
+
+import time
+import uuid
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from vmc_codes import CMD_SEND
+from vmc_scheduler import PRIORITY_VEND
+from vmc_catalog import DISPENSE_SUCCESS
+from vmc_schema import encode_command
+
+VEND_TIMEOUT = 30.0 # Longest a dispense may run before we stop waiting for its final 0x04
+VEND_TTL = 300.0    # Seconds a finished vend stays readable
+SELECTION_OK = 0x01 # 0x02 SELECTION_CHECK_RESULT status: slot can vend
+
+FINAL_STATES = ('done', 'failed')
+
+
+class VendInProgress(RuntimeError):
+    """A vend for this selection is already running"""
+
+
+class VendPipeline:
+    """
+    vend_id -> {'id', 'selection', 'amount', 'state', 'step', 'steps',
+                'progress', 'result', 'error', 'created', 'updated',
+                'final' (Future, resolves with the vend)}
+
+    state: queued -> in_progress -> done / failed
+    step:  'payment' / 'check' / 'dispense' (the one currently on its way)
+    """
+
+    def __init__(self, scheduler, ttl=VEND_TTL):
+        self.scheduler = scheduler
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.vends = {}   # Insertion order = creation order
+        self.running = {} # selection -> vend
+
+    def __len__(self):
+        return len(self.running)
+
+    def start(self, selection, amount=None, check=False, timeout=None):
+        """Queue the whole vend and return it (raises SchemaError / VendInProgress)"""
+        steps = []
+        if amount:
+            steps.append(('payment', CMD_SEND["NOTIFY_CASHLESS_PAYMENT"], encode_command(CMD_SEND["NOTIFY_CASHLESS_PAYMENT"], amount=amount)))
+        if check:
+            steps.append(('check', CMD_SEND["CHECK_SELECTION_STATUS"], encode_command(CMD_SEND["CHECK_SELECTION_STATUS"], selection=selection)))
+        steps.append(('dispense', CMD_SEND["DISPENSE_ITEM"], encode_command(CMD_SEND["DISPENSE_ITEM"], selection=selection)))
+
+        now = time.time()
+        vend = {
+            'id': uuid.uuid4().hex,
+            'selection': selection,
+            'amount': amount,
+            'state': 'queued',
+            'step': steps[0][0],
+            'steps': [],
+            'progress': [],
+            'result': None,
+            'error': None,
+            'created': now,
+            'updated': now,
+            'final': Future(),
+        }
+
+        with self.lock:
+            self._expire(now)
+            if selection in self.running:
+                raise VendInProgress(selection)
+            entries = self.scheduler.submit_group([(cmd, data) for _, cmd, data in steps], timeout, PRIORITY_VEND)
+            vend['steps'] = [{'name': name, 'entry': entry} for (name, _, _), entry in zip(steps, entries)]
+            self.vends[vend['id']] = vend
+            self.running[selection] = vend
+
+        for index, step in enumerate(vend['steps']):
+            step['entry']['future'].add_done_callback(
+                lambda future, index=index: self._on_step(vend, index, future.result()))
+        return vend
+
+    def get(self, vend_id):
+        with self.lock:
+            self._expire(time.time())
+            return self.vends.get(vend_id)
+
+    def wait(self, vend, timeout):
+        """Blocks until the vend is done or failed; gives up on it after timeout"""
+        try:
+            return vend['final'].result(timeout=timeout)
+        except FutureTimeout:
+            self.abandon(vend)
+            return vend
+
+    def abandon(self, vend):
+        """Stop waiting for a vend whose final 0x04 never came"""
+        with self.lock:
+            cancel = self._finish(vend, 'failed', error="TIMEOUT")
+        self._cancel(cancel)
+
+    def view(self, vend):
+        """JSON-ready snapshot of a vend"""
+        state = vend['state']
+        if state == 'queued' and vend['steps'][0]['entry']['sent_status'] != 'WAITING_FOR_POLL':
+            state = 'in_progress'
+        return {
+            "id": vend['id'],
+            "selection": vend['selection'],
+            "amount": vend['amount'],
+            "state": state,
+            "final": state in FINAL_STATES,
+            "step": vend['step'],
+            "progress": vend['progress'],
+            "result": vend['result'],
+            "error": vend['error'],
+            "created": vend['created'],
+            "updated": vend['updated'],
+        }
+
+    # --- UPDATES (serial thread) ---
+
+    def on_status(self, status, payload):
+        """Every 0x04 DISPENSING_STATUS frame, expected or not"""
+        with self.lock:
+            vend = self.running.get(status.selection)
+            if vend is None or vend['step'] != 'dispense':
+                return
+            if vend['steps'][-1]['entry']['sent_status'] == 'WAITING_FOR_POLL':
+                return # Not ours: our dispense has not gone out yet
+
+            vend['progress'].append(status.status_text)
+            vend['result'] = {"cmd": hex(0x04), "raw_data": payload, "fields": status}
+            if status.terminal:
+                self._finish(vend, 'done' if status.status == DISPENSE_SUCCESS else 'failed')
+            else:
+                vend['state'] = 'in_progress'
+                vend['updated'] = time.time()
+
+    def _on_step(self, vend, index, result):
+        """A step's command resolved (the dispense's 0x04s go through on_status)"""
+        step = vend['steps'][index]
+        cancel = []
+        with self.lock:
+            if vend['state'] in FINAL_STATES:
+                return
+            step['result'] = result
+            if 'error' in result:
+                cancel = self._finish(vend, 'failed', error=result['error'])
+            elif step['name'] == 'check' and result['fields'].status != SELECTION_OK:
+                vend['result'] = result
+                cancel = self._finish(vend, 'failed', error="SELECTION_UNAVAILABLE")
+            elif step['name'] != 'dispense':
+                vend['state'] = 'in_progress'
+                vend['step'] = vend['steps'][index + 1]['name']
+                vend['updated'] = time.time()
+        self._cancel(cancel)
+
+    def _finish(self, vend, state, error=None):
+        """Lock held. Returns the entries still queued behind it, to cancel."""
+        if vend['state'] in FINAL_STATES:
+            return []
+        vend['state'] = state
+        vend['error'] = error
+        vend['updated'] = time.time()
+        if self.running.get(vend['selection']) is vend:
+            del self.running[vend['selection']]
+        vend['final'].set_result(vend)
+        return [step['entry'] for step in vend['steps'] if not step['entry']['future'].done()]
+
+    def _cancel(self, entries):
+        # Outside the lock: cancelling resolves the futures, which calls _on_step
+        for entry in entries:
+            self.scheduler.cancel(entry)
+
+    def _expire(self, now):
+        """Lock held. Fail dispenses that went quiet; drop finished vends untouched for ttl seconds."""
+        for vend in list(self.running.values()):
+            sent = vend['steps'][-1]['entry']['sent_status'] != 'WAITING_FOR_POLL'
+            if sent and now - vend['updated'] > VEND_TIMEOUT:
+                self._finish(vend, 'failed', error="TIMEOUT") # Nothing left to cancel
+
+        cutoff = now - self.ttl
+        expired = []
+        for vend in self.vends.values():
+            if vend['created'] >= cutoff:
+                break # Everything after this one is newer
+            if vend['state'] in FINAL_STATES and vend['updated'] < cutoff:
+                expired.append(vend['id'])
+        for vend_id in expired:
+            del self.vends[vend_id]